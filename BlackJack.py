@@ -1,16 +1,35 @@
+import argparse
+import os
 import sys
-from random import shuffle
+from array import array
+from collections import Counter
+from random import Random, shuffle
 
 import numpy as np
 import scipy.stats as stats
 import pylab as pl
 import matplotlib.pyplot as plt
 import copy
-import time
 import sqlite3
 from sqlite3 import Error
 
 from importer.StrategyImporter import StrategyImporter
+from importer.IndexImporter import IndexImporter
+from instrumentation.Timers import Timers
+from profiling.Profiler import Profiler
+from estimation.EdgeEstimator import EdgeEstimator
+from config.BetRamp import BetRamp
+from config.SimulationConfig import SimulationConfig
+from config.CountStrategy import CountStrategy
+from config.Rules import Rules
+from chances.Tree import dealer_probabilities
+from chances.ChanceTable import ChanceTable
+from chances.SharedChanceCache import SharedChanceCache
+from chances.DealerTracker import DealerTracker
+from advice.Cards import parse_cards
+from advice.LiveAdvisor import LiveAdvisor
+from history.HandHistory import CARD_CODES, CARD_NAMES, HandHistoryWriter
+from history.SessionLog import SessionLogWriter
 
 
 GAMES = 100000
@@ -23,20 +42,39 @@ BET_SPREAD_4 = 3.0
 BET_SPREAD_3 = 2.0
 
 DECK_SIZE = 52.0
+CHANCE_TOTALS = ["17", "18", "19", "20", "21", "Busted"]
 CARDS = {"Ace": 11, "Two": 2, "Three": 3, "Four": 4, "Five": 5, "Six": 6, "Seven": 7, "Eight": 8, "Nine": 9, "Ten": 10, "Jack": 10, "Queen": 10, "King": 10}
 BASIC_OMEGA_II = {"Ace": 0, "Two": 1, "Three": 1, "Four": 2, "Five": 2, "Six": 2, "Seven": 1, "Eight": 0, "Nine": -1, "Ten": -2, "Jack": -2, "Queen": -2, "King": -2}
 
 BLACKJACK_RULES = {
     'triple7': False,  # Count 3x7 as a blackjack
+    'hit_soft_17': False,  # Dealer hits soft 17
+    'double_after_split': True,
+    'resplit_aces': True,
+    'max_splits': None,  # Splits per round, None for no limit
+    'surrender': "late",  # "none", "late" or "early"
+    'blackjack_payout': 1.5,
+    'dealer_peek': False,  # Dealer checks for a blackjack under an Ace or Ten before the player acts
 }
 
 STRATEGY = ""
 HARD_STRATEGY = {}
 SOFT_STRATEGY = {}
 PAIR_STRATEGY = {}
+COUNT_STRATEGY = None  # CountStrategy compiled from the basic strategy and the --indices file
 
 DATABASE = ""
 COUNT_DATABASE = 0
+FILLER_DATABASE = "./database/bj_database.sqlite"  # Dealer chances written by BlackJackFillDealerChances.py
+
+CHANCE_TABLE = None  # Precomputed ChanceTable, consulted before the database and the exact calculation
+CHANCE_CACHE = None  # SharedChanceCache shared with other processes, consulted before the database
+APPROXIMATE_DEALER = False  # Use the fast infinite-deck dealer distribution (Tree) instead of the exact recursion
+INCREMENTAL_DEALER = None  # "first" or "second" order: keep the approximate dealer distribution current per dealt card
+
+COUNT_HISTORY = "card"  # Record the true count per "card", per "round" or not at all (None)
+HISTORY = None  # HandHistoryWriter recording every settled hand
+SESSION_LOG = None  # SessionLogWriter recording the cards entered in simulation mode
 
 class Database:
     def __init__(self, path):
@@ -64,7 +102,6 @@ class Database:
         cur = self.connection.cursor()
         #print("Select on table")
         cur.execute(query, arguments)
-        self.connection.commit()
         return cur.fetchall()
 
     def create_tables(self):
@@ -92,10 +129,51 @@ class Database:
                 Twentyone real NOT NULL,
                 Busted real NOT NULL,
                 Winning_chance_hit real, 
-                Winning_chance_stand real
+                Winning_chance_stand real,
+                Hit_soft_17 integer NOT NULL DEFAULT 0
                 );""")
+        columns = [column[1] for column in cur.execute("PRAGMA table_info(BLACKJACK_CHANCES)")]
+        if "Hit_soft_17" not in columns:
+            # Tables written before the rule was part of the key hold S17 dealer chances
+            cur.execute("ALTER TABLE BLACKJACK_CHANCES ADD COLUMN Hit_soft_17 integer NOT NULL DEFAULT 0")
+        cur.execute("DROP INDEX IF EXISTS BLACKJACK_CHANCES_COMPOSITION")
+        cur.execute(
+            """CREATE INDEX IF NOT EXISTS BLACKJACK_CHANCES_KEY ON BLACKJACK_CHANCES (
+                dealer, Ace, Two, Three, Four, Five, Six, Seven, Eight, Nine, Ten, Hit_soft_17);""")
 
         self.connection.commit()
+
+    def import_filler(self, path):
+        """
+        Copy the dealer chances computed by BlackJackFillDealerChances.py into BLACKJACK_CHANCES in one transaction.
+        The filler's dealer stands on soft 17, so the rows are tagged Hit_soft_17 = 0 and never answer an h17 lookup.
+        Rows of a ten up-card are imported for Jack, Queen and King as well; compositions already in the table are
+        skipped.
+        Returns: The number of rows imported.
+        """
+        cur = self.connection.cursor()
+        cur.execute("ATTACH DATABASE ? AS filler", (path,))
+        try:
+            with self.connection:
+                cur.execute(
+                    """INSERT INTO BLACKJACK_CHANCES (
+                    dealer, Ace, Two, Three, Four, Five, Six, Seven, Eight, Nine, Ten, Seventeen, Eightteen, Nineteen, Twenty, Twentyone, Busted, Hit_soft_17)
+                    SELECT up_card.name, f.Ace, f.Two, f.Three, f.Four, f.Five, f.Six, f.Seven, f.Eight, f.Nine, f.Ten,
+                        f.Seventeen, f.Eightteen, f.Nineteen, f.Twenty, f.Twentyone, f.Busted, 0
+                    FROM filler.BLACKJACK_CHANCES f
+                    JOIN (SELECT dealer AS source, dealer AS name FROM filler.BLACKJACK_CHANCES GROUP BY dealer
+                        UNION SELECT 'Ten', 'Jack' UNION SELECT 'Ten', 'Queen' UNION SELECT 'Ten', 'King') up_card
+                        ON f.dealer = up_card.source
+                    WHERE f.id IN (SELECT MIN(id) FROM filler.BLACKJACK_CHANCES
+                        GROUP BY dealer, Ace, Two, Three, Four, Five, Six, Seven, Eight, Nine, Ten)
+                    AND NOT EXISTS (SELECT 1 FROM BLACKJACK_CHANCES c WHERE c.dealer = up_card.name AND c.Ace = f.Ace
+                        AND c.Two = f.Two AND c.Three = f.Three AND c.Four = f.Four AND c.Five = f.Five AND c.Six = f.Six
+                        AND c.Seven = f.Seven AND c.Eight = f.Eight AND c.Nine = f.Nine AND c.Ten = f.Ten
+                        AND c.Hit_soft_17 = 0)""")
+                imported = cur.rowcount
+        finally:
+            cur.execute("DETACH DATABASE filler")
+        return imported
         
     def insert_update_table(self, query, arguments):
         cur = self.connection.cursor()
@@ -103,13 +181,65 @@ class Database:
         self.connection.commit()
         #self.logger.info("Insert/Update on table successfully")
 
+def store_chance_cache(database, cache):
+    """
+    Write the dealer chances computed into a SharedChanceCache to the database in one transaction.
+    Returns: The number of rows written.
+    """
+    entries = cache.take_fresh()
+    database.connection.executemany("""INSERT INTO BLACKJACK_CHANCES (
+        dealer, Ace, Two, Three, Four, Five, Six, Seven, Eight, Nine, Ten, Seventeen, Eightteen, Nineteen, Twenty, Twentyone, Busted, Hit_soft_17)
+        VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""",
+        [(CARD_NAMES[key[0]],) + key[1:11] + tuple(dealer) + (key[11],) for key, dealer in entries])
+    database.connection.commit()
+    return len(entries)
+
+
+def default_rules():
+    """
+    Returns: The rules given by BLACKJACK_RULES.
+    """
+    return Rules(**BLACKJACK_RULES)
+
+
+def default_config():
+    """
+    Returns: The table configuration given by the module constants.
+    """
+    bet_ramp = BetRamp([(2.5, BET_SPREAD_3), (3, BET_SPREAD_4), (4, BET_SPREAD_5), (5, BET_SPREAD_6), (6, BET_SPREAD)])
+    return SimulationConfig(SHOE_SIZE, SHOE_PENETRATION, bet_ramp, default_rules())
+
+
 class Card(object):
     """
-    Represents a playing card with name and value.
+    Represents a playing card with name and value. Cards are immutable and interned: Card(name) always returns the
+    same instance per rank, so shoes, hands and their copies share 13 cards. An Ace is worth 11; the Hand counts it
+    as 1 where needed.
     """
-    def __init__(self, name, value):
-        self.name = name
-        self.value = value
+    __slots__ = ("name", "value", "hard")
+    _cards = {}
+
+    def __new__(cls, name):
+        card = cls._cards.get(name)
+        if card is None:
+            card = object.__new__(cls)
+            object.__setattr__(card, "name", name)
+            object.__setattr__(card, "value", CARDS[name])
+            object.__setattr__(card, "hard", 1 if name == "Ace" else CARDS[name])  # The value counting aces as 1
+            cls._cards[name] = card
+        return card
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Cards are immutable")
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return Card, (self.name,)
 
     def __str__(self):
         return "%s" % self.name
@@ -121,13 +251,31 @@ class Shoe(object):
     """
     reshuffle = False
 
-    def __init__(self, decks):
+    def __init__(self, decks, seed=None, penetration=None):
         self.count = 0
-        self.count_history = []
-        self.ideal_count = {}
         self.decks = decks
+        self.seed = seed
+        self.penetration = penetration if penetration is not None else SHOE_PENETRATION
+        self.init_count_history()
+        self.ideal_count = {}
         self.cards = self.init_cards()
         self.init_count()
+        self.dealer_tracker = None
+        self.decisions = {}  # Transposition table of Player.percentage_decision, dropped with the shoe
+
+    def __deepcopy__(self, memo):
+        """
+        Copies made for hypothetical draws (Player.calculate_percentage) share the immutable cards and the
+        transposition table of the decisions instead of copying them.
+        """
+        copied = copy.copy(self)
+        memo[id(self)] = copied
+        for name, value in self.__dict__.items():
+            if name == "cards":
+                copied.cards = list(self.cards)  # Cards are immutable
+            elif name != "decisions":
+                setattr(copied, name, copy.deepcopy(value, memo))
+        return copied
 
     def __str__(self):
         s = ""
@@ -135,19 +283,49 @@ class Shoe(object):
             s += "%s\n" % c
         return s
 
+    def init_count_history(self):
+        """
+        Preallocate the true count history. At most one entry is recorded per card in the shoe (plus the initial
+        count), so a float array sized to the shoe never has to grow and is cheap to copy.
+        """
+        if COUNT_HISTORY:
+            self._count_history = array('f', bytes(4 * (int(DECK_SIZE) * self.decks + 1)))
+        else:
+            self._count_history = array('f')
+        self._count_history_length = 0
+
+    @property
+    def count_history(self):
+        """
+        Returns: The recorded true counts, empty if COUNT_HISTORY is disabled.
+        """
+        return self._count_history[:self._count_history_length]
+
+    def record_count(self, truecount):
+        """
+        Append a true count to the history.
+        """
+        if COUNT_HISTORY:
+            self._count_history[self._count_history_length] = truecount
+            self._count_history_length += 1
+
     def init_cards(self):
         """
-        Initialize the shoe with shuffled playing cards and set count to zero.
+        Initialize the shoe with shuffled playing cards and set count to zero. A shoe with a seed is always
+        shuffled into the same order.
         """
         self.count = 0
-        self.count_history.append(self.count)
+        self.record_count(self.count)
 
         cards = []
         for d in range(self.decks):
             for c in CARDS:
                 for i in range(0, 4):
-                    cards.append(Card(c, CARDS[c]))
-        shuffle(cards)
+                    cards.append(Card(c))
+        if self.seed is None:
+            shuffle(cards)
+        else:
+            Random(self.seed).shuffle(cards)
         return cards
 
     def init_count(self):
@@ -156,19 +334,33 @@ class Shoe(object):
         is a dictionary containing (card name - number of occurrences in shoe) pairs
         """
         for card in CARDS:
-            self.ideal_count[card] = 4 * SHOE_SIZE
+            self.ideal_count[card] = 4 * self.decks
 
     def deal(self):
         """
         Returns:    The next card off the shoe. If the shoe penetration is reached,
                     the shoe gets reshuffled.
         """
-        if self.shoe_penetration() < SHOE_PENETRATION:
+        return self.turn_over(self.deal_face_down())
+
+    def deal_face_down(self):
+        """
+        Returns:    The next card off the shoe without counting it, like the dealer's hole card under peek rules.
+                    It stays in the composition and the count until it is passed to turn_over.
+        """
+        if self.shoe_penetration() < self.penetration:
             self.reshuffle = True
-        card = self.cards.pop()
+        return self.cards.pop()
 
+    def turn_over(self, card):
+        """
+        Count a card dealt face down once it is seen.
+        Returns:    The card.
+        """
         assert self.ideal_count[card.name] > 0, "Either a cheater or a bug!"
         self.ideal_count[card.name] -= 1
+        if self.dealer_tracker is not None:
+            self.dealer_tracker.remove(card.name)
 
         self.do_count(card)
         return card
@@ -178,16 +370,42 @@ class Shoe(object):
         Returns:    The next card off the shoe. If the shoe penetration is reached,
                     the shoe gets reshuffled.
         """
-        if self.shoe_penetration() < SHOE_PENETRATION:
+        if self.shoe_penetration() < self.penetration:
             self.reshuffle = True
         card1 = self.cards.pop()
 
         assert self.ideal_count[card.name] > 0, "Either a cheater or a bug!"
         self.ideal_count[card.name] -= 1
+        if self.dealer_tracker is not None:
+            self.dealer_tracker.remove(card.name)
 
         self.do_count(card)
         return card
 
+    def deal_cards(self, names):
+        """
+        Account for several entered cards at once: the composition and the count are updated in one step and one
+        true count is recorded for the whole batch.
+        Returns:    The number of cards dealt.
+        """
+        if not names:
+            return 0
+        removed = Counter(names)
+        for name, number in removed.items():
+            assert self.ideal_count[name] >= number, "Either a cheater or a bug!"
+        if (len(self.cards) - len(names) + 1) / (DECK_SIZE * self.decks) < self.penetration:
+            self.reshuffle = True
+        del self.cards[len(self.cards) - len(names):]
+        for name, number in removed.items():
+            self.ideal_count[name] -= number
+        self.count += sum(BASIC_OMEGA_II[name] * number for name, number in removed.items())
+        if self.dealer_tracker is not None:
+            for name in names:
+                self.dealer_tracker.remove(name)
+        if COUNT_HISTORY == "card":
+            self.record_count(self.truecount())
+        return len(names)
+
     def total_card(self):
         total_cards = 0
         for card in CARDS:
@@ -199,7 +417,8 @@ class Shoe(object):
         Add the dealt card to current count.
         """
         self.count += BASIC_OMEGA_II[card.name]
-        self.count_history.append(self.truecount())
+        if COUNT_HISTORY == "card":
+            self.record_count(self.truecount())
 
     def truecount(self):
         """
@@ -218,9 +437,6 @@ class Hand(object):
     """
     Represents a hand, either from the dealer or from the player
     """
-    _value = 0
-    _aces = []
-    _aces_soft = 0
     splithand = False
     surrender = False
     doubled = False
@@ -228,6 +444,12 @@ class Hand(object):
     def __init__(self, cards):
         self.cards = cards
 
+    def __deepcopy__(self, memo):
+        # Cards are immutable, a copy of the list is enough
+        copied = copy.copy(self)
+        copied.cards = list(self.cards)
+        return copied
+
     def __str__(self):
         h = ""
         for c in self.cards:
@@ -239,52 +461,41 @@ class Hand(object):
         """
         Returns: The current value of the hand (aces are either counted as 1 or 11).
         """
-        self._value = 0
+        hard = 0
+        ace = False
         for c in self.cards:
-            self._value += c.value
-
-        #print(self._value)
-
-        if self._value > 21 and self.aces_soft > 0:
-            for ace in self.aces:
-                if ace.value == 11:
-                    self._value -= 10
-                    ace.value = 1
-                    if self._value <= 21:
-                        break
-
-        return self._value
+            hard += c.hard
+            if c.hard == 1:
+                ace = True
+        if ace and hard <= 11:
+            return hard + 10
+        return hard
 
     @property
     def aces(self):
         """
         Returns: The all aces in the current hand.
         """
-        self._aces = []
-        for c in self.cards:
-            if c.name == "Ace":
-                self._aces.append(c)
-        return self._aces
+        return [c for c in self.cards if c.name == "Ace"]
 
     @property
     def aces_soft(self):
         """
-        Returns: The number of aces valued as 11
+        Returns: The number of aces valued as 11 (at most one, two would be 22).
         """
-        self._aces_soft = 0
-        for ace in self.aces:
-            if ace.value == 11:
-                self._aces_soft += 1
-        return self._aces_soft
+        return 1 if self.soft() else 0
 
     def soft(self):
         """
         Determines whether the current hand is soft (soft means that it consists of aces valued at 11).
         """
-        if self.aces_soft > 0:
-            return True
-        else:
-            return False
+        hard = 0
+        ace = False
+        for c in self.cards:
+            hard += c.hard
+            if c.hard == 1:
+                ace = True
+        return ace and hard <= 11
 
     def splitable(self):
         """
@@ -295,12 +506,14 @@ class Hand(object):
         else:
             return False
 
-    def blackjack(self):
+    def blackjack(self, triple7=None):
         """
-        Check a hand for a blackjack, taking the defined BLACKJACK_RULES into account.
+        Check a hand for a blackjack. triple7 (three sevens count as a blackjack) defaults to BLACKJACK_RULES.
         """
+        if triple7 is None:
+            triple7 = BLACKJACK_RULES['triple7']
         if not self.splithand and self.value == 21:
-            if all(c.value == 7 for c in self.cards) and BLACKJACK_RULES['triple7']:
+            if all(c.value == 7 for c in self.cards) and triple7:
                 return True
             elif self.length() == 2:
                 return True
@@ -346,14 +559,72 @@ class Player(object):
     """
     Represent a player
     """
-    def __init__(self, hand=None, dealer_hand=None):
+    def __init__(self, hand=None, dealer_hand=None, strategy=None, count_strategy=None, rules=None):
         self.hands = [hand]
         self.dealer_hand = dealer_hand
+        if strategy is None:
+            strategy = (HARD_STRATEGY, SOFT_STRATEGY, PAIR_STRATEGY)
+        self.hard_strategy, self.soft_strategy, self.pair_strategy = strategy
+        self.count_strategy = count_strategy if count_strategy is not None else COUNT_STRATEGY
+        self.rules = rules if rules is not None else default_rules()
+        self.advisor = None
 
     def set_hands(self, new_hand, new_dealer_hand):
         self.hands = [new_hand]
         self.dealer_hand = new_dealer_hand
 
+    def strategy_flag(self, hand, shoe=None):
+        """
+        Returns: The basic strategy action for the hand against the dealer's up-card. With a count strategy and
+        the shoe, the action for the shoe's current true count.
+        """
+        if self.count_strategy is not None and shoe is not None:
+            return self.count_strategy.action(hand, self.dealer_hand.cards[0].name, shoe.truecount())
+        if hand.soft():
+            return self.soft_strategy[hand.value][self.dealer_hand.cards[0].name]
+        elif hand.splitable():
+            return self.pair_strategy[hand.value][self.dealer_hand.cards[0].name]
+        else:
+            return self.hard_strategy[hand.value][self.dealer_hand.cards[0].name]
+
+    def advised_flag(self, hand, shoe):
+        """
+        Returns: The action of the live advisor for the hand if there is one, else the strategy action.
+        """
+        if self.advisor is not None:
+            advice = self.advisor.play([card.name for card in hand.cards])
+            if advice.action is not None:
+                return advice.action
+        return self.strategy_flag(hand, shoe)
+
+    def legal_flag(self, flag, hand):
+        """
+        Returns: The strategy action, or the action to take instead if the rules do not allow it for the hand.
+        """
+        if flag == 'P' and not self.can_split(hand):
+            return self.legal_flag(self.unsplit_flag(hand), hand)
+        if flag == 'D' and (hand.length() != 2 or (hand.splithand and not self.rules.double_after_split)):
+            return 'H'
+        if flag == 'Sr' and (hand.length() != 2 or not self.rules.surrender_allowed):
+            return 'H'
+        return flag
+
+    def can_split(self, hand):
+        """
+        Determines if the rules allow to split the hand once more.
+        """
+        if len(self.hands) >= self.rules.max_hands:
+            return False
+        return self.rules.resplit_aces or not (hand.splithand and hand.cards[0].name == "Ace")
+
+    def unsplit_flag(self, hand):
+        """
+        Returns: The action for a pair that may not be split, played as its hard total.
+        """
+        if hand.soft() or hand.value not in self.hard_strategy:
+            return 'H'
+        return self.hard_strategy[hand.value][self.dealer_hand.cards[0].name]
+
     def play_simulation(self, shoe, dealer):
         for hand in self.hands:
             # print "Playing Hand: %s" % hand
@@ -390,25 +661,28 @@ class Player(object):
 
     def play_hand_simulation_percentage(self, hand, shoe, dealer):
         print(hand.__str__())
-        while not hand.busted() and not hand.blackjack():
+        while not hand.busted() and not hand.blackjack(self.rules.triple7):
             self.splitted = False
-            if hand.soft():
-                flag = SOFT_STRATEGY[hand.value][self.dealer_hand.cards[0].name]
-            elif hand.splitable():
-                flag = PAIR_STRATEGY[hand.value][self.dealer_hand.cards[0].name]
-            else:
-                flag = HARD_STRATEGY[hand.value][self.dealer_hand.cards[0].name]
+            flag = self.legal_flag(self.advised_flag(hand, shoe), hand)
+            if self.advisor is not None:
+                print(self.advisor.current)
 
             if flag == 'D':
                 if hand.length() == 2:
                     print("Double Down")
                     hand.doubled = True
                     player_card = self.translate_card(input("Card from double\n"))
-                    self.hit_card(hand, shoe, Card(player_card, CARDS[player_card]))
+                    self.hit_card(hand, shoe, Card(player_card))
+                    self.see(player_card, "player")
                     break
                 else:
                     flag = 'H'
 
+            if flag == 'Sr':
+                print("Surrender")
+                hand.surrender = True
+                break
+
             if flag == 'P':
                 print("Split")
                 self.split_simulation(hand, shoe, dealer)
@@ -417,7 +691,8 @@ class Player(object):
             if flag == 'H':
                 print("Hit")
                 player_card = self.translate_card(input("Card from hit\n"))
-                self.hit_card(hand, shoe, Card(player_card, CARDS[player_card]))
+                self.hit_card(hand, shoe, Card(player_card))
+                self.see(player_card, "player")
 
             if flag == 'S':
                 print("Stand")
@@ -428,9 +703,25 @@ class Player(object):
         self.hands.append(new_hand)
         # print "Splitted %s" % hand
         player_card = self.translate_card(input("Card from hit\n"))
-        self.hit_card(new_hand, shoe, Card(player_card, CARDS[player_card]))
+        self.hit_card(new_hand, shoe, Card(player_card))
+        self.see(player_card, "other")
         player_card = self.translate_card(input("Card from hit\n"))
-        self.hit_card(hand, shoe, Card(player_card, CARDS[player_card]))
+        self.hit_card(hand, shoe, Card(player_card))
+        self.see(player_card, "other")
+
+    def see(self, card, source):
+        """
+        Pass an entered card on to the live advisor, if there is one.
+        """
+        if self.advisor is not None:
+            return self.advisor.see(card, source)
+
+    def see_cards(self, names, source):
+        """
+        Pass a line of entered cards on to the live advisor, if there is one.
+        """
+        if self.advisor is not None:
+            return self.advisor.see_cards(names, source)
 
     def play(self, shoe, dealer):
         for hand in self.hands:
@@ -442,35 +733,22 @@ class Player(object):
 
     def play_hand_percentage(self, hand, shoe, dealer):
         if hand.length() < 2:
-            if hand.cards[0].name == "Ace":
-                hand.cards[0].value = 11
             self.hit(hand, shoe)
 
-        while not hand.busted() and not hand.blackjack():
+        while not hand.busted() and not hand.blackjack(self.rules.triple7):
             self.splitted = False
-            if hand.soft():
-                flag = SOFT_STRATEGY[hand.value][self.dealer_hand.cards[0].name]
-            elif hand.splitable():
-                flag = PAIR_STRATEGY[hand.value][self.dealer_hand.cards[0].name]
-            else:
-                flag = HARD_STRATEGY[hand.value][self.dealer_hand.cards[0].name]
+            flag = self.legal_flag(self.strategy_flag(hand, shoe), hand)
 
             if flag == 'D':
-                if hand.length() == 2:
-                    #print("Double Down")
-                    hand.doubled = True
-                    self.hit(hand, shoe)
-                    break
-                else:
-                    flag = 'H'
+                #print("Double Down")
+                hand.doubled = True
+                self.hit(hand, shoe)
+                break
 
             if flag == 'Sr':
-                if hand.length() == 2:
-                    #print("Surrender")
-                    hand.surrender = True
-                    break
-                else:
-                    flag = 'H'
+                #print("Surrender")
+                hand.surrender = True
+                break
 
             if flag == 'P':
                 #print("Split")
@@ -478,64 +756,110 @@ class Player(object):
                 self.splitted = True
 
             if not self.splitted:
-                self.bust_chance, self.not_bust_chance = self.player_percentage_bust(hand, shoe)
-                #print(self.bust_chance)
-                if self.bust_chance == 0.0:
-                    #print("AutoHit")
+                if self.percentage_decision(hand, shoe, dealer)[0] == 'H':
+                    #print("Hit")
                     self.hit(hand, shoe)
                 else:
-                    rows = DATABASE.select_table("""SELECT * FROM BLACKJACK_CHANCES WHERE dealer=? AND Ace=? AND Two=? AND Three=? AND Four=? AND Five=? AND Six=?
-                        AND Seven=? AND Eight=? AND Nine=? AND Ten=?""", 
-                        (dealer.hand.cards[0].name, shoe.ideal_count["Ace"], shoe.ideal_count["Two"], shoe.ideal_count["Three"],
-                        shoe.ideal_count["Four"], shoe.ideal_count["Five"], shoe.ideal_count["Six"], shoe.ideal_count["Seven"],
-                        shoe.ideal_count["Eight"], shoe.ideal_count["Nine"], shoe.ideal_count["Ten"] + shoe.ideal_count["Jack"] + shoe.ideal_count["Queen"] + shoe.ideal_count["King"]))
-                    winning_chance_hit = 0.0
-                    winning_chance_stand = 0.0
-                    if rows:
-                        print("Chances already in database")
-                        DATABASE.count_database_searchs += 1
-                        winning_chance_hit = rows[0][18]
-                        winning_chance_stand = rows[0][19]
-                    else:
-                        self.player_possibilities = {"17": 0.0, "18": 0.0, "19": 0.0, "20": 0.0, "21": 0.0, "Busted": 0.0}
-                        self.dealer_possibilities = {"17": 0.0, "18": 0.0, "19": 0.0, "20": 0.0, "21": 0.0, "Busted": 0.0}
-                        start = time.time()
-                        self.calculate_percentage(dealer.hand, shoe, self.dealer_possibilities)
-                        end = time.time()
-                        #print("DEALER TIME ELAPSED ----------------------" + str(end - start) + "----------------------")
-                        start = time.time()
-                        self.calculate_percentage(hand, shoe, self.player_possibilities)
-                        end = time.time()
-                        #print("PLAYER TIME ELAPSED ----------------------" + str(end - start) + "----------------------")
-                        #print(self.bust_chance)
-                        #print("dealer_possibilities")
-                        #print(self.dealer_possibilities)
-                        #print(self.dealer_possibilities["17"] + self.dealer_possibilities["18"] + self.dealer_possibilities["19"] + self.dealer_possibilities["20"] + self.dealer_possibilities["21"] + self.dealer_possibilities["Busted"])
-                        #print("player_possibilities")
-                        #print(self.player_possibilities)
-                        #print(self.player_possibilities["17"] + self.player_possibilities["18"] + self.player_possibilities["19"] + self.player_possibilities["20"] + self.player_possibilities["21"] + self.player_possibilities["Busted"])
-                        winning_chance_hit, winning_chance_stand = self.winning_chance_calc(hand)
-                        DATABASE.insert_update_table("""INSERT INTO BLACKJACK_CHANCES (
-                            dealer, Ace, Two, Three, Four, Five, Six, Seven, Eight, Nine, Ten, Seventeen, Eightteen, Nineteen, Twenty, Twentyone, Busted, Winning_chance_hit, Winning_chance_stand) 
-                            VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""", 
-                            (dealer.hand.cards[0].name, shoe.ideal_count["Ace"], shoe.ideal_count["Two"], shoe.ideal_count["Three"],
-                            shoe.ideal_count["Four"], shoe.ideal_count["Five"], shoe.ideal_count["Six"], shoe.ideal_count["Seven"],
-                            shoe.ideal_count["Eight"], shoe.ideal_count["Nine"], shoe.ideal_count["Ten"] + shoe.ideal_count["Jack"] + shoe.ideal_count["Queen"] + shoe.ideal_count["King"], 
-                            self.dealer_possibilities["17"], self.dealer_possibilities["18"], self.dealer_possibilities["19"], self.dealer_possibilities["20"], 
-                            self.dealer_possibilities["21"], self.dealer_possibilities["Busted"], winning_chance_hit, winning_chance_stand))
-                        #print("Chances inserted in database")
-
-                        #print("winning_chance_hit:")
-                        #print(winning_chance_hit)
-                        #print("winning_chance_stand:")
-                        #print(winning_chance_stand)
-                    
-                    if winning_chance_hit > winning_chance_stand:
-                        #print("Hit")
-                        self.hit(hand, shoe)
-                    else :
-                        #print("Stand")
-                        break
+                    #print("Stand")
+                    break
+
+    def percentage_decision(self, hand, shoe, dealer):
+        """
+        Decide hit or stand on the winning chances. Decisions are kept in the shoe's transposition table, keyed on
+        the whole decision state (player total, soft, dealer up-card and composition), so a state met again within
+        the shoe, by another split hand or another seat, skips the database and the probability calculation.
+        Returns: 'H' or 'S', the winning chance of hitting and of standing (None for a hand that cannot bust).
+        """
+        key = (hand.value, hand.soft(), dealer.hand.cards[0].name, tuple(shoe.ideal_count.values()))
+        decision = shoe.decisions.get(key)
+        if decision is None:
+            self.bust_chance, self.not_bust_chance = self.player_percentage_bust(hand, shoe)
+            #print(self.bust_chance)
+            if self.bust_chance == 0.0:
+                #print("AutoHit")
+                decision = ('H', None, None)
+            else:
+                winning_chance_hit, winning_chance_stand = self.winning_chances(hand, shoe, dealer)
+                decision = ('H' if winning_chance_hit > winning_chance_stand else 'S', winning_chance_hit,
+                            winning_chance_stand)
+            shoe.decisions[key] = decision
+        return decision
+
+    def winning_chances(self, hand, shoe, dealer):
+        """
+        Returns: The winning chances of hitting and of standing. They come from the precomputed CHANCE_TABLE if
+        it is loaded and its answer is unambiguous, else from the hand's own chances against the dealer's, which are
+        taken from the CHANCE_CACHE, the database or the calculation.
+        """
+        if CHANCE_TABLE:
+            chances = CHANCE_TABLE.lookup(dealer.hand.cards[0].name, hand.value, hand.soft(), shoe.truecount(),
+                                          shoe.shoe_penetration(), shoe.decks)
+            if chances:
+                winning_chance_hit, winning_chance_stand, bound = chances
+                if abs(winning_chance_hit - winning_chance_stand) > bound:
+                    return winning_chance_hit, winning_chance_stand
+
+        composition = (shoe.ideal_count["Ace"], shoe.ideal_count["Two"], shoe.ideal_count["Three"],
+            shoe.ideal_count["Four"], shoe.ideal_count["Five"], shoe.ideal_count["Six"], shoe.ideal_count["Seven"],
+            shoe.ideal_count["Eight"], shoe.ideal_count["Nine"], shoe.ideal_count["Ten"] + shoe.ideal_count["Jack"] + shoe.ideal_count["Queen"] + shoe.ideal_count["King"])
+        # The dealer's chances of a composition are shared by every hand against that up-card, in the cache and in
+        # the database; the player's side depends on the hand and is computed per decision
+        self.player_possibilities = {"17": 0.0, "18": 0.0, "19": 0.0, "20": 0.0, "21": 0.0, "Busted": 0.0}
+        cached = None
+        rows = None
+        approximate = False
+        if CHANCE_CACHE is not None:
+            cache_key = (CARD_CODES[dealer.hand.cards[0].name],) + composition + (int(self.rules.hit_soft_17),)
+            cached = CHANCE_CACHE.get(cache_key)
+        if cached:
+            self.dealer_possibilities = dict(zip(CHANCE_TOTALS, cached))
+        else:
+            rows = DATABASE.select_table("""SELECT * FROM BLACKJACK_CHANCES WHERE dealer=? AND Ace=? AND Two=? AND Three=? AND Four=? AND Five=? AND Six=?
+                AND Seven=? AND Eight=? AND Nine=? AND Ten=? AND Hit_soft_17=?""", 
+                (dealer.hand.cards[0].name,) + composition + (int(self.rules.hit_soft_17),))
+            if rows:
+                DATABASE.count_database_searchs += 1
+                self.dealer_possibilities = dict(zip(CHANCE_TOTALS, rows[0][12:18]))
+                if CHANCE_CACHE is not None:
+                    CHANCE_CACHE.put(cache_key, rows[0][12:18], fresh=False)
+            else:
+                self.dealer_possibilities = {"17": 0.0, "18": 0.0, "19": 0.0, "20": 0.0, "21": 0.0, "Busted": 0.0}
+                approximate = APPROXIMATE_DEALER or shoe.dealer_tracker is not None
+                if approximate:
+                    self.dealer_possibilities = dealer.get_probabilities(shoe)
+                else:
+                    self.calculate_percentage(dealer.hand, shoe, self.dealer_possibilities,
+                                              hit_soft_17=self.rules.hit_soft_17)
+        self.calculate_percentage(hand, shoe, self.player_possibilities)
+        #print(self.bust_chance)
+        #print("dealer_possibilities")
+        #print(self.dealer_possibilities)
+        #print(self.dealer_possibilities["17"] + self.dealer_possibilities["18"] + self.dealer_possibilities["19"] + self.dealer_possibilities["20"] + self.dealer_possibilities["21"] + self.dealer_possibilities["Busted"])
+        #print("player_possibilities")
+        #print(self.player_possibilities)
+        #print(self.player_possibilities["17"] + self.player_possibilities["18"] + self.player_possibilities["19"] + self.player_possibilities["20"] + self.player_possibilities["21"] + self.player_possibilities["Busted"])
+        winning_chance_hit, winning_chance_stand = self.winning_chance_calc(hand)
+        if cached or rows or approximate:
+            # Approximate dealer chances are never stored: later runs read the table as exact dealer chances
+            return winning_chance_hit, winning_chance_stand
+        elif CHANCE_CACHE is not None and CHANCE_CACHE.put(
+                cache_key, [self.dealer_possibilities[total] for total in CHANCE_TOTALS]):
+            return winning_chance_hit, winning_chance_stand  # Stored in the database by store_chance_cache
+        else:
+            DATABASE.insert_update_table("""INSERT INTO BLACKJACK_CHANCES (
+                dealer, Ace, Two, Three, Four, Five, Six, Seven, Eight, Nine, Ten, Seventeen, Eightteen, Nineteen, Twenty, Twentyone, Busted, Hit_soft_17) 
+                VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""", 
+                (dealer.hand.cards[0].name,) + composition + (
+                self.dealer_possibilities["17"], self.dealer_possibilities["18"], self.dealer_possibilities["19"], self.dealer_possibilities["20"], 
+                self.dealer_possibilities["21"], self.dealer_possibilities["Busted"], int(self.rules.hit_soft_17)))
+            #print("Chances inserted in database")
+
+            #print("winning_chance_hit:")
+            #print(winning_chance_hit)
+            #print("winning_chance_stand:")
+            #print(winning_chance_stand)
+
+        return winning_chance_hit, winning_chance_stand
 
     def winning_chance_calc(self, hand):
         winning_chance_hit = 0.0
@@ -589,7 +913,7 @@ class Player(object):
             if shoe.ideal_count[card]>0:
                 copy_shoe = copy.deepcopy(shoe)
                 copy_hand = copy.deepcopy(hand)
-                self.hit_card(copy_hand, copy_shoe, Card(card, CARDS[card]))
+                self.hit_card(copy_hand, copy_shoe, Card(card))
                 if copy_hand.value > 21:
                     bust_chance += shoe.ideal_count[card]/shoe.total_card()
                 else :
@@ -599,7 +923,11 @@ class Player(object):
         #print("Bust Chance = " + str(bust_chance))
         return bust_chance, not_bust_chance
 
-    def calculate_percentage(self, hand, shoe, possibilities, possibility=1):
+    def calculate_percentage(self, hand, shoe, possibilities, possibility=1, hit_soft_17=False):
+        """
+        Add the chances of the final totals of a hand drawing to 17 or more from the shoe to possibilities. With
+        hit_soft_17 (the dealer's side under H17) a soft 17 draws on.
+        """
         #print("Possibilities")
         #print(possibilities)
         for card in CARDS:
@@ -607,9 +935,11 @@ class Player(object):
                 copy_shoe = copy.deepcopy(shoe)
                 copy_hand = copy.deepcopy(hand)
                 new_possibility = possibility * copy_shoe.ideal_count[card]/copy_shoe.total_card()
-                self.hit_card(copy_hand, copy_shoe, Card(card, CARDS[card]))
+                self.hit_card(copy_hand, copy_shoe, Card(card))
                 
-                if copy_hand.value == 17:
+                if copy_hand.value == 17 and hit_soft_17 and copy_hand.soft():
+                    self.calculate_percentage(copy_hand, copy_shoe, possibilities, new_possibility, hit_soft_17)
+                elif copy_hand.value == 17:
                     possibilities["17"] += new_possibility
                 elif copy_hand.value == 18:
                     possibilities["18"] += new_possibility
@@ -630,38 +960,25 @@ class Player(object):
                             start = True
                     break
                 else:
-                    self.calculate_percentage(copy_hand, copy_shoe, possibilities, new_possibility)
+                    self.calculate_percentage(copy_hand, copy_shoe, possibilities, new_possibility, hit_soft_17)
 
     def play_hand(self, hand, shoe):
         if hand.length() < 2:
-            if hand.cards[0].name == "Ace":
-                hand.cards[0].value = 11
             self.hit(hand, shoe)
 
-        while not hand.busted() and not hand.blackjack():
-            if hand.soft():
-                flag = SOFT_STRATEGY[hand.value][self.dealer_hand.cards[0].name]
-            elif hand.splitable():
-                flag = PAIR_STRATEGY[hand.value][self.dealer_hand.cards[0].name]
-            else:
-                flag = HARD_STRATEGY[hand.value][self.dealer_hand.cards[0].name]
+        while not hand.busted() and not hand.blackjack(self.rules.triple7):
+            flag = self.legal_flag(self.strategy_flag(hand, shoe), hand)
 
             if flag == 'D':
-                if hand.length() == 2:
-                    # print "Double Down"
-                    hand.doubled = True
-                    self.hit(hand, shoe)
-                    break
-                else:
-                    flag = 'H'
+                # print "Double Down"
+                hand.doubled = True
+                self.hit(hand, shoe)
+                break
 
             if flag == 'Sr':
-                if hand.length() == 2:
-                    # print "Surrender"
-                    hand.surrender = True
-                    break
-                else:
-                    flag = 'H'
+                # print "Surrender"
+                hand.surrender = True
+                break
 
             if flag == 'H':
                 self.hit(hand, shoe)
@@ -692,14 +1009,22 @@ class Dealer(object):
     """
     Represent the dealer
     """
-    def __init__(self, hand=None):
+    def __init__(self, hand=None, rules=None):
         self.hand = hand
+        self.rules = rules if rules is not None else default_rules()
 
     def set_hand(self, new_hand):
         self.hand = new_hand
 
+    def hits(self):
+        """
+        Determines if the dealer has to draw to the current hand.
+        """
+        value = self.hand.value
+        return self.rules.dealer_hits[self.hand.soft()][value]
+
     def play(self, shoe):
-        while self.hand.value < 17:
+        while self.hits():
             self.hit(shoe)
 
     def hit(self, shoe):
@@ -707,75 +1032,94 @@ class Dealer(object):
         self.hand.add_card(c)
         # print "Dealer hitted: %s" %c
 
-    # Returns an array of 6 numbers representing the probability that the final score of the dealer is
-    # [17, 18, 19, 20, 21, Busted] '''
-    # TODO Differentiate 21 and BJ
-    # TODO make an actual tree, this is false AF
-    def get_probabilities(self) :
-        start_value = self.hand.value
-        # We'll draw 5 cards no matter what an count how often we got 17, 18, 19, 20, 21, Busted
-
-class Tree(object):
-    """
-    A tree that opens with a statistical card and changes as a new
-    statistical card is added. In this context, a statistical card is a list of possible values, each with a probability.
-    e.g : [2 : 0.05, 3 : 0.1, ..., 22 : 0.1]
-    Any value above 21 will be truncated to 22, which means 'Busted'.
-    """
-    #TODO to test
-    def __init__(self, start=[]):
-        self.tree = []
-        self.tree.append(start)
-
-    def add_a_statistical_card(self, stat_card):
-        # New set of leaves in the tree
-        leaves = []
-        for p in self.tree[-1] :
-            for v in stat_card :
-                new_value = v + p
-                proba = self.tree[-1][p]*stat_card[v]
-                if (new_value > 21) :
-                    # All busted values are 22
-                    new_value = 22
-                if (new_value in leaves) :
-                    leaves[new_value] = leaves[new_value] + proba
-                else :
-                    leaves[new_value] = proba
+    def get_probabilities(self, shoe):
+        """
+        Returns: The probabilities that the final score of the dealer is 17, 18, 19, 20, 21 or busted, drawing
+        from the cards left in the shoe with fixed probabilities (see Tree). 21 includes blackjacks. A shoe with a
+        dealer tracker answers from its incrementally updated distributions.
+        """
+        if shoe.dealer_tracker is not None:
+            return shoe.dealer_tracker.distribution(self.hand.cards[0].name)
+        return dealer_probabilities(self.hand.cards[0].name, shoe.ideal_count, self.rules.hit_soft_17)
 
 
 class Game(object):
     """
     A sequence of Blackjack Rounds that keeps track of total money won or lost
     """
-    def __init__(self):
-        self.shoe = Shoe(SHOE_SIZE)
+    def __init__(self, strategy=None, seed=None, config=None):
+        if config is None:
+            config = default_config()
+        self.config = config
+        self.rules = config.rules
+        self.shoe = Shoe(config.decks, seed, config.penetration)
+        if INCREMENTAL_DEALER:
+            self.shoe.dealer_tracker = DealerTracker.from_shoe(self.shoe, second_order=INCREMENTAL_DEALER == "second",
+                                                               hit_soft_17=self.rules.hit_soft_17)
         self.money = 0.0
         self.bet = 0.0
         self.stake = 1.0
-        self.player = Player()
-        self.dealer = Dealer()
+        self.player = Player(strategy=strategy, rules=self.rules)
+        self.dealer = Dealer(rules=self.rules)
         self.count_higher_bet = 0
+        self.round_truecount = 0.0
+        self.advisor = None
+        self.history = HISTORY
+        if self.history is not None:
+            self.shoe_number = self.history.new_shoe()
+
+    def use_advisor(self, advisor):
+        """
+        Let a LiveAdvisor follow the cards entered in play_round_simulation, starting from a fresh shoe.
+        """
+        self.advisor = advisor
+        self.player.advisor = advisor
+        advisor.shuffle()
+
+    def place_bet(self):
+        """
+        Set the stake of the next round from the true count and the bet ramp.
+        """
+        self.round_truecount = self.shoe.truecount()
+        self.stake = self.config.bet_ramp.stake(self.round_truecount)
+        if self.stake != self.config.bet_ramp.base:
+            self.count_higher_bet += 1
+
+    def dealer_outcome(self):
+        """
+        Returns: The dealer's final value and whether the dealer has a blackjack and busted.
+        """
+        return self.dealer.hand.value, self.dealer.hand.blackjack(self.rules.triple7), self.dealer.hand.busted()
 
-    def get_hand_winnings(self, hand):
+    def get_hand_winnings(self, hand, stake=None, dealer_outcome=None):
+        """
+        Returns: The winnings and the bet of a finished hand. stake defaults to the round's stake and dealer_outcome
+        to the dealer_outcome() of the current dealer hand, tables settling many hands pass it in once.
+        """
+        if stake is None:
+            stake = self.stake
+        if dealer_outcome is None:
+            dealer_outcome = self.dealer_outcome()
+        dealer_value, dealer_blackjack, dealer_busted = dealer_outcome
         win = 0.0
-        bet = self.stake
+        bet = stake
         if not hand.surrender:
             if hand.busted():
                 status = "LOST"
             else:
-                if hand.blackjack():
-                    if self.dealer.hand.blackjack():
+                if hand.blackjack(self.rules.triple7):
+                    if dealer_blackjack:
                         status = "PUSH"
                     else:
                         status = "WON 3:2"
-                elif self.dealer.hand.busted():
+                elif dealer_busted:
                     status = "WON"
-                elif self.dealer.hand.value < hand.value:
+                elif dealer_value < hand.value:
                     status = "WON"
-                elif self.dealer.hand.value > hand.value:
+                elif dealer_value > hand.value:
                     status = "LOST"
-                elif self.dealer.hand.value == hand.value:
-                    if self.dealer.hand.blackjack():
+                elif dealer_value == hand.value:
+                    if dealer_blackjack:
                         status = "LOST"  # player's 21 vs dealers blackjack
                     else:
                         status = "PUSH"
@@ -787,49 +1131,41 @@ class Game(object):
         elif status == "WON":
             win += 1
         elif status == "WON 3:2":
-            win += 1.5
+            win += self.rules.blackjack_payout
         elif status == "SURRENDER":
             win += -0.5
         if hand.doubled:
             win *= 2
             bet *= 2
 
-        win *= self.stake
+        win *= stake
 
         return win, bet
 
     def play_round_simulation(self):
-        if self.shoe.truecount() <= 3 and self.shoe.truecount() > 2.5:
-            self.stake = BET_SPREAD_3
-            self.count_higher_bet+=1
-        elif self.shoe.truecount() <= 4 and self.shoe.truecount() > 3:
-            self.stake = BET_SPREAD_4
-            self.count_higher_bet+=1
-        elif self.shoe.truecount() <= 5 and self.shoe.truecount() > 4:
-            self.stake = BET_SPREAD_5
-            self.count_higher_bet+=1
-        elif self.shoe.truecount() <= 6 and self.shoe.truecount() > 5 :
-            self.stake = BET_SPREAD_6
-            self.count_higher_bet+=1
-        elif self.shoe.truecount() > 6:
-            self.stake = BET_SPREAD
-            self.count_higher_bet+=1
-        else:
-            self.stake = 1.0
+        self.place_bet()
+
+        if COUNT_HISTORY == "round":
+            self.shoe.record_count(self.shoe.truecount())
 
         print("Bet:" + str(self.stake))
+        if self.advisor is not None:
+            print(self.advisor.new_round())
 
         print("Dealer round = d | Ace = 1 | Jack = j | Queen = q | King = k | 2, 3, 4, 5, 6, 7, 8, 9")
         dealer_card = input("Input Dealer's card:")
         dealer_card = self.translate_card(dealer_card)
-        dealer_hand = Hand([self.shoe.deal_card(Card(dealer_card, CARDS[dealer_card]))])
+        dealer_hand = Hand([self.shoe.deal_card(Card(dealer_card))])
+        self.player.see(dealer_card, "dealer")
         self.dealer.set_hand(dealer_hand)
         print(self.dealer.hand)
 
         print("Input Player's card")
         player_card1 = self.translate_card(input())
+        self.player.see(player_card1, "player")
         player_card2 = self.translate_card(input())
-        player_hand = Hand([self.shoe.deal_card(Card(player_card1, CARDS[player_card1])), self.shoe.deal_card(Card(player_card2, CARDS[player_card2]))])
+        advice = self.player.see(player_card2, "player")
+        player_hand = Hand([self.shoe.deal_card(Card(player_card1)), self.shoe.deal_card(Card(player_card2))])
         self.player.set_hands(player_hand, dealer_hand)
         #print(self.player.hands)
 
@@ -841,30 +1177,37 @@ class Game(object):
             winning_chances = self.check_insurance()
             print("Insurance winning chances:")
             print(winning_chances)
-            if winning_chances >= 0.5:
+            if advice.insurance if advice is not None else self.take_insurance():
                 self.blackjackSecurity = True
                 print("---------------")
                 print("CALL INSURANCE")
                 print("---------------")
 
         self.player.play_simulation(self.shoe, self.dealer)
-        print("Input other's card")
+        print("Input other's cards, several per line like 10 k 5 1 j 9")
         while True:
             other_card = input()
             if other_card == "e":
                 break
             elif other_card == "d":
                 print("Input Dealer's draw cards:")
-                while self.dealer.hand.value < 17:
+                while self.dealer.hits():
                     dealer_card = self.translate_card(input())
-                    self.dealer.hand.add_card(self.shoe.deal_card(Card(dealer_card, CARDS[dealer_card])))
+                    self.dealer.hand.add_card(self.shoe.deal_card(Card(dealer_card)))
+                    self.player.see(dealer_card, "dealer")
                 print("Input all the other's card, then end turn with 'e'")
             else:
-                other_card = self.translate_card(other_card)
-                self.shoe.deal_card(Card(other_card, CARDS[other_card]))
+                try:
+                    names = parse_cards(other_card)
+                except ValueError as e:
+                    print(e)
+                    continue
+                self.shoe.deal_cards(names)
+                self.player.see_cards(names, "other")
+                print(self.shoe.truecount())
 
         
-        print(self.shoe.count_history)
+        print(self.shoe.count_history.tolist())
 
         for hand in self.player.hands:
             win, bet = self.get_hand_winnings(hand)
@@ -901,26 +1244,16 @@ class Game(object):
         return card
 
     def play_round(self):
-        if self.shoe.truecount() <= 3 and self.shoe.truecount() > 2.5:
-            self.stake = BET_SPREAD_3
-            self.count_higher_bet+=1
-        elif self.shoe.truecount() <= 4 and self.shoe.truecount() > 3:
-            self.stake = BET_SPREAD_4
-            self.count_higher_bet+=1
-        elif self.shoe.truecount() <= 5 and self.shoe.truecount() > 4:
-            self.stake = BET_SPREAD_5
-            self.count_higher_bet+=1
-        elif self.shoe.truecount() <= 6 and self.shoe.truecount() > 5 :
-            self.stake = BET_SPREAD_6
-            self.count_higher_bet+=1
-        elif self.shoe.truecount() > 6:
-            self.stake = BET_SPREAD
-            self.count_higher_bet+=1
-        else:
-            self.stake = 1.0
+        self.place_bet()
+
+        if COUNT_HISTORY == "round":
+            self.shoe.record_count(self.shoe.truecount())
 
         player_hand = Hand([self.shoe.deal(), self.shoe.deal()])
         dealer_hand = Hand([self.shoe.deal()])
+        hole_card = None
+        if self.rules.dealer_peek:
+            hole_card = self.shoe.deal_face_down()  # Counted when it is turned over
         self.player.set_hands(player_hand, dealer_hand)
         self.dealer.set_hand(dealer_hand)
         # print "Dealer Hand: %s" % self.dealer.hand
@@ -932,27 +1265,47 @@ class Game(object):
             #print("----------------------")
             #print("Dealer hand:")
             #print(dealer_hand.__str__())
-            winning_chances = self.check_insurance()
             #print("winning_chances")
-            #print(winning_chances)
-            if winning_chances >= 0.5:
+            #print(self.check_insurance())
+            if self.take_insurance():
                 self.blackjackSecurity = True
                 print("---------------")
                 print("CALL INSURANCE")
                 print("---------------")
 
-        
-        self.player.play(self.shoe, self.dealer)
-        self.dealer.play(self.shoe)
 
-        for hand in self.player.hands:
+        if hole_card is not None and dealer_hand.cards[0].value + hole_card.value == 21:
+            # The dealer peeked a blackjack, the round ends before the player acts
+            if self.rules.early_surrender and self.player.strategy_flag(player_hand, self.shoe) == 'Sr':
+                player_hand.surrender = True
+            dealer_hand.add_card(self.shoe.turn_over(hole_card))
+        else:
+            self.player.play(self.shoe, self.dealer)
+            if hole_card is not None:
+                dealer_hand.add_card(self.shoe.turn_over(hole_card))
+            self.dealer.play(self.shoe)
+
+        round_number = self.history.new_round() if self.history is not None else None
+        for i, hand in enumerate(self.player.hands):
             win, bet = self.get_hand_winnings(hand)
             self.money += win
             self.bet += bet
+            if self.history is not None:
+                self.history.record(self.shoe_number, round_number, 0, i, self.round_truecount, self.stake, hand,
+                                    self.dealer.hand, win, bet, self.rules.triple7)
             # print "Player Hand: %s %s (Value: %d, Busted: %r, BlackJack: %r, Splithand: %r, Soft: %r, Surrender: %r, Doubled: %r)" % (hand, status, hand.value, hand.busted(), hand.blackjack(), hand.splithand, hand.soft(), hand.surrender, hand.doubled)
 
         # print "Dealer Hand: %s (%d)" % (self.dealer.hand, self.dealer.hand.value)
 
+    def take_insurance(self):
+        """
+        Returns: Whether to insure against the dealer's Ace: at the insurance index of the player's count strategy
+        if there is one, else when at least half of the cards left are tens.
+        """
+        if self.player.count_strategy is not None:
+            return self.player.count_strategy.insure(self.shoe.truecount())
+        return self.check_insurance() >= 0.5
+
     def check_insurance(self):
         winnable = 0
         total = 0
@@ -975,67 +1328,285 @@ class Game(object):
     def get_bet(self):
         return self.bet
 
-if __name__ == "__main__":
-    importer = StrategyImporter(sys.argv[1])
-    STRATEGY=sys.argv[2]
-    simulation=sys.argv[3]
-    HARD_STRATEGY, SOFT_STRATEGY, PAIR_STRATEGY = importer.import_player_strategy()
-    DATABASE = Database("./database/bj_simulation_database.sqlite")
-    
-    moneys = []
-    bets = []
-    countings = []
-    nb_hands = 0
-    accumulate_win=0.0
-    max_drawdown=0.0
-    max_win=0.0
-    count_higher_bet=0
-    for g in range(GAMES):
-        game = Game()
-
-        if simulation == "simulation":
+class Table(Game):
+    """
+    A game with 1 to MAX_SEATS seats dealt from one shared shoe. Every seat is a (strategy, bet ramp) pair, None
+    takes the module strategy or the config's bet ramp. Cards are dealt in casino order (a first card to every seat,
+    the dealer's up-card, a second card to every seat), the seats act in turn and the dealer's hand is played and
+    evaluated once for all of them. Per-seat results accumulate in arrays indexed by seat.
+    """
+    MAX_SEATS = 7
+
+    def __init__(self, seats, seed=None, config=None):
+        if not 1 <= len(seats) <= self.MAX_SEATS:
+            raise ValueError("A table has 1 to %d seats" % self.MAX_SEATS)
+        Game.__init__(self, seed=seed, config=config)
+        self.players = [Player(strategy=strategy, rules=self.rules) for strategy, bet_ramp in seats]
+        self.bet_ramps = [bet_ramp if bet_ramp is not None else self.config.bet_ramp for strategy, bet_ramp in seats]
+        self.player = self.players[0]
+        self.stakes = np.zeros(len(seats))
+        self.moneys = np.zeros(len(seats))
+        self.bets = np.zeros(len(seats))
+        self.hands = np.zeros(len(seats), dtype=np.int64)
+        self.counts_higher_bet = np.zeros(len(seats), dtype=np.int64)
+        self.rounds = 0
+
+    def place_bet(self):
+        """
+        Set every seat's stake of the next round from the true count and the seat's bet ramp.
+        """
+        self.round_truecount = self.shoe.truecount()
+        for i, bet_ramp in enumerate(self.bet_ramps):
+            self.stakes[i] = bet_ramp.stake(self.round_truecount)
+            if self.stakes[i] != bet_ramp.base:
+                self.counts_higher_bet[i] += 1
+
+    def play_round(self):
+        self.place_bet()
+
+        if COUNT_HISTORY == "round":
+            self.shoe.record_count(self.shoe.truecount())
+
+        first_cards = [self.shoe.deal() for player in self.players]
+        dealer_hand = Hand([self.shoe.deal()])
+        for player, card in zip(self.players, first_cards):
+            player.set_hands(Hand([card, self.shoe.deal()]), dealer_hand)
+        hole_card = None
+        if self.rules.dealer_peek:
+            hole_card = self.shoe.deal_face_down()  # Counted when it is turned over
+        self.dealer.set_hand(dealer_hand)
+
+        if hole_card is not None and dealer_hand.cards[0].value + hole_card.value == 21:
+            # The dealer peeked a blackjack, the round ends before the players act
+            for player in self.players:
+                if self.rules.early_surrender and player.strategy_flag(player.hands[0], self.shoe) == 'Sr':
+                    player.hands[0].surrender = True
+            dealer_hand.add_card(self.shoe.turn_over(hole_card))
+        else:
+            for player in self.players:
+                player.play(self.shoe, self.dealer)
+            if hole_card is not None:
+                dealer_hand.add_card(self.shoe.turn_over(hole_card))
+            self.dealer.play(self.shoe)
+
+        dealer_outcome = self.dealer_outcome()
+        round_number = self.history.new_round() if self.history is not None else None
+        for i, player in enumerate(self.players):
+            for h, hand in enumerate(player.hands):
+                win, bet = self.get_hand_winnings(hand, self.stakes[i], dealer_outcome)
+                self.moneys[i] += win
+                self.bets[i] += bet
+                if self.history is not None:
+                    self.history.record(self.shoe_number, round_number, i, h, self.round_truecount, self.stakes[i],
+                                        hand, dealer_hand, win, bet, self.rules.triple7)
+            self.hands[i] += len(player.hands)
+        self.rounds += 1
+
+    def get_money(self):
+        return self.moneys.sum()
+
+    def get_bet(self):
+        return self.bets.sum()
+
+    def get_count_higher_bet(self):
+        return self.counts_higher_bet.sum()
+
+
+class Simulation(object):
+    """
+    Plays games one after the other and accumulates their results.
+    """
+    def __init__(self, simulation="", batch_size=100, config=None):
+        self.simulation = simulation
+        self.config = config
+        self.estimator = EdgeEstimator(batch_size)
+        self.moneys = []
+        self.bets = []
+        self.countings = []
+        self.nb_hands = 0
+        self.accumulate_win = 0.0
+        self.max_drawdown = 0.0
+        self.max_win = 0.0
+        self.count_higher_bet = 0
+        self.advisor = None
+
+    def play(self, games):
+        for g in range(games):
+            self.play_game()
+
+    def play_until(self, half_width, max_games):
+        """
+        Sequential stopping rule: play games until the confidence interval of the edge is narrower than
+        +/- half_width percent or max_games are played.
+        """
+        while not self.estimator.done(half_width, max_games):
+            self.play_game()
+
+    def play_game(self):
+        game = Game(config=self.config)
+
+        if self.simulation == "simulation":
+            if self.advisor is None:
+                self.advisor = LiveAdvisor((HARD_STRATEGY, SOFT_STRATEGY, PAIR_STRATEGY), game.config.decks,
+                                           BASIC_OMEGA_II, game.rules, COUNT_STRATEGY, game.config.bet_ramp,
+                                           chances=STRATEGY == "CalculatePercentage", log=SESSION_LOG)
+            game.use_advisor(self.advisor)
             while not game.shoe.reshuffle:
                 # print '%s GAME no. %d %s' % (20 * '#', i + 1, 20 * '#')
                 game.play_round_simulation()
-                nb_hands += 1
+                self.nb_hands += 1
         else:
             while not game.shoe.reshuffle:
                 # print '%s GAME no. %d %s' % (20 * '#', i + 1, 20 * '#')
                 game.play_round()
-                nb_hands += 1
-
-        moneys.append(game.get_money())
-        bets.append(game.get_bet())
-        countings += game.shoe.count_history
-        accumulate_win+=game.get_money()
-        count_higher_bet+=game.get_count_higher_bet()
-        if max_drawdown>accumulate_win:
-            max_drawdown = accumulate_win
-        elif max_win<accumulate_win:
-            max_win=accumulate_win
-
-        print("WIN for Game no. %d: %s (%s bet) (%s accumulate win) (%s times higher bets) (%s find chances in database)" % (g + 1, "{0:.2f}".format(game.get_money()), "{0:.2f}".format(game.get_bet()), accumulate_win, count_higher_bet, str(DATABASE.count_database_searchs)))
-
-    sume = 0.0
-    total_bet = 0.0
-    for value in moneys:
-        sume += value
-    for value in bets:
-        total_bet += value
-
-    print("\n%d hands overall, %0.2f hands per game on average" % (nb_hands, float(nb_hands) / GAMES))
-    print("%0.2f total bet" % total_bet)
-    print("Overall winnings: {} (edge = {} %)".format("{0:.2f}".format(sume), "{0:.3f}".format(100.0*sume/total_bet)))
-    print("%0.2f max drawdown" % max_drawdown)
-    print("%0.2f max win" % max_win)
-
-    moneys = sorted(moneys)
-    fit = stats.norm.pdf(moneys, np.mean(moneys), np.std(moneys))  # this is a fitting indeed
-    pl.plot(moneys, fit, '-o')
-    pl.hist(moneys)
-    #pl.show()
-
-    plt.ylabel('count')
-    plt.plot(countings, label='x')
-    plt.legend()
-    #plt.show()
+                self.nb_hands += 1
+
+        self.moneys.append(game.get_money())
+        self.bets.append(game.get_bet())
+        self.estimator.add(game.get_money(), game.get_bet())
+        self.countings += game.shoe.count_history
+        self.accumulate_win += game.get_money()
+        self.count_higher_bet += game.get_count_higher_bet()
+        if self.max_drawdown > self.accumulate_win:
+            self.max_drawdown = self.accumulate_win
+        elif self.max_win < self.accumulate_win:
+            self.max_win = self.accumulate_win
+
+        print("WIN for Game no. %d: %s (%s bet) (%s accumulate win) (%s times higher bets) (%s find chances in database)" % (len(self.moneys), "{0:.2f}".format(game.get_money()), "{0:.2f}".format(game.get_bet()), self.accumulate_win, self.count_higher_bet, str(DATABASE.count_database_searchs)))
+        return game
+
+    def print_summary(self):
+        sume = 0.0
+        total_bet = 0.0
+        for value in self.moneys:
+            sume += value
+        for value in self.bets:
+            total_bet += value
+
+        print("\n%d hands overall, %0.2f hands per game on average" % (self.nb_hands, float(self.nb_hands) / len(self.moneys)))
+        print("%0.2f total bet" % total_bet)
+        print("Overall winnings: {} (edge = {} %)".format("{0:.2f}".format(sume), "{0:.3f}".format(100.0*sume/total_bet)))
+        print("%0.2f max drawdown" % self.max_drawdown)
+        print("%0.2f max win" % self.max_win)
+        if self.estimator.batches() >= EdgeEstimator.MIN_BATCHES:
+            print("edge = {0:.3f} % +/- {1:.3f} % ({2:.0f} % confidence, {3} batches of {4} games)".format(
+                self.estimator.edge(), self.estimator.half_width(), 100 * self.estimator.confidence,
+                self.estimator.batches(), self.estimator.batch_size))
+
+    def plot(self):
+        moneys = sorted(self.moneys)
+        fit = stats.norm.pdf(moneys, np.mean(moneys), np.std(moneys))  # this is a fitting indeed
+        pl.plot(moneys, fit, '-o')
+        pl.hist(moneys)
+        #pl.show()
+
+        plt.ylabel('count')
+        plt.plot(self.countings, label='x')
+        plt.legend()
+        #plt.show()
+
+
+def instrument_phases(timers):
+    """
+    Attach per-phase timers to the hot path of the simulator.
+    """
+    timers.instrument(Shoe, "init_cards", "shoe_build")
+    timers.instrument(Shoe, "deal", "dealing")
+    timers.instrument(Shoe, "deal_card", "dealing")
+    timers.instrument(Player, "strategy_flag", "strategy_lookup")
+    timers.instrument(Database, "select_table", "database_lookup")
+    timers.instrument(Player, "calculate_percentage", "probability")
+    timers.instrument(Player, "player_percentage_bust", "probability")
+    timers.instrument(Dealer, "play", "dealer_play")
+    timers.instrument(Game, "get_hand_winnings", "settlement")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BlackJack simulator with OMEGA II card counting")
+    parser.add_argument("strategy_file", help="Basic strategy .csv file")
+    parser.add_argument("strategy", help="'CalculatePercentage' to decide hit/stand on winning chances")
+    parser.add_argument("simulation", help="'simulation' to enter the cards of a real table")
+    parser.add_argument("--rules", help="Table rules, e.g. h17,nodas,nrsa,splits=3,surrender=none,payout=1.2,peek")
+    parser.add_argument("--indices", metavar="FILE",
+                        help="Count-dependent deviations (e.g. from BlackJackIndexGenerator.py) on top of the strategy")
+    parser.add_argument("--approximate-dealer", action="store_true",
+                        help="Compute the dealer's chances with the fast infinite-deck approximation")
+    parser.add_argument("--incremental-dealer", nargs="?", const="first", choices=["first", "second"],
+                        help="Update the approximate dealer chances per dealt card from first (or second) order "
+                             "effects of removal instead of recomputing them per decision")
+    parser.add_argument("--chance-table", metavar="FILE",
+                        help="Decide unambiguous hit/stand cases from a table built by BlackJackFillChanceTable.py")
+    parser.add_argument("--no-import", action="store_true",
+                        help="Do not import the dealer chances of BlackJackFillDealerChances.py at startup")
+    parser.add_argument("--shared-cache", metavar="NAME",
+                        help="Share the dealer chances with other processes using the same NAME in shared memory; "
+                             "they are written to the database once at the end")
+    parser.add_argument("--history", metavar="FILE",
+                        help="Append every settled hand to a binary hand history (read it with BlackJackHistory.py)")
+    parser.add_argument("--record", metavar="FILE",
+                        help="In simulation mode, log the entered cards for BlackJackReplay.py")
+    parser.add_argument("--timers", metavar="FILE", help="Time the phases of the run and dump them as JSON")
+    parser.add_argument("--profile", metavar="DIR", help="Profile the game loop and write the reports to DIR")
+    parser.add_argument("--profile-mode", choices=["cprofile", "sampling"], default="cprofile",
+                        help="Deterministic cProfile or a low overhead statistical sampler")
+    parser.add_argument("--profile-top", type=int, default=25, metavar="N", help="Entries in the allocation report")
+    parser.add_argument("--target-halfwidth", type=float, metavar="PCT",
+                        help="Play until the edge is known to +/- PCT percent (95 %% confidence) instead of GAMES games")
+    parser.add_argument("--max-games", type=int, default=GAMES, help="Game budget of the sequential stopping rule")
+    parser.add_argument("--batch-size", type=int, default=100, help="Games per batch of the edge variance estimate")
+    args = parser.parse_args()
+
+    importer = StrategyImporter(args.strategy_file)
+    STRATEGY = args.strategy
+    APPROXIMATE_DEALER = args.approximate_dealer
+    INCREMENTAL_DEALER = args.incremental_dealer
+    HARD_STRATEGY, SOFT_STRATEGY, PAIR_STRATEGY = importer.import_player_strategy()
+    if args.indices:
+        COUNT_STRATEGY = CountStrategy((HARD_STRATEGY, SOFT_STRATEGY, PAIR_STRATEGY),
+                                       IndexImporter(args.indices).import_indices())
+    DATABASE = Database("./database/bj_simulation_database.sqlite")
+    if args.shared_cache:
+        CHANCE_CACHE = SharedChanceCache.open(args.shared_cache)
+
+    timers = None
+    if args.timers:
+        timers = Timers()
+        instrument_phases(timers)
+
+    config = default_config()
+    if args.rules:
+        config.rules = Rules.parse(args.rules)
+    # The filler's dealer stands on every 17, its chances are of no use under h17
+    if STRATEGY == "CalculatePercentage" and not args.no_import and not config.rules.hit_soft_17 \
+            and os.path.exists(FILLER_DATABASE):
+        print("%d dealer chances imported from %s" % (DATABASE.import_filler(FILLER_DATABASE), FILLER_DATABASE))
+    if args.chance_table:
+        CHANCE_TABLE = ChanceTable.load(args.chance_table, config.decks)
+    if args.history:
+        HISTORY = HandHistoryWriter(args.history, config.decks)
+    if args.record:
+        SESSION_LOG = SessionLogWriter(args.record, config.decks)
+    run = Simulation(args.simulation, args.batch_size, config)
+    if args.target_halfwidth:
+        play, play_args, repeat = run.play_until, (args.target_halfwidth, args.max_games), 1
+    else:
+        play, play_args, repeat = run.play_game, (), GAMES
+    if args.profile:
+        profiler = Profiler(args.profile, args.profile_mode, args.profile_top)
+        profiler.run(play, *play_args, repeat=repeat, classes=[Shoe, Hand, Card, Player, Dealer, Game, Simulation, Database])
+    else:
+        for g in range(repeat):
+            play(*play_args)
+    run.print_summary()
+
+    if timers:
+        timers.dump(args.timers)
+    if HISTORY is not None:
+        HISTORY.close()
+    if CHANCE_CACHE is not None:
+        store_chance_cache(DATABASE, CHANCE_CACHE)
+        CHANCE_CACHE.close()
+    if run.advisor is not None:
+        run.advisor.close()
+
+    run.plot()
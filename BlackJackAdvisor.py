@@ -0,0 +1,51 @@
+import argparse
+
+from BlackJack import BASIC_OMEGA_II, default_config
+from advice.AdvisorServer import SOCKET_PATH, AdvisorServer
+from advice.LiveAdvisor import LATENCY_BUDGET, LiveAdvisor
+from chances.ChanceTable import ChanceTable
+from config.CountStrategy import CountStrategy
+from config.Rules import Rules
+from history.SessionLog import SessionLogWriter, log_path
+from importer.IndexImporter import IndexImporter
+from importer.StrategyImporter import StrategyImporter
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve live advice for several tables over a UNIX socket "
+                                                 "(talk to it with BlackJackAdvisorClient.py)")
+    parser.add_argument("strategy_file", help="Basic strategy .csv file")
+    parser.add_argument("--socket", default=SOCKET_PATH, help="Path of the UNIX socket")
+    parser.add_argument("--indices", metavar="FILE", help="Count-dependent deviations on top of the strategy")
+    parser.add_argument("--rules", help="Table rules, e.g. h17,nodas,nrsa,splits=3,surrender=none,payout=1.2,peek")
+    parser.add_argument("--decks", type=int, help="Decks per shoe (default SHOE_SIZE)")
+    parser.add_argument("--percentage", action="store_true",
+                        help="Decide hit and stand on the winning chances like CalculatePercentage")
+    parser.add_argument("--chance-table", metavar="FILE", help="Chance table consulted before the Tree convolution")
+    parser.add_argument("--latency", type=float, default=LATENCY_BUDGET,
+                        help="Seconds a card may wait for its precomputed advice")
+    parser.add_argument("--record", metavar="DIR",
+                        help="Log the cards of every session to DIR/<name>.bjsl for BlackJackReplay.py")
+    args = parser.parse_args()
+
+    config = default_config()
+    if args.rules:
+        config.rules = Rules.parse(args.rules)
+    decks = args.decks or config.decks
+    strategy = StrategyImporter(args.strategy_file).import_player_strategy()
+    count_strategy = CountStrategy(strategy, IndexImporter(args.indices).import_indices()) if args.indices else None
+    chance_table = ChanceTable.load(args.chance_table, decks) if args.chance_table else None
+
+    def make_advisor(name):
+        log = SessionLogWriter(log_path(args.record, name), decks) if args.record else None
+        return LiveAdvisor(strategy, decks, BASIC_OMEGA_II, config.rules, count_strategy, config.bet_ramp,
+                           chances=args.percentage, latency=args.latency, chance_table=chance_table, log=log)
+
+    server = AdvisorServer(args.socket, make_advisor)
+    print("Advising on %s (%d decks, rules %s)" % (args.socket, decks, config.rules))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
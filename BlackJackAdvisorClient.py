@@ -0,0 +1,52 @@
+import argparse
+import socket
+
+# Only the standard library: the client starts instantly, the advisor daemon keeps the heavy state warm.
+SOCKET_PATH = "/tmp/blackjack-advisor.sock"
+SHORTCUTS = {"n": "ROUND", "s": "SHUFFLE", "?": "ADVICE", "x": "STATS", "q": "QUIT"}
+SOURCES = {"d": "dealer", "p": "player", "o": "other"}
+
+USAGE = """n = new round | s = shoe shuffled | ? = advice | x = stats | q = quit
+d CARDS = dealer's cards | p CARDS = your cards | CARDS = other cards (Ace = 1, Jack = j, Queen = q, King = k)"""
+
+
+def request(line):
+    """
+    Returns: The protocol request of a line typed at the table.
+    """
+    words = line.split()
+    if len(words) == 1 and words[0] in SHORTCUTS:
+        return SHORTCUTS[words[0]]
+    if words[0] in SOURCES:
+        return "CARD %s %s" % (SOURCES[words[0]], " ".join(words[1:]))
+    return "CARD other %s" % " ".join(words)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Enter the cards of a table into a running BlackJackAdvisor.py")
+    parser.add_argument("--socket", default=SOCKET_PATH, help="Path of the advisor's UNIX socket")
+    parser.add_argument("--session", default="default", help="Table name, reconnecting resumes its shoe")
+    args = parser.parse_args()
+
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.connect(args.socket)
+    replies = connection.makefile("r")
+
+    def send(text):
+        connection.sendall((text + "\n").encode("utf-8"))
+        return replies.readline().rstrip("\n")
+
+    print(send("SESSION %s" % args.session))
+    print(USAGE)
+    while True:
+        try:
+            line = input()
+        except EOFError:
+            line = "q"
+        if not line.strip():
+            continue
+        reply = send(request(line))
+        print(reply)
+        if reply == "OK bye" or not reply:
+            break
+    connection.close()
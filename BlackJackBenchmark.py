@@ -0,0 +1,214 @@
+import argparse
+import json
+import random
+import sys
+from time import perf_counter_ns
+
+import BlackJack
+from BlackJack import CARDS, SHOE_SIZE, Card, Database, Dealer, Game, Hand, Player, Shoe
+from config.CountStrategy import CountStrategy
+from importer.StrategyImporter import StrategyImporter
+
+
+BENCHMARK_SEED = 2014
+STRATEGY_FILE = "strategy/BasicStrategyNoSr.csv"
+INDICES = [("HARD", 16, "Ten", 0.0, "S", "H"), ("HARD", 15, "Ten", 4.0, "S", "H"), ("HARD", 12, "Three", 2.0, "S", "H"),
+           ("HARD", 12, "Two", 3.0, "S", "H"), ("HARD", 10, "Ten", 4.0, "D", "H"), ("PAIR", 10, "Six", 4.0, "P", "S"),
+           ("INSURANCE", None, "Ace", 3.0, "Y", "N")]
+TOLERANCE = 0.25  # Flag a benchmark as regressed if it is more than 25 % slower than the baseline
+
+# Dealer up-cards and penetrations (ratio of cards left in the shoe) for the probability benchmark.
+# Low up-cards recurse much deeper, Two and Ace take tens of seconds each and are only run with --full.
+PERCENTAGE_UP_CARDS = ["Ten", "Seven", "Six"]
+PERCENTAGE_UP_CARDS_FULL = ["Ace", "Two"]
+PERCENTAGE_PENETRATIONS = [0.9, 0.6]
+
+
+def dealt_shoe(penetration):
+    """
+    Returns: A fresh shoe dealt down until only the given ratio of cards is left.
+    """
+    shoe = Shoe(SHOE_SIZE)
+    while shoe.shoe_penetration() > penetration:
+        shoe.deal()
+    return shoe
+
+
+def empty_possibilities():
+    return {"17": 0.0, "18": 0.0, "19": 0.0, "20": 0.0, "21": 0.0, "Busted": 0.0}
+
+
+class Benchmark(object):
+    """
+    A single timed operation. setup() builds a fresh fixture from a fixed seed for every repetition, run(fixture)
+    performs ops operations on it. The result is the best time per operation over all repetitions.
+    """
+    def __init__(self, name, run, setup=None, ops=1, repeat=5):
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.ops = ops
+        self.repeat = repeat
+
+    def measure(self):
+        best = None
+        for r in range(self.repeat):
+            random.seed(BENCHMARK_SEED + r)
+            fixture = self.setup() if self.setup else None
+            start = perf_counter_ns()
+            self.run(fixture)
+            elapsed = perf_counter_ns() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        return {"ns_per_op": best / self.ops, "ops": self.ops, "repeat": self.repeat}
+
+
+def hand_fixtures():
+    names = [["Ten", "Six"], ["Ace", "Six"], ["Ace", "Ace", "Nine"], ["Five", "Ace", "Ace", "Ten"], ["Ace", "King"],
+             ["Two", "Three", "Four", "Five", "Six"], ["Seven", "Seven", "Seven"], ["Ace", "Five", "Ace", "Ace", "Ace"]]
+    return [[Card(name) for name in cards] for cards in names]
+
+
+def run_hand_value(fixtures):
+    for i in range(1000):
+        for cards in fixtures:
+            Hand(cards).value
+
+
+def run_deal(shoe):
+    for i in range(200):
+        shoe.deal()
+
+
+def setup_play_hand():
+    return Shoe(SHOE_SIZE), Player()
+
+
+def setup_play_hand_indices():
+    strategy = (BlackJack.HARD_STRATEGY, BlackJack.SOFT_STRATEGY, BlackJack.PAIR_STRATEGY)
+    return Shoe(SHOE_SIZE), Player(count_strategy=CountStrategy(strategy, INDICES))
+
+
+def run_play_hand(fixture):
+    shoe, player = fixture
+    for i in range(100):
+        player_hand = Hand([shoe.deal(), shoe.deal()])
+        dealer_hand = Hand([shoe.deal()])
+        player.set_hands(player_hand, dealer_hand)
+        player.play_hand(player_hand, shoe)
+
+
+def setup_percentage(up_card, penetration):
+    def setup():
+        shoe = dealt_shoe(penetration)
+        return Hand([Card(up_card)]), shoe
+    return setup
+
+
+def run_percentage(fixture):
+    hand, shoe = fixture
+    Player().calculate_percentage(hand, shoe, empty_possibilities())
+
+
+SELECT_CHANCES = """SELECT * FROM BLACKJACK_CHANCES WHERE dealer=? AND Ace=? AND Two=? AND Three=? AND Four=? AND Five=? AND Six=?
+    AND Seven=? AND Eight=? AND Nine=? AND Ten=? AND Hit_soft_17=0"""
+
+
+def setup_database():
+    database = Database(":memory:")
+    for ten in range(128):
+        database.insert_update_table("""INSERT INTO BLACKJACK_CHANCES (
+            dealer, Ace, Two, Three, Four, Five, Six, Seven, Eight, Nine, Ten, Seventeen, Eightteen, Nineteen, Twenty, Twentyone, Busted)
+            VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""",
+            ("Ten", 32, 32, 32, 32, 32, 32, 32, 32, 32, ten, 0.1, 0.1, 0.1, 0.3, 0.1, 0.3))
+    return database
+
+
+def run_select_hit(database):
+    for i in range(1000):
+        database.select_table(SELECT_CHANCES, ("Ten", 32, 32, 32, 32, 32, 32, 32, 32, 32, i % 128))
+
+
+def run_select_miss(database):
+    for i in range(1000):
+        database.select_table(SELECT_CHANCES, ("Six", 32, 32, 32, 32, 32, 32, 32, 32, 32, i % 128))
+
+
+def run_import_strategy(fixture):
+    for i in range(100):
+        StrategyImporter(STRATEGY_FILE).import_player_strategy()
+
+
+def run_play_rounds(game):
+    for i in range(500):
+        if game.shoe.reshuffle:
+            game.shoe = Shoe(SHOE_SIZE)
+        game.play_round()
+
+
+def benchmarks(full=False):
+    suite = [
+        Benchmark("shoe_init_cards", lambda fixture: [Shoe(SHOE_SIZE) for i in range(20)], ops=20),
+        Benchmark("shoe_deal", run_deal, setup=lambda: Shoe(SHOE_SIZE), ops=200),
+        Benchmark("hand_value", run_hand_value, setup=hand_fixtures, ops=8000),
+        Benchmark("import_player_strategy", run_import_strategy, ops=100),
+        Benchmark("player_play_hand", run_play_hand, setup=setup_play_hand, ops=100),
+        Benchmark("player_play_hand_indices", run_play_hand, setup=setup_play_hand_indices, ops=100),
+        Benchmark("database_select_hit", run_select_hit, setup=setup_database, ops=1000),
+        Benchmark("database_select_miss", run_select_miss, setup=setup_database, ops=1000),
+        Benchmark("game_play_round", run_play_rounds, setup=Game, ops=500),
+    ]
+    up_cards = PERCENTAGE_UP_CARDS + (PERCENTAGE_UP_CARDS_FULL if full else [])
+    for up_card in up_cards:
+        for penetration in PERCENTAGE_PENETRATIONS:
+            suite.append(Benchmark("calculate_percentage_%s_%d" % (up_card, int(100 * penetration)), run_percentage,
+                                   setup=setup_percentage(up_card, penetration), repeat=1))
+    return suite
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns: The names of the benchmarks that got slower than the baseline by more than the tolerance.
+    """
+    regressions = []
+    for name in sorted(results):
+        if name not in baseline:
+            print("%-36s %14.0f ns/op (new)" % (name, results[name]["ns_per_op"]))
+            continue
+        ratio = results[name]["ns_per_op"] / baseline[name]["ns_per_op"]
+        flag = ""
+        if ratio > 1.0 + tolerance:
+            flag = "REGRESSION"
+            regressions.append(name)
+        print("%-36s %14.0f ns/op %7.2fx %s" % (name, results[name]["ns_per_op"], ratio, flag))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the simulator's core operations")
+    parser.add_argument("--save", metavar="FILE", help="Store the results as JSON baseline")
+    parser.add_argument("--compare", metavar="FILE", help="Compare the results against a JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="Allowed slowdown ratio before flagging")
+    parser.add_argument("--only", metavar="PREFIX", help="Run only benchmarks whose name starts with PREFIX")
+    parser.add_argument("--full", action="store_true", help="Include the slow Ace and Two dealer up-cards")
+    args = parser.parse_args()
+
+    BlackJack.HARD_STRATEGY, BlackJack.SOFT_STRATEGY, BlackJack.PAIR_STRATEGY = StrategyImporter(STRATEGY_FILE).import_player_strategy()
+
+    results = {}
+    for benchmark in benchmarks(args.full):
+        if args.only and not benchmark.name.startswith(args.only):
+            continue
+        results[benchmark.name] = benchmark.measure()
+        if not args.compare:
+            print("%-36s %14.0f ns/op" % (benchmark.name, results[benchmark.name]["ns_per_op"]))
+
+    if args.save:
+        with open(args.save, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
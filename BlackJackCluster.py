@@ -0,0 +1,149 @@
+import argparse
+import os
+
+import BlackJack
+from BlackJack import FILLER_DATABASE, Database, Game, default_config, store_chance_cache
+from chances.SharedChanceCache import SharedChanceCache
+from cluster.ShardQueue import STALE_SECONDS, FileQueue, LocalQueue
+from config.Rules import Rules
+from estimation.GameStats import HISTOGRAM_EDGES, GameStats
+from importer.StrategyImporter import StrategyImporter
+
+
+GAMES = 10000
+SEED = 1
+SHARD_GAMES = 500  # Games per shard; fixes the shards, so the results do not depend on the number of workers
+DATABASE_PATH = "./database/bj_simulation_database.sqlite"
+
+
+def play_shard(job, first_game, games):
+    """
+    Play games first_game .. first_game + games - 1 of a job, each from its own seed.
+    Returns: The GameStats of the shard.
+    """
+    strategy, percentage, approximate_dealer, config, seed, cache_name = job
+    if percentage:
+        BlackJack.STRATEGY = "CalculatePercentage"
+        BlackJack.APPROXIMATE_DEALER = approximate_dealer
+        if BlackJack.DATABASE == "":
+            BlackJack.DATABASE = Database(DATABASE_PATH)
+        if cache_name and BlackJack.CHANCE_CACHE is None:
+            BlackJack.CHANCE_CACHE = SharedChanceCache.attach(cache_name)
+    stats = GameStats()
+    for g in range(first_game, first_game + games):
+        game = Game(strategy, seed + g, config)
+        hands = 0
+        while not game.shoe.reshuffle:
+            game.play_round()
+            hands += len(game.player.hands)  # A split round plays several hands
+        stats.add(game.get_money(), game.get_bet(), hands, game.get_count_higher_bet())
+    return stats
+
+
+def import_filler():
+    """
+    Import the dealer chances of BlackJackFillDealerChances.py once per machine, before the processes open the
+    database. They are tagged as S17 chances, so an h17 job does not read them.
+    """
+    if os.path.exists(FILLER_DATABASE):
+        Database(DATABASE_PATH).import_filler(FILLER_DATABASE)
+
+
+def shards(games, shard_games):
+    return [(first_game, min(shard_games, games - first_game)) for first_game in range(0, games, shard_games)]
+
+
+def coordinate(queue, job, games, shard_games):
+    """
+    Hand the shards of a job to a queue and merge their statistics in shard order, which makes the result the same
+    as one sequential run of all games.
+    """
+    stats = GameStats()
+    for shard_stats in queue.run(job, shards(games, shard_games)):
+        stats.merge(shard_stats)
+    return stats
+
+
+def print_summary(stats):
+    print("%d games, %d hands overall, %0.2f hands per game on average" % (
+        stats.games, stats.hands, float(stats.hands) / stats.games))
+    print("%0.2f total bet" % stats.bet)
+    print("Overall winnings: %0.2f (edge = %0.3f %% +/- %0.3f %%, %0.0f %% confidence)" % (
+        stats.money, stats.edge(), stats.half_width(), 100 * stats.confidence))
+    print("%0.2f standard deviation per game" % stats.standard_deviation())
+    print("%0.2f max drawdown" % stats.lowest)
+    print("%0.2f max win" % stats.highest)
+    print("%0.2f largest fall from a peak" % stats.drawdown)
+    print("%d times higher bets" % stats.count_higher_bet)
+    print("Winnings per game:")
+    bounds = [float("-inf")] + list(HISTOGRAM_EDGES) + [float("inf")]
+    for i, number in enumerate(stats.histogram):
+        if number:
+            print("  [%7.1f, %7.1f) %8d" % (bounds[i], bounds[i + 1], number))
+
+
+def add_job_arguments(parser):
+    parser.add_argument("strategy_file", help="Basic strategy .csv file")
+    parser.add_argument("--percentage", action="store_true",
+                        help="Decide hit and stand on the winning chances (CalculatePercentage)")
+    parser.add_argument("--approximate-dealer", action="store_true",
+                        help="With --percentage, use the infinite-deck approximation of the dealer's chances")
+    parser.add_argument("--rules", help="Table rules, e.g. h17,nodas,nrsa,splits=3,surrender=none,payout=1.2,peek")
+    parser.add_argument("--games", type=int, default=GAMES)
+    parser.add_argument("--shard-games", type=int, default=SHARD_GAMES, help="Games per shard")
+    parser.add_argument("--seed", type=int, default=SEED, help="Seed of the first shoe")
+
+
+def make_job(args, cache_name=None):
+    config = default_config()
+    if args.rules:
+        config.rules = Rules.parse(args.rules)
+    strategy = StrategyImporter(args.strategy_file).import_player_strategy()
+    return strategy, args.percentage, args.approximate_dealer, config, args.seed, cache_name
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate seeded shards of games on several machines")
+    commands = parser.add_subparsers(dest="command", required=True)
+    local = commands.add_parser("local", help="Play the shards over a process pool on this machine")
+    add_job_arguments(local)
+    local.add_argument("--processes", type=int, default=os.cpu_count())
+    coordinator = commands.add_parser("coordinate", help="Hand the shards to workers through a shared directory")
+    coordinator.add_argument("directory", help="Queue directory every worker can reach")
+    add_job_arguments(coordinator)
+    coordinator.add_argument("--timeout", type=float, default=STALE_SECONDS,
+                             help="Seconds without a heartbeat after which a shard is handed to another worker")
+    worker = commands.add_parser("work", help="Play shards from a queue directory until its run is finished")
+    worker.add_argument("directory", help="Queue directory of the coordinator")
+    worker.add_argument("--name", help="Worker name (default host-pid)")
+    worker.add_argument("--shared-cache", metavar="NAME",
+                        help="Share the dealer chances with the other workers of this machine using the same NAME")
+    args = parser.parse_args()
+
+    if args.command == "work":
+        import_filler()
+        if args.shared_cache:
+            BlackJack.CHANCE_CACHE = SharedChanceCache.open(args.shared_cache)
+        FileQueue(args.directory).work(play_shard, args.name)
+        if BlackJack.CHANCE_CACHE is not None:
+            store_chance_cache(Database(DATABASE_PATH), BlackJack.CHANCE_CACHE)
+            BlackJack.CHANCE_CACHE.close()
+    elif args.command == "local":
+        # The pool's processes share one chance cache, the database is written once at the end
+        cache = None
+        if args.percentage:
+            if not (args.rules and Rules.parse(args.rules).hit_soft_17):
+                import_filler()
+            cache = SharedChanceCache.create()
+        try:
+            stats = coordinate(LocalQueue(play_shard, args.processes), make_job(args, cache and cache.name),
+                               args.games, args.shard_games)
+            if cache is not None:
+                store_chance_cache(Database(DATABASE_PATH), cache)
+        finally:
+            if cache is not None:
+                cache.close()
+        print_summary(stats)
+    else:
+        print_summary(coordinate(FileQueue(args.directory, args.timeout), make_job(args), args.games,
+                                 args.shard_games))
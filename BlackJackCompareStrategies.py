@@ -0,0 +1,82 @@
+import argparse
+import math
+
+from BlackJack import Game, default_config
+from config.Rules import Rules
+from importer.StrategyImporter import StrategyImporter
+
+
+GAMES = 10000
+SEED = 1
+
+
+class PairedComparison(object):
+    """
+    Plays several strategies against identical shoes (common random numbers): game g of every strategy is dealt from
+    a shoe shuffled with seed + g. Because all strategies see the same cards, most of the luck of the shoe cancels out
+    in the per-game differences and strategy deltas resolve with far fewer games than with independent runs.
+    """
+    def __init__(self, strategy_files, seed=SEED, config=None):
+        self.strategy_files = strategy_files
+        self.config = config
+        self.strategies = [StrategyImporter(f).import_player_strategy() for f in strategy_files]
+        self.seed = seed
+        self.moneys = [[] for s in self.strategies]
+        self.bets = [[] for s in self.strategies]
+
+    def play(self, games):
+        for g in range(games):
+            for i, strategy in enumerate(self.strategies):
+                game = Game(strategy, self.seed + g, self.config)
+                while not game.shoe.reshuffle:
+                    game.play_round()
+                self.moneys[i].append(game.get_money())
+                self.bets[i].append(game.get_bet())
+
+    def edge(self, i):
+        return 100.0 * sum(self.moneys[i]) / sum(self.bets[i])
+
+    def difference(self, i, reference=0):
+        """
+        Returns: Mean per-game difference in winnings of strategy i against the reference strategy, its standard
+        error and the standard error two independent runs of the same length would have had.
+        """
+        n = len(self.moneys[i])
+        differences = [a - b for a, b in zip(self.moneys[i], self.moneys[reference])]
+        mean = sum(differences) / n
+        variance = sum((d - mean) ** 2 for d in differences) / (n - 1)
+        independent = (sample_variance(self.moneys[i]) + sample_variance(self.moneys[reference])) / n
+        return mean, math.sqrt(variance / n), math.sqrt(independent)
+
+    def print_summary(self):
+        games = len(self.moneys[0])
+        print("%d games per strategy on common shoes (seeds %d..%d)\n" % (games, self.seed, self.seed + games - 1))
+        for i, strategy_file in enumerate(self.strategy_files):
+            print("%-40s winnings %10.2f  edge %7.3f %%" % (strategy_file, sum(self.moneys[i]), self.edge(i)))
+        print("")
+        for i in range(1, len(self.strategy_files)):
+            mean, paired_error, independent_error = self.difference(i)
+            print("%s - %s: %+.4f per game +/- %.4f (paired standard error, %.4f unpaired, %.1fx fewer games needed)" % (
+                self.strategy_files[i], self.strategy_files[0], mean, paired_error, independent_error,
+                (independent_error / paired_error) ** 2 if paired_error else float("inf")))
+
+
+def sample_variance(values):
+    mean = sum(values) / len(values)
+    return sum((v - mean) ** 2 for v in values) / (len(values) - 1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare strategies on common random numbers (identical shoes)")
+    parser.add_argument("strategy_files", nargs="+", help="Basic strategy .csv files, the first one is the reference")
+    parser.add_argument("--games", type=int, default=GAMES, help="Games (shoes) per strategy")
+    parser.add_argument("--seed", type=int, default=SEED, help="Seed of the first shoe")
+    parser.add_argument("--rules", help="Rule set like h17,nodas,splits=3,surrender=none,payout=1.2,peek")
+    args = parser.parse_args()
+
+    config = default_config()
+    if args.rules:
+        config.rules = Rules.parse(args.rules)
+    comparison = PairedComparison(args.strategy_files, args.seed, config)
+    comparison.play(args.games)
+    comparison.print_summary()
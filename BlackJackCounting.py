@@ -1,4 +1,6 @@
 import sys
+from array import array
+from collections import Counter
 from random import shuffle
 
 import numpy as np
@@ -11,6 +13,11 @@ import sqlite3
 from sqlite3 import Error
 
 from importer.StrategyImporter import StrategyImporter
+from history.SessionLog import SessionLogWriter
+from advice.Cards import parse_cards
+from advice.LiveAdvisor import LiveAdvisor
+from config.BetRamp import BetRamp
+from config.Rules import Rules
 
 SHOE_SIZE = 8
 SHOE_PENETRATION = 0.5
@@ -33,6 +40,8 @@ HARD_STRATEGY = {}
 SOFT_STRATEGY = {}
 PAIR_STRATEGY = {}
 
+COUNT_HISTORY = None  # Record the true count per "card" or not at all (None), nothing here consumes it
+
 class Card(object):
     """
     Represents a playing card with name and value.
@@ -53,9 +62,9 @@ class Shoe(object):
 
     def __init__(self, decks):
         self.count = 0
-        self.count_history = []
-        self.ideal_count = {}
         self.decks = decks
+        self.init_count_history()
+        self.ideal_count = {}
         self.cards = self.init_cards()
         self.init_count()
 
@@ -65,12 +74,37 @@ class Shoe(object):
             s += "%s\n" % c
         return s
 
+    def init_count_history(self):
+        """
+        Preallocate the true count history, at most one entry per card in the shoe plus the initial count.
+        """
+        if COUNT_HISTORY:
+            self._count_history = array('f', bytes(4 * (int(DECK_SIZE) * self.decks + 1)))
+        else:
+            self._count_history = array('f')
+        self._count_history_length = 0
+
+    @property
+    def count_history(self):
+        """
+        Returns: The recorded true counts, empty if COUNT_HISTORY is disabled.
+        """
+        return self._count_history[:self._count_history_length]
+
+    def record_count(self, truecount):
+        """
+        Append a true count to the history.
+        """
+        if COUNT_HISTORY:
+            self._count_history[self._count_history_length] = truecount
+            self._count_history_length += 1
+
     def init_cards(self):
         """
         Initialize the shoe with shuffled playing cards and set count to zero.
         """
         self.count = 0
-        self.count_history.append(self.count)
+        self.record_count(self.count)
 
         cards = []
         for d in range(self.decks):
@@ -118,6 +152,27 @@ class Shoe(object):
         self.do_count(card)
         return card
 
+    def deal_cards(self, names):
+        """
+        Account for several entered cards at once: the composition and the count are updated in one step and one
+        true count is recorded for the whole batch.
+        Returns:    The number of cards dealt.
+        """
+        if not names:
+            return 0
+        removed = Counter(names)
+        for name, number in removed.items():
+            assert self.ideal_count[name] >= number, "Either a cheater or a bug!"
+        if (len(self.cards) - len(names) + 1) / (DECK_SIZE * self.decks) < SHOE_PENETRATION:
+            self.reshuffle = True
+        del self.cards[len(self.cards) - len(names):]
+        for name, number in removed.items():
+            self.ideal_count[name] -= number
+        self.count += sum(BASIC_OMEGA_II[name] * number for name, number in removed.items())
+        if COUNT_HISTORY == "card":
+            self.record_count(self.truecount())
+        return len(names)
+
     def total_card(self):
         total_cards = 0
         for card in CARDS:
@@ -129,7 +184,8 @@ class Shoe(object):
         Add the dealt card to current count.
         """
         self.count += BASIC_OMEGA_II[card.name]
-        self.count_history.append(self.truecount())
+        if COUNT_HISTORY == "card":
+            self.record_count(self.truecount())
 
     def truecount(self):
         """
@@ -400,8 +456,9 @@ class Game(object):
     """
     A sequence of Blackjack Rounds that keeps track of total money won or lost
     """
-    def __init__(self):
+    def __init__(self, advisor=None):
         self.shoe = Shoe(SHOE_SIZE)
+        self.advisor = advisor
         self.money = 0.0
         self.bet = 0.0
         self.stake = 1.0
@@ -479,27 +536,15 @@ class Game(object):
 
 
     def play_round_simulation(self):
+        self.advisor.shuffle()
         while True:
+            advice = self.advisor.new_round()
             print("TRUECOUNT")
             #print(self.shoe.count_history)
-            print(self.shoe.truecount())
-            if self.shoe.truecount() <= 3 and self.shoe.truecount() > 2.5:
-                self.stake = BET_SPREAD_3
-                self.count_higher_bet+=1
-            elif self.shoe.truecount() <= 4 and self.shoe.truecount() > 3:
-                self.stake = BET_SPREAD_4
-                self.count_higher_bet+=1
-            elif self.shoe.truecount() <= 5 and self.shoe.truecount() > 4:
-                self.stake = BET_SPREAD_5
-                self.count_higher_bet+=1
-            elif self.shoe.truecount() <= 6 and self.shoe.truecount() > 5 :
-                self.stake = BET_SPREAD_6
-                self.count_higher_bet+=1
-            elif self.shoe.truecount() > 6:
-                self.stake = BET_SPREAD
-                self.count_higher_bet+=1
-            else:
-                self.stake = 1.0
+            print(advice.truecount)
+            self.stake = advice.stake
+            if self.stake != self.advisor.bet_ramp.base:
+                self.count_higher_bet += 1
 
             print("------ Bet:" + str(self.stake) + "------")
 
@@ -507,23 +552,17 @@ class Game(object):
             dealer_card = input("Input Dealer's card: ")
             dealer_card = self.translate_card(dealer_card)
             dealer_hand = Hand([self.shoe.deal_card(Card(dealer_card, CARDS[dealer_card]))])
+            advice = self.advisor.see(dealer_card, "dealer")
             self.dealer.set_hand(dealer_hand)
 
             self.blackjackSecurity = False
-            if self.dealer.hand.cards[0].name == "Ace":
-                #print("----------------------")
-                #print("Dealer hand:")
-                #print(dealer_hand.__str__())
-                winning_chances = self.check_insurance()
-                print("Insurance winning chances: ")
-                print(winning_chances)
-                if winning_chances >= 0.5:
-                    self.blackjackSecurity = True
-                    print("---------------")
-                    print("CALL INSURANCE")
-                    print("---------------")
-
-            print("Input other's card")
+            if advice.insurance:
+                self.blackjackSecurity = True
+                print("---------------")
+                print("CALL INSURANCE")
+                print("---------------")
+
+            print("Input other's cards, several per line like 10 k 5 1 j 9 (your own cards as p 10 6)")
             while True:
                 other_card = input()
                 #if other_card == "e":
@@ -532,12 +571,21 @@ class Game(object):
                     while self.dealer.hand.value < 17:
                         dealer_card = self.translate_card(input())
                         self.dealer.hand.add_card(self.shoe.deal_card(Card(dealer_card, CARDS[dealer_card])))
+                        self.advisor.see(dealer_card, "dealer")
                     break
                     #print("Input all the other's card, then end round with 'e'")
                 else:
-                    other_card = self.translate_card(other_card)
-                    self.shoe.deal_card(Card(other_card, CARDS[other_card]))
-                    print(self.shoe.truecount())
+                    source = "other"
+                    if other_card.startswith("p"):
+                        source, other_card = "player", other_card[1:]
+                    try:
+                        names = parse_cards(other_card)
+                    except ValueError as e:
+                        print(e)
+                        continue
+                    self.shoe.deal_cards(names)
+                    advice = self.advisor.see_cards(names, source)
+                    print(advice if source == "player" else advice.truecount)
                     
 
             check = input("Input 1 if shoe is shuffled")
@@ -569,7 +617,12 @@ if __name__ == "__main__":
     importer = StrategyImporter(sys.argv[1])
     HARD_STRATEGY, SOFT_STRATEGY, PAIR_STRATEGY = importer.import_player_strategy()
 
+    bet_ramp = BetRamp([(2.5, BET_SPREAD_3), (3, BET_SPREAD_4), (4, BET_SPREAD_5), (5, BET_SPREAD_6), (6, BET_SPREAD)])
+    log = SessionLogWriter(sys.argv[2], SHOE_SIZE) if len(sys.argv) > 2 else None  # Cards for BlackJackReplay.py
+    advisor = LiveAdvisor((HARD_STRATEGY, SOFT_STRATEGY, PAIR_STRATEGY), SHOE_SIZE, BASIC_OMEGA_II,
+                          Rules(**BLACKJACK_RULES), bet_ramp=bet_ramp, log=log)
+
     while True:
         print("--------------New game--------------")
-        game = Game()
+        game = Game(advisor)
         game.play_round_simulation()
\ No newline at end of file
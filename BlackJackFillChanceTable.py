@@ -0,0 +1,23 @@
+import argparse
+
+import numpy as np
+
+from BlackJack import BASIC_OMEGA_II, SHOE_SIZE
+from chances.ChanceTable import ChanceTable
+
+
+SHOES = 20000
+SEED = 1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute hit/stand winning chances bucketed by true count")
+    parser.add_argument("--decks", type=int, default=SHOE_SIZE)
+    parser.add_argument("--shoes", type=int, default=SHOES, help="Random shoe states to average over")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--output", default="./database/chance_table.npz")
+    args = parser.parse_args()
+
+    table = ChanceTable.build(args.decks, BASIC_OMEGA_II, args.shoes, args.seed)
+    table.save(args.output)
+    filled = table.samples > 0
+    print("%d cells filled, median error bound %.4f" % (filled.sum(), np.median(table.bound[filled])))
@@ -0,0 +1,39 @@
+import argparse
+
+from history.HandHistory import ACTIONS, CARD_NAMES, check_header, outcome_by_start, outcome_by_truecount, read_history
+
+
+def edge(bet, win):
+    return 100.0 * win / bet if bet else 0.0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyse a binary hand history written with --history")
+    parser.add_argument("history_file", help="Hand history file")
+    parser.add_argument("--by", choices=["truecount", "start", "action"], default="truecount",
+                        help="Group the hands by rounded true count, by starting hand and up-card or by how they ended")
+    parser.add_argument("--min-hands", type=int, default=1, help="Hide groups with fewer hands")
+    args = parser.parse_args()
+
+    decks = check_header(args.history_file)
+    records = read_history(args.history_file)
+    print("%d hands, %d rounds, %d shoes of %d decks\n" % (len(records), len(set(records["round"].tolist())),
+                                                          len(set(records["shoe"].tolist())), decks))
+    if args.by == "truecount":
+        print("%6s %10s %12s %12s %9s" % ("TC", "hands", "bet", "winnings", "edge"))
+        for bucket, hands, bet, win in outcome_by_truecount(records):
+            if hands >= args.min_hands:
+                print("%6d %10d %12.1f %12.1f %8.3f%%" % (bucket, hands, bet, win, edge(bet, win)))
+    elif args.by == "start":
+        print("%8s %-6s %10s %12s %12s %9s" % ("start", "dealer", "hands", "bet", "winnings", "edge"))
+        for total, soft, up_card, hands, bet, win in outcome_by_start(records):
+            if hands >= args.min_hands:
+                print("%8s %-6s %10d %12.1f %12.1f %8.3f%%" % (("soft %d" if soft else "%d") % total,
+                      CARD_NAMES[up_card], hands, bet, win, edge(bet, win)))
+    else:
+        print("%6s %10s %12s %12s %9s" % ("action", "hands", "bet", "winnings", "edge"))
+        for code, action in enumerate(ACTIONS):
+            selected = records["action"] == code
+            bet = float(records["bet"][selected].sum())
+            win = float(records["win"][selected].sum())
+            print("%6s %10d %12.1f %12.1f %8.3f%%" % (action, selected.sum(), bet, win, edge(bet, win)))
@@ -0,0 +1,315 @@
+import argparse
+import copy
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import BlackJack
+from BlackJack import CARDS, Card, Game, Hand
+from config.BetRamp import BetRamp
+from config.Rules import Rules
+from config.SimulationConfig import SimulationConfig
+from importer.IndexImporter import INDEX_COLUMNS
+from importer.StrategyImporter import StrategyImporter
+
+
+SAMPLES = 2000
+SEED = 1
+CHUNK_SAMPLES = 100  # Shoe states per task handed to a worker process
+MIN_PENETRATION = 0.25  # Deal the sampled shoes down to at most this ratio of cards left
+MAX_INDEX = 10.0  # Crossings further out are not worth a deviation
+SLOPE_SIGNIFICANCE = 2.0  # Standard errors the fitted slope must be away from zero
+TRUECOUNT_BUCKETS = range(-6, 7)
+UNIT_RAMP = BetRamp([], name="unit")
+
+UP_CARDS = ["Two", "Three", "Four", "Five", "Six", "Seven", "Eight", "Nine", "Ten", "Ace"]
+RANK_NAMES = {2: "Two", 3: "Three", 4: "Four", 5: "Five", 6: "Six", 7: "Seven", 8: "Eight", 9: "Nine", 10: "Ten"}
+HARD_TOTALS = range(8, 18)
+SOFT_TOTALS = range(13, 21)
+PAIR_RANKS = range(2, 11)
+
+EV_COLUMNS = ["Table", "Player", "Dealer", "Basic", "Alternative", "TC", "Samples", "EV_difference"]
+
+
+def player_cards(table, total):
+    """
+    Returns: The names of two cards forming the player total of a strategy table (HARD and SOFT totals, PAIR rank).
+    """
+    if table == "PAIR":
+        return [RANK_NAMES[total], RANK_NAMES[total]]
+    if table == "SOFT":
+        return ["Ace", RANK_NAMES[total - 11]]
+    high = min(10, total - 2)
+    if high == total - high:
+        high -= 1
+    return [RANK_NAMES[high], RANK_NAMES[total - high]]
+
+
+def cells(hard=HARD_TOTALS, soft=SOFT_TOTALS, pairs=PAIR_RANKS):
+    """
+    Returns: The (table, total, up-card) cells to generate indices for. Pairs are given by the rank of their cards.
+    """
+    totals = [("HARD", t) for t in hard] + [("SOFT", t) for t in soft] + [("PAIR", r) for r in pairs]
+    return [(table, total, up_card) for table, total in totals for up_card in UP_CARDS]
+
+
+def basic_action(strategy, table, total, up_card):
+    hard_strategy, soft_strategy, pair_strategy = strategy
+    if table == "PAIR":
+        return pair_strategy[2 * total][up_card]
+    if table == "SOFT":
+        return soft_strategy[total][up_card]
+    return hard_strategy[total][up_card]
+
+
+def alternative_action(strategy, table, total, up_card):
+    """
+    Returns: The action the basic strategy action of a cell is compared against: splitting against not splitting,
+    doubling against hitting (or standing on soft 18 and more) and hitting against standing.
+    """
+    action = basic_action(strategy, table, total, up_card)
+    if table == "PAIR":
+        if action != 'P':
+            return 'P'
+        return strategy[0].get(2 * total, {}).get(up_card, 'H')
+    if action == 'D':
+        return 'S' if table == "SOFT" and total >= 18 else 'H'
+    if action == 'Sr':
+        return 'H'
+    if action == 'H':
+        return 'D' if table == "SOFT" or total <= 11 else 'S'
+    return 'D' if table == "SOFT" and total in (18, 19) else 'H'
+
+
+def draw_named(shoe, name):
+    """
+    Take the last card of the given name out of the shoe and count it like a dealt card.
+    Returns: The card, or None if the shoe has none left.
+    """
+    for i in range(len(shoe.cards) - 1, -1, -1):
+        if shoe.cards[i].name == name:
+            card = shoe.cards.pop(i)
+            shoe.ideal_count[name] -= 1
+            shoe.do_count(card)
+            return card
+    return None
+
+
+def branch(shoe):
+    """
+    Returns: A copy of the shoe with the same card order, so every action of a cell is played on the same cards
+    (common random numbers).
+    """
+    copied = copy.copy(shoe)
+    copied.cards = list(shoe.cards)
+    copied.ideal_count = dict(shoe.ideal_count)
+    copied.dealer_tracker = None
+    return copied
+
+
+def play_action(game, shoe, card_names, up_card, action):
+    """
+    Play a cell's hand with a forced first action, following the game's strategy afterwards.
+    Returns: The winnings of the player's hands at unit stake.
+    """
+    player_hand = Hand([Card(name) for name in card_names])
+    dealer_hand = Hand([Card(up_card)])
+    player = game.player
+    player.set_hands(player_hand, dealer_hand)
+    game.dealer.set_hand(dealer_hand)
+
+    if action == 'H':
+        player.hit(player_hand, shoe)
+        player.play_hand(player_hand, shoe)
+    elif action == 'D':
+        player_hand.doubled = True
+        player.hit(player_hand, shoe)
+    elif action == 'Sr':
+        player_hand.surrender = True
+    elif action == 'P':
+        player.split(player_hand, shoe)
+        # Resplits append hands while they are played
+        i = 1
+        while i < len(player.hands):
+            player.play_hand(player.hands[i], shoe)
+            i += 1
+    game.dealer.play(shoe)
+    return sum(game.get_hand_winnings(hand)[0] for hand in player.hands)
+
+
+def sample_shoe(game, seed):
+    """
+    Deal the game's shoe down to a random depth, the same for a seed on every worker.
+    """
+    random = np.random.default_rng(seed)
+    total = len(game.shoe.cards)
+    left = random.integers(int(MIN_PENETRATION * total), total + 1)
+    while len(game.shoe.cards) > left:
+        game.shoe.deal()
+
+
+def play_samples(strategy_file, decks, rules, cell_list, seed, first_sample, samples):
+    """
+    Evaluate samples shoe states first_sample .. first_sample + samples - 1. Every cell of a shoe state is played
+    once with its basic strategy action and once with the alternative on the same cards.
+    Returns: Arrays of the true counts and of EV(alternative) - EV(basic) per cell, and the same for insurance
+    computed exactly from the composition.
+    """
+    BlackJack.COUNT_HISTORY = None
+    strategy = StrategyImporter(strategy_file).import_player_strategy()
+    config = SimulationConfig(decks, MIN_PENETRATION, UNIT_RAMP, rules)
+    truecounts = np.full((len(cell_list), samples), np.nan)
+    differences = np.full((len(cell_list), samples), np.nan)
+    insurance = np.zeros((2, samples))
+
+    for s in range(samples):
+        game = Game(strategy, seed + first_sample + s, config)
+        sample_shoe(game, seed + first_sample + s)
+
+        insured = branch(game.shoe)
+        draw_named(insured, "Ace")
+        tens = sum(insured.ideal_count[name] for name in ["Ten", "Jack", "Queen", "King"])
+        insurance[:, s] = insured.truecount(), 3.0 * tens / len(insured.cards) - 1.0
+
+        for c, (table, total, up_card) in enumerate(cell_list):
+            card_names = player_cards(table, total)
+            basic = basic_action(strategy, table, total, up_card)
+            alternative = alternative_action(strategy, table, total, up_card)
+            shoe = branch(game.shoe)
+            if None in [draw_named(shoe, name) for name in card_names + [up_card]]:
+                continue
+            truecounts[c, s] = shoe.truecount()
+            ev_basic = play_action(game, branch(shoe), card_names, up_card, basic)
+            ev_alternative = play_action(game, branch(shoe), card_names, up_card, alternative)
+            differences[c, s] = ev_alternative - ev_basic
+    return truecounts, differences, insurance
+
+
+def crossing(truecounts, differences):
+    """
+    Fit EV(alternative) - EV(basic) linearly in the true count.
+    Returns: The true count where the fit crosses zero and the slope, or None if there is no usable crossing (the
+    slope is not significant or the crossing lies beyond MAX_INDEX).
+    """
+    valid = ~np.isnan(differences)
+    truecounts = truecounts[valid]
+    differences = differences[valid]
+    if len(truecounts) < 3 or np.var(truecounts) == 0:
+        return None
+    slope, intercept = np.polyfit(truecounts, differences, 1)
+    residuals = differences - (slope * truecounts + intercept)
+    slope_error = np.sqrt(np.sum(residuals ** 2) / (len(truecounts) - 2) /
+                          np.sum((truecounts - truecounts.mean()) ** 2))
+    if slope == 0 or abs(slope) < SLOPE_SIGNIFICANCE * slope_error:
+        return None
+    index = -intercept / slope
+    if abs(index) > MAX_INDEX:
+        return None
+    return index, slope
+
+
+class IndexGenerator(object):
+    """
+    Derives count-dependent play deviations by simulation. Random shoe states are dealt from seeded shoes and every
+    (table, player total, up-card) cell is played from each state with its basic strategy action and with an
+    alternative action on the same remaining cards, so the EV difference of the two actions is measured with common
+    random numbers. The zero crossing of a linear fit of that difference over the true count is the index number.
+    Shoe states are split into chunks over a process pool; the results do not depend on the number of processes.
+    """
+    def __init__(self, strategy_file, decks, rules=None, cell_list=None, samples=SAMPLES, seed=SEED, processes=None):
+        self.strategy_file = strategy_file
+        self.strategy = StrategyImporter(strategy_file).import_player_strategy()
+        self.decks = decks
+        self.rules = rules if rules is not None else Rules()
+        self.cell_list = cell_list if cell_list is not None else cells()
+        self.samples = samples
+        self.seed = seed
+        self.processes = processes
+        self.truecounts = None
+        self.differences = None
+        self.insurance = None
+
+    def run(self):
+        with ProcessPoolExecutor(self.processes) as pool:
+            tasks = []
+            for first_sample in range(0, self.samples, CHUNK_SAMPLES):
+                samples = min(CHUNK_SAMPLES, self.samples - first_sample)
+                tasks.append(pool.submit(play_samples, self.strategy_file, self.decks, self.rules, self.cell_list,
+                                         self.seed, first_sample, samples))
+            results = [task.result() for task in tasks]
+        self.truecounts = np.concatenate([r[0] for r in results], axis=1)
+        self.differences = np.concatenate([r[1] for r in results], axis=1)
+        self.insurance = np.concatenate([r[2] for r in results], axis=1)
+
+    def indices(self):
+        """
+        Returns: One row (a dictionary with INDEX_COLUMNS) per cell whose best action changes within MAX_INDEX:
+        Above is played at a true count >= Index, Below under it.
+        """
+        rows = []
+        for c, (table, total, up_card) in enumerate(self.cell_list):
+            fit = crossing(self.truecounts[c], self.differences[c])
+            if fit is None:
+                continue
+            index, slope = fit
+            basic = basic_action(self.strategy, table, total, up_card)
+            alternative = alternative_action(self.strategy, table, total, up_card)
+            above, below = (alternative, basic) if slope > 0 else (basic, alternative)
+            rows.append({"Table": table, "Player": total, "Dealer": up_card, "Index": "%.1f" % index,
+                         "Above": above, "Below": below})
+        fit = crossing(self.insurance[0], self.insurance[1])
+        if fit is not None:
+            rows.append({"Table": "INSURANCE", "Player": "", "Dealer": "Ace", "Index": "%.1f" % fit[0],
+                         "Above": "Y", "Below": "N"})
+        return rows
+
+    def ev_table(self):
+        """
+        Returns: The mean EV difference per cell and rounded true count (a dictionary with EV_COLUMNS per row).
+        """
+        rows = []
+        for c, (table, total, up_card) in enumerate(self.cell_list):
+            buckets = np.rint(self.truecounts[c])
+            for truecount in TRUECOUNT_BUCKETS:
+                selected = (buckets == truecount) & ~np.isnan(self.differences[c])
+                if not selected.any():
+                    continue
+                rows.append({"Table": table, "Player": total, "Dealer": up_card,
+                             "Basic": basic_action(self.strategy, table, total, up_card),
+                             "Alternative": alternative_action(self.strategy, table, total, up_card),
+                             "TC": truecount, "Samples": int(selected.sum()),
+                             "EV_difference": "%.4f" % self.differences[c][selected].mean()})
+        return rows
+
+
+def write_rows(path, columns, rows):
+    with open(path, 'w', newline='') as output_csv:
+        writer = csv.DictWriter(output_csv, columns, delimiter=';')
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate true count index numbers for play deviations")
+    parser.add_argument("strategy_file", help="Basic strategy .csv file the deviations refer to")
+    parser.add_argument("--decks", type=int, default=BlackJack.SHOE_SIZE)
+    parser.add_argument("--rules", default="", help="Rule set like h17,nodas,splits=3,surrender=none,payout=1.2,peek")
+    parser.add_argument("--samples", type=int, default=SAMPLES, help="Random shoe states every cell is played from")
+    parser.add_argument("--seed", type=int, default=SEED, help="Seed of the first shoe state")
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--output", default="indices.csv", help="Count-dependent strategy file (.csv)")
+    parser.add_argument("--ev-output", metavar="FILE", help="Also write the EV difference per cell and true count")
+    args = parser.parse_args()
+
+    generator = IndexGenerator(args.strategy_file, args.decks, Rules.parse(args.rules), samples=args.samples, seed=args.seed,
+                               processes=args.processes)
+    generator.run()
+    rows = generator.indices()
+    write_rows(args.output, INDEX_COLUMNS, rows)
+    if args.ev_output:
+        write_rows(args.ev_output, EV_COLUMNS, generator.ev_table())
+    for row in rows:
+        print("%-9s %2s vs %-5s  %-2s at TC >= %5s, else %s" % (row["Table"], row["Player"], row["Dealer"],
+                                                             row["Above"], row["Index"], row["Below"]))
@@ -0,0 +1,64 @@
+import argparse
+import asyncio
+import os
+import stat
+import sys
+
+from BlackJack import BASIC_OMEGA_II, default_config
+from advice.LiveAdvisor import LiveAdvisor
+from advice.MultiTable import MultiTableTracker, stream_lines
+from config.CountStrategy import CountStrategy
+from config.Rules import Rules
+from importer.IndexImporter import IndexImporter
+from history.SessionLog import SessionLogWriter, log_path
+from importer.StrategyImporter import StrategyImporter
+
+
+async def file_lines(source):
+    for line in source:
+        yield line
+        await asyncio.sleep(0)  # Let the tables work between two events
+
+
+async def follow(tracker, path):
+    """
+    Feed the lines of a file, a pipe or stdin ("-") to the tracker. Pipes and terminals are read without blocking
+    the event loop.
+    """
+    source = sys.stdin if path == "-" else open(path)
+    if stat.S_ISREG(os.fstat(source.fileno()).st_mode):
+        await tracker.run(file_lines(source))
+        return
+    stream = asyncio.StreamReader()
+    await asyncio.get_running_loop().connect_read_pipe(lambda: asyncio.StreamReaderProtocol(stream), source)
+    await tracker.run(stream_lines(stream))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Follow several tables from one input stream, one line per event: "
+                                                 "'<table> [d|p|o] cards', '<table> n' (new round), "
+                                                 "'<table> s' (shuffle), '<table> ?' or '?' for all tables")
+    parser.add_argument("strategy_file", help="Basic strategy .csv file")
+    parser.add_argument("--input", default="-", help="File or pipe with the events (default stdin)")
+    parser.add_argument("--indices", metavar="FILE", help="Count-dependent deviations on top of the strategy")
+    parser.add_argument("--rules", help="Table rules, e.g. h17,nodas,nrsa,splits=3,surrender=none,payout=1.2,peek")
+    parser.add_argument("--decks", type=int, help="Decks per shoe (default SHOE_SIZE)")
+    parser.add_argument("--percentage", action="store_true",
+                        help="Decide hit and stand on the winning chances like CalculatePercentage")
+    parser.add_argument("--record", metavar="DIR",
+                        help="Log the cards of every table to DIR/<name>.bjsl for BlackJackReplay.py")
+    args = parser.parse_args()
+
+    config = default_config()
+    if args.rules:
+        config.rules = Rules.parse(args.rules)
+    decks = args.decks or config.decks
+    strategy = StrategyImporter(args.strategy_file).import_player_strategy()
+    count_strategy = CountStrategy(strategy, IndexImporter(args.indices).import_indices()) if args.indices else None
+
+    def make_advisor(name):
+        log = SessionLogWriter(log_path(args.record, name), decks) if args.record else None
+        return LiveAdvisor(strategy, decks, BASIC_OMEGA_II, config.rules, count_strategy, config.bet_ramp,
+                           chances=args.percentage, log=log)
+
+    asyncio.run(follow(MultiTableTracker(make_advisor), args.input))
@@ -0,0 +1,164 @@
+import argparse
+import csv
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from random import Random
+
+from BlackJack import BASIC_OMEGA_II, CARDS, DECK_SIZE, Card, Game, default_config
+from config.BetRamp import BetRamp
+from config.Rules import Rules
+from config.SimulationConfig import SimulationConfig
+from estimation.EdgeEstimator import EdgeEstimator
+from history.SessionLog import read_shoes
+from importer.StrategyImporter import StrategyImporter
+
+
+SEED = 1
+MIN_PENETRATION = 0.01  # The logged cards end a replayed shoe, not the configured penetration
+ROUND_CARDS = 20  # A round is only started with more cards than this left in the shoe
+UNIT_RAMP = BetRamp([], name="unit")
+
+COUNT_SYSTEMS = {
+    "omega2": BASIC_OMEGA_II,
+    "hilo": {"Ace": -1, "Two": 1, "Three": 1, "Four": 1, "Five": 1, "Six": 1, "Seven": 0, "Eight": 0, "Nine": 0,
+             "Ten": -1, "Jack": -1, "Queen": -1, "King": -1},
+}
+
+RESULT_COLUMNS = ["strategy", "count", "ramp", "shoes", "hands", "total_bet", "winnings", "edge", "half_width"]
+
+
+def shoe_order(names, decks, random):
+    """
+    Returns: The cards of a replayed shoe in dealing order (the next card last, like Shoe.cards): the logged cards
+    first, then the cards never seen in the session shuffled. The unseen cards keep the true count of the replay
+    honest and only get dealt by a round that runs past the end of the log.
+    """
+    unseen = dict((name, 4 * decks) for name in CARDS)
+    for name in names:
+        unseen[name] -= 1
+        if unseen[name] < 0:
+            raise ValueError("More than %d %s in one logged shoe" % (4 * decks, name))
+    rest = [name for name, number in unseen.items() for i in range(number)]
+    random.shuffle(rest)
+    return rest + names[::-1]
+
+
+def replay_log(path, strategy_files, rules, counts, ramps, seed):
+    """
+    Play every shoe of a session log with every strategy at a flat unit stake and settle the rounds under every
+    count system and bet ramp (the stake does not change how a hand is played).
+    Returns: hands per strategy and, per strategy, count system and ramp, the list of (winnings, bet) per shoe.
+    """
+    decks, shoes = read_shoes(path)
+    config = SimulationConfig(decks, MIN_PENETRATION, UNIT_RAMP, Rules.parse(rules))
+    strategies = [StrategyImporter(f).import_player_strategy() for f in strategy_files]
+    tags = [COUNT_SYSTEMS[count] for count in counts]
+    hands = [0] * len(strategies)
+    results = [[[[] for ramp in ramps] for count in counts] for strategy in strategies]
+    for s, shoe in enumerate(shoes):
+        names = [name for name, source in shoe]
+        order = shoe_order(names, decks, Random(seed + s))
+        unseen = len(order) - len(names)
+        for i, strategy in enumerate(strategies):
+            game = Game(strategy, seed, config)
+            game.shoe.cards = [Card(name) for name in order]
+            rounds = []
+            while not game.shoe.reshuffle and len(game.shoe.cards) > max(unseen, ROUND_CARDS):
+                left = len(game.shoe.cards)
+                dealt = [(name, 4 * decks - game.shoe.ideal_count[name]) for name in CARDS]
+                truecounts = [sum(count_tags[name] * number for name, number in dealt) * DECK_SIZE / left
+                              for count_tags in tags]
+                money, bet = game.money, game.bet
+                game.play_round()
+                rounds.append((truecounts, game.money - money, game.bet - bet))
+                hands[i] += len(game.player.hands)  # A split round plays several hands
+            for c, count_results in enumerate(results[i]):
+                for ramp, ramp_results in zip(ramps, count_results):
+                    money = 0.0
+                    bet = 0.0
+                    for truecounts, round_money, round_bet in rounds:
+                        stake = ramp.stake(truecounts[c])
+                        money += stake * round_money
+                        bet += stake * round_bet
+                    ramp_results.append((money, bet))
+    return hands, results
+
+
+class Replay(object):
+    """
+    Replays session logs recorded at real tables (--record) through the simulation over a process pool, one log per
+    task, and compares strategies, count systems and bet ramps on the same dealt shoes.
+    """
+    def __init__(self, logs, strategy_files, rules, counts, ramps, seed=SEED, processes=None):
+        self.logs = logs
+        self.strategy_files = strategy_files
+        self.rules = rules
+        self.counts = counts
+        self.ramps = ramps
+        self.seed = seed
+        self.processes = processes
+
+    def run(self):
+        """
+        Returns: One result row (a dictionary with RESULT_COLUMNS) per strategy, count system and ramp.
+        """
+        hands = [0] * len(self.strategy_files)
+        games = [[[[] for ramp in self.ramps] for count in self.counts] for f in self.strategy_files]
+        with ProcessPoolExecutor(self.processes) as pool:
+            tasks = [pool.submit(replay_log, log, self.strategy_files, self.rules, self.counts, self.ramps, self.seed)
+                     for log in self.logs]
+            for task in tasks:
+                log_hands, results = task.result()
+                for s, strategy_results in enumerate(results):
+                    hands[s] += log_hands[s]
+                    for c, count_results in enumerate(strategy_results):
+                        for r, ramp_results in enumerate(count_results):
+                            games[s][c][r].extend(ramp_results)
+
+        rows = []
+        for (s, strategy_file), (c, count), (r, ramp) in itertools.product(
+                enumerate(self.strategy_files), enumerate(self.counts), enumerate(self.ramps)):
+            estimator = EdgeEstimator()
+            for money, bet in games[s][c][r]:
+                estimator.add(money, bet)
+            rows.append({
+                "strategy": strategy_file,
+                "count": count,
+                "ramp": str(ramp),
+                "shoes": estimator.games,
+                "hands": hands[s],
+                "total_bet": estimator.bet,
+                "winnings": estimator.money,
+                "edge": estimator.edge(),
+                "half_width": estimator.half_width(),
+            })
+        return rows
+
+
+if __name__ == "__main__":
+    defaults = default_config()
+    parser = argparse.ArgumentParser(description="Replay session logs of real tables through the simulation")
+    parser.add_argument("logs", nargs="+", help="Session logs (.bjsl) written with --record")
+    parser.add_argument("--strategies", nargs="+", required=True, metavar="FILE", help="Basic strategy .csv files")
+    parser.add_argument("--counts", nargs="+", default=["omega2"], choices=sorted(COUNT_SYSTEMS),
+                        help="Count systems the bet ramps read the true count from")
+    parser.add_argument("--ramps", nargs="+", default=None, metavar="RAMP",
+                        help="Bet ramps as name:tc=stake,tc=stake,... (default: the BET_SPREAD constants)")
+    parser.add_argument("--rules", default=str(defaults.rules),
+                        help="Rule set like h17,nodas,splits=3,surrender=none,payout=1.2,peek")
+    parser.add_argument("--seed", type=int, default=SEED, help="Seed of the shuffle of the cards never logged")
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--output", help="Results table (.csv)")
+    args = parser.parse_args()
+
+    ramps = [BetRamp.parse(ramp) for ramp in args.ramps] if args.ramps else [defaults.bet_ramp]
+    rows = Replay(args.logs, args.strategies, args.rules, args.counts, ramps, args.seed, args.processes).run()
+    if args.output:
+        with open(args.output, 'w', newline='') as results_csv:
+            writer = csv.DictWriter(results_csv, RESULT_COLUMNS, delimiter=';')
+            writer.writeheader()
+            writer.writerows(rows)
+    for row in rows:
+        print("%-36s %-7s %-24s shoes %5d  hands %7d  edge %7.3f %% +/- %.3f %%" % (
+            row["strategy"], row["count"], row["ramp"], row["shoes"], row["hands"], row["edge"], row["half_width"]))
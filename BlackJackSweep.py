@@ -0,0 +1,144 @@
+import argparse
+import csv
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from BlackJack import Game, default_config
+from config.BetRamp import BetRamp
+from config.Rules import Rules
+from config.SimulationConfig import SimulationConfig
+from estimation.EdgeEstimator import EdgeEstimator
+from importer.StrategyImporter import StrategyImporter
+
+
+GAMES = 10000
+SEED = 1
+CHUNK_GAMES = 500  # Games per task handed to a worker process
+UNIT_RAMP = BetRamp([], name="unit")
+
+RESULT_COLUMNS = ["decks", "penetration", "rules", "ramp", "games", "hands", "total_bet", "winnings", "edge", "half_width"]
+
+
+def play_shoes(strategy_file, decks, penetration, rules, ramps, seed, first_game, games):
+    """
+    Play games first_game .. first_game + games - 1 at a flat unit stake and settle them under every bet ramp. With
+    a fixed basic strategy the stake never changes how a hand is played, so the rounds of a shoe are the same for all
+    ramps and only the settlement differs.
+    Returns: hands played and, per ramp, the list of (winnings, bet) per game.
+    """
+    strategy = StrategyImporter(strategy_file).import_player_strategy()
+    config = SimulationConfig(decks, penetration, UNIT_RAMP, Rules.parse(rules))
+    hands = 0
+    results = [[] for ramp in ramps]
+    for g in range(first_game, first_game + games):
+        game = Game(strategy, seed + g, config)
+        rounds = []
+        while not game.shoe.reshuffle:
+            truecount = game.shoe.truecount()
+            money, bet = game.money, game.bet
+            game.play_round()
+            rounds.append((truecount, game.money - money, game.bet - bet))
+        hands += len(rounds)
+        for ramp, ramp_results in zip(ramps, results):
+            money = 0.0
+            bet = 0.0
+            for truecount, round_money, round_bet in rounds:
+                stake = ramp.stake(truecount)
+                money += stake * round_money
+                bet += stake * round_bet
+            ramp_results.append((money, bet))
+    return hands, results
+
+
+class Sweep(object):
+    """
+    Runs a grid of table configurations over a process pool and collects the results in one table. Configurations
+    that only differ in their bet ramp share their shoes: they are played once and settled per ramp.
+    """
+    def __init__(self, strategy_file, configs, games=GAMES, seed=SEED, processes=None):
+        self.strategy_file = strategy_file
+        self.configs = configs
+        self.games = games
+        self.seed = seed
+        self.processes = processes
+        self.groups = {}
+        for config in configs:
+            self.groups.setdefault(config.shoe_key(), []).append(config)
+
+    def run(self):
+        """
+        Returns: One result row (a dictionary with RESULT_COLUMNS) per configuration.
+        """
+        tasks = []
+        with ProcessPoolExecutor(self.processes) as pool:
+            for (decks, penetration, rules), configs in self.groups.items():
+                ramps = [config.bet_ramp for config in configs]
+                for first_game in range(0, self.games, CHUNK_GAMES):
+                    games = min(CHUNK_GAMES, self.games - first_game)
+                    tasks.append(((decks, penetration, rules), pool.submit(play_shoes, self.strategy_file, decks,
+                                                                           penetration, rules, ramps, self.seed,
+                                                                           first_game, games)))
+
+            collected = {}
+            for key, task in tasks:
+                hands, results = task.result()
+                group = collected.setdefault(key, [0, [[] for c in self.groups[key]]])
+                group[0] += hands
+                for ramp_results, chunk in zip(group[1], results):
+                    ramp_results.extend(chunk)
+
+        rows = []
+        for key, configs in self.groups.items():
+            hands, results = collected[key]
+            for config, games in zip(configs, results):
+                estimator = EdgeEstimator()
+                for money, bet in games:
+                    estimator.add(money, bet)
+                rows.append({
+                    "decks": config.decks,
+                    "penetration": config.penetration,
+                    "rules": str(config.rules),
+                    "ramp": str(config.bet_ramp),
+                    "games": estimator.games,
+                    "hands": hands,
+                    "total_bet": estimator.bet,
+                    "winnings": estimator.money,
+                    "edge": estimator.edge(),
+                    "half_width": estimator.half_width(),
+                })
+        return rows
+
+
+def write_results(path, rows):
+    with open(path, 'w', newline='') as results_csv:
+        writer = csv.DictWriter(results_csv, RESULT_COLUMNS, delimiter=';')
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    defaults = default_config()
+    parser = argparse.ArgumentParser(description="Simulate a grid of shoe sizes, penetrations and bet ramps")
+    parser.add_argument("strategy_file", help="Basic strategy .csv file")
+    parser.add_argument("--decks", type=int, nargs="+", default=[defaults.decks])
+    parser.add_argument("--penetrations", type=float, nargs="+", default=[defaults.penetration],
+                        help="Ratios of cards left in the shoe when it gets reshuffled")
+    parser.add_argument("--ramps", nargs="+", default=None, metavar="RAMP",
+                        help="Bet ramps as name:tc=stake,tc=stake,... (default: the BET_SPREAD constants)")
+    parser.add_argument("--rules", nargs="+", default=[str(defaults.rules)], metavar="RULES",
+                        help="Rule sets like h17,nodas,splits=3,surrender=none,payout=1.2,peek")
+    parser.add_argument("--games", type=int, default=GAMES, help="Games (shoes) per configuration")
+    parser.add_argument("--seed", type=int, default=SEED, help="Seed of the first shoe")
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--output", default="sweep_results.csv", help="Results table (.csv)")
+    args = parser.parse_args()
+
+    ramps = [BetRamp.parse(ramp) for ramp in args.ramps] if args.ramps else [defaults.bet_ramp]
+    configs = [SimulationConfig(decks, penetration, ramp, Rules.parse(rules))
+               for decks, penetration, rules, ramp in itertools.product(args.decks, args.penetrations, args.rules, ramps)]
+    rows = Sweep(args.strategy_file, configs, args.games, args.seed, args.processes).run()
+    write_results(args.output, rows)
+    for row in rows:
+        print("%2d decks  penetration %.2f  %-40s %-24s edge %7.3f %% +/- %.3f %%" % (
+            row["decks"], row["penetration"], row["rules"], row["ramp"], row["edge"], row["half_width"]))
@@ -0,0 +1,79 @@
+import argparse
+import time
+
+import BlackJack
+from BlackJack import Table, default_config
+from config.BetRamp import BetRamp
+from config.Rules import Rules
+from estimation.EdgeEstimator import EdgeEstimator
+from importer.StrategyImporter import StrategyImporter
+
+
+GAMES = 1000
+SEED = 1
+
+
+class TableSimulation(object):
+    """
+    Plays games at a multi-seat table and keeps one edge estimate per seat.
+    """
+    def __init__(self, seats, seed=SEED, config=None, batch_size=100):
+        self.seats = seats
+        self.seed = seed
+        self.config = config
+        self.estimators = [EdgeEstimator(batch_size) for seat in seats]
+        self.hands = [0] * len(seats)
+        self.rounds = 0
+        self.games = 0
+
+    def play(self, games):
+        for g in range(games):
+            table = Table(self.seats, self.seed + self.games, self.config)
+            while not table.shoe.reshuffle:
+                table.play_round()
+            for i, estimator in enumerate(self.estimators):
+                estimator.add(table.moneys[i], table.bets[i])
+                self.hands[i] += int(table.hands[i])
+            self.rounds += table.rounds
+            self.games += 1
+
+    def print_summary(self, names):
+        print("%d games, %.1f rounds per shoe\n" % (self.games, self.rounds / float(self.games)))
+        for name, hands, estimator in zip(names, self.hands, self.estimators):
+            print("%-40s hands %8d  winnings %10.2f  edge %7.3f %% +/- %.3f %%" % (
+                name, hands, estimator.money, estimator.edge(), estimator.half_width()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate a table of 1 to %d seats sharing one shoe" % Table.MAX_SEATS)
+    parser.add_argument("strategy_files", nargs="+", help="Basic strategy .csv file per seat")
+    parser.add_argument("--seats", type=int, help="Number of seats when a single strategy file is given")
+    parser.add_argument("--ramps", nargs="+", metavar="RAMP",
+                        help="Bet ramp per seat (or one for all) as name:tc=stake,tc=stake,...")
+    parser.add_argument("--rules", help="Rule set like h17,nodas,splits=3,surrender=none,payout=1.2,peek")
+    parser.add_argument("--games", type=int, default=GAMES, help="Games (shoes) to play")
+    parser.add_argument("--seed", type=int, default=SEED, help="Seed of the first shoe")
+    args = parser.parse_args()
+
+    strategy_files = args.strategy_files
+    if args.seats and len(strategy_files) == 1:
+        strategy_files = strategy_files * args.seats
+    ramps = [BetRamp.parse(ramp) for ramp in args.ramps] if args.ramps else [None]
+    if len(ramps) == 1:
+        ramps = ramps * len(strategy_files)
+    if len(ramps) != len(strategy_files):
+        parser.error("Give one bet ramp per seat or a single one for all seats")
+
+    config = default_config()
+    if args.rules:
+        config.rules = Rules.parse(args.rules)
+    BlackJack.HARD_STRATEGY, BlackJack.SOFT_STRATEGY, BlackJack.PAIR_STRATEGY = \
+        StrategyImporter(strategy_files[0]).import_player_strategy()
+    seats = [(StrategyImporter(f).import_player_strategy(), ramp) for f, ramp in zip(strategy_files, ramps)]
+
+    simulation = TableSimulation(seats, args.seed, config)
+    start = time.perf_counter()
+    simulation.play(args.games)
+    elapsed = time.perf_counter() - start
+    simulation.print_summary(["seat %d: %s" % (i + 1, f) for i, f in enumerate(strategy_files)])
+    print("\n%.0f hands per second" % (sum(simulation.hands) / elapsed))
@@ -0,0 +1,140 @@
+import os
+import socketserver
+import threading
+
+from advice.Cards import card_name
+from advice.LiveAdvisor import SOURCES
+
+
+SOCKET_PATH = "/tmp/blackjack-advisor.sock"
+DEFAULT_SESSION = "default"
+
+
+def encode_advice(advice):
+	"""
+	Returns: The reply line of an advice: OK followed by key=value fields, the action and the chances only when
+	known.
+	"""
+	fields = ["tc=%+.3f" % advice.truecount, "bet=%g" % advice.stake, "insurance=%s" % ("yes" if advice.insurance else "no")]
+	if advice.action is not None:
+		fields.append("action=%s" % advice.action)
+	if advice.hit is not None:
+		fields += ["hit=%.4f" % advice.hit, "stand=%.4f" % advice.stand]
+	fields.append("exact=%s" % ("yes" if advice.exact else "no"))
+	return "OK " + " ".join(fields)
+
+
+class Session(object):
+	"""
+	The shoe state of one table: its advisor and a lock, as several connections may feed the same table.
+	"""
+
+	def __init__(self, advisor):
+		self.advisor = advisor
+		self.lock = threading.Lock()
+
+
+class AdvisorHandler(socketserver.StreamRequestHandler):
+	"""
+	Serves one connection of the line protocol. Every request is one line, every reply is one line starting with
+	OK or ERR:
+
+		SESSION name              select (and create) the table the following requests go to
+		CARD source token ...     cards seen from dealer, player or other, replies the advice after the last one
+		PLAY token ...            the player's current hand (already seen cards), e.g. the next hand of a split
+		ROUND                     start a round, replies the advice for the bet
+		SHUFFLE                   start a new shoe
+		ADVICE                    the current advice
+		STATS                     answers from the precomputed advice, fallbacks and the last card's latency
+		END                       forget the session
+		QUIT                      close the connection
+
+	Requests before a SESSION go to the session named default.
+	"""
+
+	def handle(self):
+		self.session_name = DEFAULT_SESSION
+		for line in self.rfile:
+			words = line.decode("utf-8", "replace").split()
+			if not words:
+				continue
+			command, arguments = words[0].upper(), words[1:]
+			if command == "QUIT":
+				self.reply("OK bye")
+				break
+			try:
+				self.reply(self.server.dispatch(self, command, arguments))
+			except ValueError as e:
+				self.reply("ERR %s" % e)
+
+	def reply(self, text):
+		self.wfile.write((text + "\n").encode("utf-8"))
+
+
+class AdvisorServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+	"""
+	A long-running advisor over a UNIX socket. Strategies, rules and chance tables are loaded once by the caller,
+	make_advisor builds a LiveAdvisor from them for every new session name; the sessions live as long as the server,
+	so a client can reconnect to its table.
+	"""
+	daemon_threads = True
+
+	def __init__(self, path, make_advisor):
+		if os.path.exists(path):
+			os.unlink(path)
+		self.make_advisor = make_advisor
+		self.sessions = {}
+		self.sessions_lock = threading.Lock()
+		socketserver.UnixStreamServer.__init__(self, path, AdvisorHandler)
+
+	def session(self, name):
+		with self.sessions_lock:
+			if name not in self.sessions:
+				self.sessions[name] = Session(self.make_advisor(name))
+			return self.sessions[name]
+
+	def dispatch(self, handler, command, arguments):
+		"""
+		Returns: The reply line to one request of a connection.
+		"""
+		if command == "SESSION":
+			if len(arguments) != 1:
+				raise ValueError("SESSION takes one name")
+			handler.session_name = arguments[0]
+			self.session(handler.session_name)
+			return "OK session %s" % handler.session_name
+		if command == "END":
+			with self.sessions_lock:
+				session = self.sessions.pop(handler.session_name, None)
+			if session is not None:
+				session.advisor.close()
+			return "OK ended %s" % handler.session_name
+
+		session = self.session(handler.session_name)
+		with session.lock:
+			advisor = session.advisor
+			if command == "CARD":
+				if len(arguments) < 2 or arguments[0].lower() not in SOURCES:
+					raise ValueError("CARD takes a source (%s) and at least one card" % ", ".join(SOURCES))
+				source = arguments[0].lower()
+				return encode_advice(advisor.see_cards([card_name(token) for token in arguments[1:]], source))
+			if command == "PLAY":
+				return encode_advice(advisor.play([card_name(token) for token in arguments]))
+			if command == "ROUND":
+				return encode_advice(advisor.new_round())
+			if command == "SHUFFLE":
+				return encode_advice(advisor.shuffle())
+			if command == "ADVICE":
+				return encode_advice(advisor.current)
+			if command == "STATS":
+				return "OK precomputed=%d fallbacks=%d latency_us=%.0f" % (advisor.precomputed, advisor.fallbacks,
+					advisor.last_latency * 1e6)
+		raise ValueError("Unknown command '%s'" % command)
+
+	def server_close(self):
+		socketserver.UnixStreamServer.server_close(self)
+		with self.sessions_lock:
+			for session in self.sessions.values():
+				session.advisor.close()
+		if os.path.exists(self.server_address):
+			os.unlink(self.server_address)
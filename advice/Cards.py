@@ -0,0 +1,27 @@
+import re
+
+
+# Card tokens of a typed line besides the card names: the shortcuts of the interactive modes
+CARD_TOKENS = {"1": "Ace", "a": "Ace", "2": "Two", "3": "Three", "4": "Four", "5": "Five", "6": "Six", "7": "Seven",
+	"8": "Eight", "9": "Nine", "10": "Ten", "t": "Ten", "j": "Jack", "q": "Queen", "k": "King"}
+for name in set(CARD_TOKENS.values()):
+	CARD_TOKENS[name.lower()] = name
+
+SEPARATORS = re.compile(r"[\s,;]+")
+
+
+def card_name(token):
+	"""
+	Returns: The card name of a token.
+	"""
+	try:
+		return CARD_TOKENS[token.lower()]
+	except KeyError:
+		raise ValueError("Unknown card '%s'" % token)
+
+
+def parse_cards(line):
+	"""
+	Returns: The card names of a line of tokens separated by blanks, commas or semicolons, e.g. "10 k 5 1 j 9".
+	"""
+	return [card_name(token) for token in SEPARATORS.split(line.strip()) if token]
@@ -0,0 +1,316 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import numpy as np
+
+from chances.ChanceTable import winning_chances
+from chances.Tree import BUSTED, RANKS, RANK_VALUES, STATES, TEN_CARDS, Tree, draw, final_vector, state
+from config.CountStrategy import CountStrategy
+from config.Rules import Rules
+
+
+DECK_SIZE = 52
+LATENCY_BUDGET = 0.05  # Seconds a card entry may wait for its precomputed advice before the fallback answers
+SOURCES = ["dealer", "player", "other"]
+ACTION_NAMES = {"H": "Hit", "S": "Stand", "D": "Double Down", "P": "Split", "Sr": "Surrender"}
+
+
+def rank_of(name):
+	"""
+	Returns: The index in RANKS of a card name, Jack, Queen and King counted as Ten.
+	"""
+	return RANKS.index("Ten" if name in TEN_CARDS else name)
+
+
+class HandState(object):
+	"""
+	The player's hand as a tuple of rank indices, with the part of the Hand interface CountStrategy reads. Adding a
+	card returns a new state, so the answers for every possible next card can branch from the current hand.
+	Ten-valued cards are one rank, so any two of them are a pair.
+	"""
+	__slots__ = ("ranks", "value", "is_soft")
+
+	def __init__(self, ranks=()):
+		self.ranks = tuple(ranks)
+		hard = sum(RANK_VALUES[r] for r in self.ranks)
+		self.is_soft = 0 in self.ranks and hard + 10 <= 21
+		self.value = hard + 10 if self.is_soft else hard
+
+	def add(self, rank):
+		return HandState(self.ranks + (rank,))
+
+	def soft(self):
+		return self.is_soft
+
+	def splitable(self):
+		return len(self.ranks) == 2 and self.ranks[0] == self.ranks[1]
+
+	def length(self):
+		return len(self.ranks)
+
+
+class Advice(object):
+	"""
+	The answer for one table situation: true count, stake, whether to insure and the action for the player's hand
+	(None before the hand and the up-card are known or once it is finished). With chances, hit and stand are the
+	winning chances the hit/stand decision was taken on. exact is False for a fallback answer that missed the
+	latency budget and was decided on the count strategy alone.
+	"""
+	__slots__ = ("truecount", "stake", "insurance", "action", "hit", "stand", "exact")
+
+	def __init__(self, truecount, stake, insurance=False, action=None, hit=None, stand=None, exact=True):
+		self.truecount = truecount
+		self.stake = stake
+		self.insurance = insurance
+		self.action = action
+		self.hit = hit
+		self.stand = stand
+		self.exact = exact
+
+	def __str__(self):
+		text = "TC %+.2f  bet %g" % (self.truecount, self.stake)
+		if self.insurance:
+			text += "  CALL INSURANCE"
+		if self.action is not None:
+			text += "  %s" % ACTION_NAMES[self.action]
+			if self.hit is not None:
+				text += " (hit %.3f / stand %.3f)" % (self.hit, self.stand)
+		if not self.exact:
+			text += "  [fallback]"
+		return text
+
+
+class LiveAdvisor(object):
+	"""
+	Advice for a real table while its cards are entered one by one. The composition, the running count and the
+	advice for the current situation are updated incrementally per card; the true count is one division.
+
+	After every update a background thread evaluates the advice for each rank the next card can have, from each
+	source (dealer, player or another seat), against the composition that card would leave. Entering the card then
+	only picks the precomputed answer. If it is not ready within the latency budget the advice is decided on the
+	count strategy alone and marked as a fallback, so an answer is printed in bounded time even when the
+	winning chances are slow.
+
+	With a log (SessionLogWriter) every card seen and every shuffle is recorded for a later replay.
+
+	With chances, hit and stand are decided like CalculatePercentage: hit without bust risk, else on the winning
+	chances for the cards left, from the chance table where its answer is unambiguous and else from the Tree
+	convolution. Double, split and surrender follow the count strategy.
+	"""
+
+	def __init__(self, strategy, decks, tags, rules=None, count_strategy=None, bet_ramp=None, chances=False,
+			latency=LATENCY_BUDGET, precompute=True, chance_table=None, log=None):
+		self.decks = decks
+		self.rules = rules if rules is not None else Rules()
+		self.indexed = count_strategy is not None
+		self.count_strategy = count_strategy if count_strategy is not None else CountStrategy(strategy)
+		self.bet_ramp = bet_ramp
+		self.chances = chances
+		self.chance_table = chance_table
+		self.latency = latency
+		self.tags = np.array([tags[rank] for rank in RANKS])
+		self.log = log
+		self.executor = ThreadPoolExecutor(max_workers=1) if precompute else None
+		self.pending = None
+		self.precomputed = 0  # Card entries answered from the precomputed advice
+		self.fallbacks = 0  # Card entries that missed the latency budget
+		self.last_latency = 0.0
+		self.shuffle()
+
+	def close(self):
+		if self.executor is not None:
+			self.executor.shutdown(wait=False)
+		if self.log is not None:
+			self.log.close()
+
+	def shuffle(self):
+		"""
+		Start a new shoe.
+		Returns: The advice for the first bet.
+		"""
+		self.counts = np.array([4.0 * self.decks] * (len(RANKS) - 1) + [16.0 * self.decks])
+		self.count = 0
+		if self.log is not None:
+			self.log.shuffle()
+		return self.new_round()
+
+	def new_round(self):
+		"""
+		Forget the up-card and the player's hand of the last round.
+		Returns: The advice for the next bet.
+		"""
+		self.up_card = None
+		self.hand = HandState()
+		self.current = self.evaluate(*self.situation())
+		self.schedule()
+		return self.current
+
+	def truecount(self):
+		return self.true_count(self.counts, self.count)
+
+	def true_count(self, counts, count):
+		left = counts.sum()
+		return count * DECK_SIZE / left if left else 0.0
+
+	def situation(self):
+		return self.counts, self.count, self.up_card, self.hand
+
+	def transition(self, situation, rank, source):
+		"""
+		Returns: The composition, running count, up-card and hand of a situation after a card of the given rank from
+		the source.
+		"""
+		counts, count, up_card, hand = situation
+		counts = counts.copy()
+		counts[rank] -= 1
+		if source == "dealer" and up_card is None:
+			up_card = rank
+		elif source == "player":
+			hand = hand.add(rank)
+		return counts, count + self.tags[rank], up_card, hand
+
+	def see(self, name, source="other"):
+		"""
+		Account for a card leaving the shoe. A dealer card is the up-card if the round has none yet, a player card
+		is added to the player's current hand.
+		Returns: The advice for the new situation.
+		"""
+		if source not in SOURCES:
+			raise ValueError("Unknown card source '%s', expected one of %s" % (source, ", ".join(SOURCES)))
+		start = time.perf_counter()
+		rank = rank_of(name)
+		if self.counts[rank] <= 0:
+			raise ValueError("No %s left in the shoe" % name)
+		self.counts, self.count, self.up_card, self.hand = self.transition(self.situation(), rank, source)
+		if self.log is not None:
+			self.log.card(name, source)
+
+		advice = None
+		if self.pending is not None:
+			try:
+				advice = self.pending.result(timeout=self.latency)[(rank, source)]
+				self.precomputed += 1
+			except TimeoutError:
+				self.pending.cancel()
+				self.fallbacks += 1
+		if advice is None:
+			advice = self.evaluate(*self.situation(), chances=self.chances and self.executor is None)
+		self.current = advice
+		self.schedule()
+		self.last_latency = time.perf_counter() - start
+		return advice
+
+	def see_cards(self, names, source="other"):
+		"""
+		Account for several cards from one source at once: the composition and the running count are updated in
+		one step and the advice is evaluated once, for the situation after the last card.
+		Returns: The advice for the new situation.
+		"""
+		if len(names) == 1:
+			return self.see(names[0], source)
+		if source not in SOURCES:
+			raise ValueError("Unknown card source '%s', expected one of %s" % (source, ", ".join(SOURCES)))
+		start = time.perf_counter()
+		ranks = [rank_of(name) for name in names]
+		removed = np.bincount(ranks, minlength=len(RANKS))
+		if (removed > self.counts).any():
+			raise ValueError("Not that many %s left in the shoe" % RANKS[int(np.argmax(removed > self.counts))])
+		self.counts = self.counts - removed
+		self.count += int(np.dot(self.tags, removed))
+		if self.log is not None:
+			self.log.cards(names, source)
+		if source == "dealer" and self.up_card is None:
+			self.up_card = ranks[0]
+		elif source == "player":
+			self.hand = HandState(self.hand.ranks + tuple(ranks))
+		self.current = self.evaluate(*self.situation())
+		self.schedule()
+		self.last_latency = time.perf_counter() - start
+		return self.current
+
+	def play(self, names):
+		"""
+		Make the given cards (already seen) the player's current hand, e.g. the next hand of a split.
+		Returns: The advice for the hand.
+		"""
+		hand = HandState(rank_of(name) for name in names)
+		if hand.ranks != self.hand.ranks:
+			self.hand = hand
+			self.current = self.evaluate(*self.situation())
+			self.schedule()
+		return self.current
+
+	def schedule(self):
+		"""
+		Precompute the advice for every possible next card in the background.
+		"""
+		if self.executor is None:
+			return
+		if self.pending is not None:
+			self.pending.cancel()
+		self.pending = self.executor.submit(self.precompute, self.situation())
+
+	def precompute(self, situation):
+		"""
+		Returns: The advice after each card that can come next, keyed by (rank, source).
+		"""
+		answers = {}
+		for rank in np.flatnonzero(situation[0] > 0):
+			rank = int(rank)
+			for source in SOURCES:
+				if source == "dealer" and situation[2] is not None:
+					continue  # A dealer card after the up-card only changes the composition, like another seat's card
+				answers[(rank, source)] = self.evaluate(*self.transition(situation, rank, source))
+			answers.setdefault((rank, "dealer"), answers[(rank, "other")])
+		return answers
+
+	def evaluate(self, counts, count, up_card, hand, chances=None):
+		"""
+		Returns: The advice for a situation.
+		"""
+		if chances is None:
+			chances = self.chances
+		truecount = self.true_count(counts, count)
+		stake = self.bet_ramp.stake(truecount) if self.bet_ramp is not None else 1.0
+		insurance = False
+		if up_card == 0 and hand.length() <= 2:
+			if self.indexed:
+				insurance = self.count_strategy.insure(truecount)
+			else:
+				insurance = counts[-1] / counts.sum() >= 0.5
+		advice = Advice(truecount, stake, insurance, exact=chances or not self.chances)
+		if up_card is None or hand.length() < 2 or hand.value >= 21:
+			return advice
+
+		action = self.count_strategy.action(hand, RANKS[up_card], truecount)
+		if action == "P" and not hand.splitable():
+			action = "H"
+		if action == "D" and hand.length() != 2:
+			action = "H"
+		if action == "Sr" and (hand.length() != 2 or not self.rules.surrender_allowed):
+			action = "H"
+		if chances and action in ("H", "S"):
+			bust, advice.hit, advice.stand = self.winning_chances(counts, truecount, up_card, hand)
+			action = "H" if bust == 0.0 or advice.hit > advice.stand else "S"
+		advice.action = action
+		return advice
+
+	def winning_chances(self, counts, truecount, up_card, hand):
+		"""
+		Returns: The chance to bust on the next card, the winning chance of hitting (and then hitting until 17) and
+		of standing, drawing from counts with fixed probabilities (Tree).
+		"""
+		drawn = counts / counts.sum()
+		if self.chance_table is not None:
+			chances = self.chance_table.lookup(RANKS[up_card], hand.value, hand.soft(), truecount,
+				counts.sum() / (DECK_SIZE * self.decks), self.decks)
+			if chances and abs(chances[0] - chances[1]) > chances[2]:
+				bust = 0.0 if hand.soft() else drawn[np.array(RANK_VALUES) > 21 - hand.value].sum()
+				return float(bust), chances[0], chances[1]
+		dealer = Tree(np.eye(STATES)[draw(state(0), RANK_VALUES[up_card])], hit_soft_17=self.rules.hit_soft_17)
+		dealer.play_out(drawn)
+		player = Tree(np.eye(STATES)[state(hand.value, hand.soft())] @ dealer.transition(drawn))
+		bust = player.tree[BUSTED]
+		player.play_out(drawn)
+		hit, stand = winning_chances(final_vector(player.tree), final_vector(dealer.tree), hand.value)
+		return float(bust), hit, stand
@@ -0,0 +1,91 @@
+import asyncio
+
+from advice.Cards import parse_cards
+
+
+COMMANDS = {"n": "new_round", "s": "shuffle"}
+SOURCES = {"d": "dealer", "p": "player", "o": "other"}
+
+
+class MultiTableTracker(object):
+	"""
+	Follows several tables from one stream of lines tagged with the table: "<table> [d|p|o] cards", "<table> n" (new
+	round), "<table> s" (shoe shuffled) or "<table> ?" (advice); a line "?" prints the advice of every table as far as
+	its events are applied. Cards without a source are another seat's.
+
+	Every table has its own LiveAdvisor (shoe, count, composition and bet advice), made by make_advisor(table) on its
+	first event, and its own queue worked off by its own task, so the events of one table are applied in order while a
+	slow table does not hold up the others. The advisor calls run in the default executor, the event loop only parses and dispatches.
+	"""
+
+	def __init__(self, make_advisor, output=print):
+		self.make_advisor = make_advisor
+		self.output = output
+		self.tables = {}
+		self.queues = {}
+		self.workers = []
+
+	async def run(self, lines):
+		"""
+		Dispatch the lines of an async iterable until it ends, then let every table finish its queue.
+		"""
+		async for line in lines:
+			words = line.split()
+			if not words:
+				continue
+			if words == ["?"]:
+				for name in sorted(self.tables):
+					self.output("%s: %s" % (name, self.tables[name].current))
+				continue
+			name = words[0]
+			if name not in self.queues:
+				self.tables[name] = self.make_advisor(name)
+				self.queues[name] = asyncio.Queue()
+				self.workers.append(asyncio.ensure_future(self.work(name)))
+			await self.queues[name].put(words[1:])
+		for queue in self.queues.values():
+			await queue.put(None)
+		await asyncio.gather(*self.workers)
+		for advisor in self.tables.values():
+			advisor.close()
+
+	async def work(self, name):
+		loop = asyncio.get_running_loop()
+		queue = self.queues[name]
+		while True:
+			event = await queue.get()
+			if event is None:
+				return
+			try:
+				advice = await loop.run_in_executor(None, self.apply, self.tables[name], event)
+			except ValueError as e:
+				self.output("%s: %s" % (name, e))
+				continue
+			self.output("%s: %s" % (name, advice))
+
+	def apply(self, advisor, event):
+		"""
+		Returns: The advice of a table after one of its events.
+		"""
+		if not event or event == ["?"]:
+			return advisor.current
+		if len(event) == 1 and event[0] in COMMANDS:
+			return getattr(advisor, COMMANDS[event[0]])()
+		source = "other"
+		if event[0] in SOURCES:
+			source, event = SOURCES[event[0]], event[1:]
+		names = parse_cards(" ".join(event))
+		if not names:
+			raise ValueError("No cards given")
+		return advisor.see_cards(names, source)
+
+
+async def stream_lines(stream):
+	"""
+	Returns: An async iterator over the decoded lines of an asyncio.StreamReader.
+	"""
+	while True:
+		line = await stream.readline()
+		if not line:
+			return
+		yield line.decode("utf-8", "replace")
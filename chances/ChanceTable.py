@@ -0,0 +1,140 @@
+import numpy as np
+
+from chances.Tree import RANKS, RANK_VALUES, STATES, Tree, draw, final_vector, state
+
+
+# Bucket edges of the true count and of the penetration (ratio of cards left in the shoe)
+TRUECOUNT_EDGES = [-6.0, -4.0, -2.0, -1.0, 0.0, 1.0, 2.0, 3.0, 4.0, 6.0]
+PENETRATION_EDGES = [0.375, 0.625, 0.875]
+
+def winning_chances(player_final, dealer_final, value):
+	"""
+	Winning chances like Player.winning_chance_calc: a tie counts as half a win, totals below 17 only win against
+	a busted dealer. player_final and dealer_final hold the probabilities of 17, 18, 19, 20, 21 and busted.
+	Returns: winning chance of hitting (and then hitting until 17), winning chance of standing on value.
+	"""
+	beaten = np.cumsum(dealer_final[:5]) - dealer_final[:5] / 2 + dealer_final[5]
+	if value < 17:
+		stand = dealer_final[5]
+	else:
+		stand = beaten[value - 17]
+	return float(np.dot(player_final[:5], beaten)), float(stand)
+
+
+class ChanceTable(object):
+	"""
+	Precomputed hit and stand winning chances indexed by (dealer up-card, player total, soft, true count bucket,
+	penetration bucket), built offline by averaging the infinite-deck distributions (Tree) of many random shoe
+	compositions. Looking a decision up is O(1).
+
+	For every cell the table also stores a spread bound: the largest deviation of hit - stand of a single sampled
+	composition from the cell average. It bounds the spread of the Tree chances within the bucket, not their error
+	against the exact recursion over the shoe. When the averaged difference is larger than the bound, every sampled
+	composition of the bucket agreed on the decision; otherwise the decision is ambiguous and the caller falls back
+	to its own calculation. A table only applies to shoes of the number of decks it was built for.
+	"""
+
+	def __init__(self, decks, hit, stand, bound, samples):
+		self.decks = decks
+		self.hit = hit
+		self.stand = stand
+		self.bound = bound
+		self.samples = samples
+		self.rank_index = dict((rank, i) for i, rank in enumerate(RANKS))
+		for rank in ["Jack", "Queen", "King"]:
+			self.rank_index[rank] = self.rank_index["Ten"]
+
+	@staticmethod
+	def truecount_bucket(truecount):
+		return int(np.searchsorted(TRUECOUNT_EDGES, truecount))
+
+	@staticmethod
+	def penetration_bucket(penetration):
+		return int(np.searchsorted(PENETRATION_EDGES, penetration))
+
+	def lookup(self, up_card, value, soft, truecount, penetration, decks=None):
+		"""
+		Returns: Winning chance of hitting, of standing and the spread bound of their difference, or None if the
+		table has no sample for the cell.
+		"""
+		if decks is not None and decks != self.decks:
+			raise ValueError("Chance table built for %d decks, looked up for %d" % (self.decks, decks))
+		cell = (self.rank_index[up_card], state(value, soft), self.truecount_bucket(truecount),
+			self.penetration_bucket(penetration))
+		if not self.samples[cell]:
+			return None
+		return float(self.hit[cell]), float(self.stand[cell]), float(self.bound[cell])
+
+	@classmethod
+	def build(cls, decks, tags, shoes, seed=None, min_penetration=0.25):
+		"""
+		Build the table from random shoe states: for each of shoes samples a random number of cards is removed
+		from a full shoe (down to min_penetration), the true count of the removed cards is computed with the count
+		tags (a dictionary rank name -> tag) and every up-card and player total is evaluated on the remaining cards.
+		"""
+		random = np.random.default_rng(seed)
+		shape = (len(RANKS), STATES, len(TRUECOUNT_EDGES) + 1, len(PENETRATION_EDGES) + 1)
+		hit_sum = np.zeros(shape)
+		stand_sum = np.zeros(shape)
+		samples = np.zeros(shape, dtype=np.int64)
+		player_states = [(value, False) for value in range(4, 22)] + [(value, True) for value in range(12, 22)]
+		cells = np.zeros(shoes * len(RANKS) * len(player_states), dtype=np.int64)
+		differences = np.zeros(len(cells))
+		evaluated = 0
+		full = np.array([4.0 * decks] * (len(RANKS) - 1) + [16.0 * decks])
+		rank_tags = np.array([tags[rank] for rank in RANKS])
+
+		for sample in range(shoes):
+			total = int(full.sum())
+			left = random.integers(int(min_penetration * total), total + 1)
+			removed = random.multivariate_hypergeometric(full.astype(np.int64), total - left)
+			counts = full - removed
+			penetration = left / total
+			truecount = np.dot(removed, rank_tags) / (decks * penetration)
+			tc_bucket = cls.truecount_bucket(truecount)
+			pen_bucket = cls.penetration_bucket(penetration)
+
+			for u in range(len(RANKS)):
+				if counts[u] <= 0:
+					continue
+				drawn = counts.copy()
+				drawn[u] -= 1
+				stat_card = drawn / drawn.sum()
+				finals = Tree(np.eye(STATES))
+				finals.play_out(stat_card)
+				dealer_final = final_vector(finals.tree[draw(state(0), RANK_VALUES[u])])
+				after_hit = finals.transition(stat_card) @ finals.tree
+				for value, soft in player_states:
+					hit, stand = winning_chances(final_vector(after_hit[state(value, soft)]), dealer_final, value)
+					cell = (u, state(value, soft), tc_bucket, pen_bucket)
+					hit_sum[cell] += hit
+					stand_sum[cell] += stand
+					samples[cell] += 1
+					cells[evaluated] = np.ravel_multi_index(cell, shape)
+					differences[evaluated] = hit - stand
+					evaluated += 1
+
+		with np.errstate(invalid="ignore", divide="ignore"):
+			hit = np.where(samples > 0, hit_sum / samples, 0.0)
+			stand = np.where(samples > 0, stand_sum / samples, 0.0)
+		bound = np.zeros(hit.size)
+		cells = cells[:evaluated]
+		np.maximum.at(bound, cells, np.abs(differences[:evaluated] - (hit - stand).ravel()[cells]))
+		return cls(decks, hit, stand, bound.reshape(shape), samples)
+
+	def save(self, path):
+		np.savez_compressed(path, decks=self.decks, hit=self.hit, stand=self.stand, bound=self.bound, samples=self.samples,
+			truecount_edges=TRUECOUNT_EDGES, penetration_edges=PENETRATION_EDGES)
+
+	@classmethod
+	def load(cls, path, decks=None):
+		"""
+		Load a table, checking its buckets and, if given, that it was built for shoes of decks decks.
+		"""
+		data = np.load(path)
+		if list(data["truecount_edges"]) != TRUECOUNT_EDGES or list(data["penetration_edges"]) != PENETRATION_EDGES:
+			raise ValueError("Chance table %s was built with different buckets" % path)
+		if decks is not None and int(data["decks"]) != decks:
+			raise ValueError("Chance table %s was built for %d decks, not %d" % (path, int(data["decks"]), decks))
+		return cls(int(data["decks"]), data["hit"], data["stand"], data["bound"], data["samples"])
+
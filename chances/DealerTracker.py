@@ -0,0 +1,102 @@
+import numpy as np
+
+from chances.Tree import RANKS, TEN_CARDS, composition, dealer_distributions
+
+
+CHECKPOINT_CARDS = 52  # Cards removed between two exact resynchronisations
+
+
+class DealerTracker(object):
+	"""
+	Keeps the dealer's final total distribution of every up-card current while cards leave the shoe. At a checkpoint
+	the distributions of the current composition are evaluated exactly, together with the effects of removal: how
+	much every distribution changes when one card of each rank is taken out. Between checkpoints removing a card only
+	adds its effect of removal (and, with second_order, the mixed second differences of the rank pairs), which is a
+	handful of additions instead of a new evaluation. After checkpoint removed cards the tracker resynchronises
+	exactly, so the linearisation error can not accumulate over the shoe.
+
+	evaluate maps an array of cards left per rank to a (ranks x 6) array of distributions; it defaults to the Tree
+	evaluation of dealer_distributions under the given soft 17 rule.
+	"""
+
+	def __init__(self, counts, evaluate=None, second_order=False, checkpoint=CHECKPOINT_CARDS, hit_soft_17=False):
+		if evaluate is None:
+			evaluate = lambda counts: dealer_distributions(counts, hit_soft_17)
+		self.evaluate = evaluate
+		self.second_order = second_order
+		self.checkpoint = checkpoint
+		self.rank_index = dict((rank, i) for i, rank in enumerate(RANKS))
+		for rank in TEN_CARDS:
+			self.rank_index[rank] = self.rank_index["Ten"]
+		self.resync(counts)
+
+	@classmethod
+	def from_shoe(cls, shoe, **options):
+		return cls(composition(shoe.ideal_count), **options)
+
+	def __deepcopy__(self, memo):
+		# Copies of a shoe dealt for hypothetical draws (Player.calculate_percentage) must not move the tracker
+		return None
+
+	def removed_counts(self, rank):
+		counts = self.counts.copy()
+		counts[rank] -= 1
+		return counts
+
+	def resync(self, counts=None):
+		"""
+		Evaluate the distributions of the composition exactly and recompute the effects of removal around it.
+		"""
+		if counts is not None:
+			self.counts = np.array(counts, dtype=float)
+		ranks = len(RANKS)
+		self.base = self.evaluate(self.counts)
+		self.current = self.base.copy()
+		self.since_checkpoint = 0
+		self.effects = np.zeros((ranks,) + self.base.shape)
+		available = self.counts >= 1
+		for r in np.flatnonzero(available):
+			self.effects[r] = self.evaluate(self.removed_counts(r)) - self.base
+
+		self.curvature = None
+		if self.second_order:
+			# curvature[r][s] = f(x - e_r - e_s) - f(x - e_r) - f(x - e_s) + f(x), the mixed second difference
+			self.curvature = np.zeros((ranks, ranks) + self.base.shape)
+			self.curvature_shift = np.zeros((ranks,) + self.base.shape)
+			for r in np.flatnonzero(available):
+				for s in range(r, ranks):
+					counts = self.removed_counts(r)
+					counts[s] -= 1
+					if counts[s] < 0:
+						continue
+					second = self.evaluate(counts) - self.base - self.effects[r] - self.effects[s]
+					self.curvature[r, s] = second
+					self.curvature[s, r] = second
+
+	def remove(self, rank_name):
+		"""
+		Account for one card of the given rank name leaving the shoe.
+		"""
+		r = self.rank_index[rank_name]
+		self.counts[r] -= 1
+		self.since_checkpoint += 1
+		if self.since_checkpoint >= self.checkpoint or self.counts[r] < 0:
+			self.resync()
+			return
+		if self.second_order:
+			# Newton form f(x) = f(0) + sum g_r x_r + sum_{r<s} H_rs x_r x_s + sum_r H_rr x_r (x_r - 1) / 2, exact for up
+			# to two removed cards: removing one more card of rank r adds g_r + (H x)_r
+			self.current += self.effects[r] + self.curvature_shift[r]
+			self.curvature_shift += self.curvature[:, r]
+		else:
+			self.current += self.effects[r]
+
+	def distribution(self, up_card):
+		"""
+		Returns: The dealer possibilities (keyed like Player.dealer_possibilities) of an up-card name.
+		"""
+		final = np.clip(self.current[self.rank_index[up_card]], 0.0, 1.0)
+		possibilities = {}
+		for value, probability in zip(["17", "18", "19", "20", "21", "Busted"], final):
+			possibilities[value] = float(probability)
+		return possibilities
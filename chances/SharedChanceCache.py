@@ -0,0 +1,128 @@
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+
+KEY_LENGTH = 12  # Dealer up-card, the number of Aces, Twos, ..., Nines and ten valued cards left and hit_soft_17
+SLOTS = 1 << 18
+PROBES = 16  # Slots tried after the home slot of a key before a lookup misses or a store is dropped
+
+RECORD = np.dtype([
+	("check", "<i8"),  # hash of key and chances, written last; 0 marks an empty slot
+	("key", "<u2", KEY_LENGTH),
+	("dealer", "<f8", 6),  # Dealer's chances of 17, 18, 19, 20, 21 and busted
+	("fresh", "u1"),  # 1 when computed by a process and not yet stored in the database
+])
+
+
+class SharedChanceCache(object):
+	"""
+	Hash table of the dealer's final total distribution per up-card, shoe composition and soft 17 rule in a shared
+	memory block, so a composition computed by one process is found by every process attached to the same block
+	without going through SQLite. Only the dealer's side is kept: it is the same for every hand against those cards,
+	while the player's side depends on the hand and is computed per decision. What a process reads therefore does not
+	depend on which hand or process got to a composition first.
+
+	The table is open addressing with linear probing and takes no lock. A writer clears the check of a slot, fills
+	it and writes the check last; a reader only accepts a slot whose check matches its key and chances. A slot that
+	is being written or was overwritten concurrently by two processes fails that test and is a miss, so the worst
+	a race costs is a recomputation. Keys are tuples of small integers, whose hash is the same in every process.
+
+	Entries computed by a process are marked fresh, so they can be written to the database in one transaction at the
+	end of a run instead of every process inserting them one by one.
+	"""
+
+	def __init__(self, memory, owner):
+		self.memory = memory
+		self.owner = owner
+		self.name = memory.name
+		self.table = np.ndarray(memory.size // RECORD.itemsize, dtype=RECORD, buffer=memory.buf)
+		self.slots = len(self.table)
+		self.hits = 0
+		self.misses = 0
+
+	@classmethod
+	def create(cls, slots=SLOTS, name=None):
+		memory = shared_memory.SharedMemory(name=name, create=True, size=slots * RECORD.itemsize)
+		cache = cls(memory, True)
+		cache.table[:] = np.zeros(1, dtype=RECORD)
+		return cache
+
+	@classmethod
+	def attach(cls, name):
+		memory = shared_memory.SharedMemory(name=name)
+		# Only the creator may unlink the block; the resource tracker would do it when this process exits
+		resource_tracker.unregister(memory._name, "shared_memory")
+		return cls(memory, False)
+
+	@classmethod
+	def open(cls, name, slots=SLOTS):
+		"""
+		Returns: The cache of that name, created if no process has created it yet.
+		"""
+		try:
+			return cls.attach(name)
+		except FileNotFoundError:
+			return cls.create(slots, name)
+
+	def get(self, key):
+		"""
+		Returns: The dealer's chances of 17, 18, 19, 20, 21 and busted stored for key, or None.
+		"""
+		home = hash(key) % self.slots
+		for probe in range(PROBES + 1):
+			record = self.table[(home + probe) % self.slots]
+			check = int(record["check"])
+			if check == 0:
+				break
+			if tuple(record["key"].tolist()) == key:
+				dealer = tuple(record["dealer"].tolist())
+				if hash((key, dealer)) == check:
+					self.hits += 1
+					return list(dealer)
+				break
+		self.misses += 1
+		return None
+
+	def put(self, key, dealer, fresh=True):
+		"""
+		Store the dealer's chances of key; a fresh entry is not in the database yet.
+		Returns: False if the probed slots are all taken by other keys.
+		"""
+		dealer = tuple(dealer)
+		home = hash(key) % self.slots
+		for probe in range(PROBES + 1):
+			record = self.table[(home + probe) % self.slots]
+			if int(record["check"]) == 0 or tuple(record["key"].tolist()) == key:
+				record["check"] = 0
+				record["key"] = key
+				record["dealer"] = dealer
+				record["fresh"] = fresh
+				record["check"] = hash((key, tuple(record["dealer"].tolist())))
+				return True
+		return False
+
+	def take_fresh(self):
+		"""
+		Returns: (key, dealer's chances) of every valid fresh entry, which are no longer fresh after.
+		"""
+		entries = []
+		for index in np.flatnonzero((self.table["check"] != 0) & (self.table["fresh"] == 1)):
+			record = self.table[index]
+			key = tuple(record["key"].tolist())
+			dealer = tuple(record["dealer"].tolist())
+			if hash((key, dealer)) == int(record["check"]):
+				entries.append((key, list(dealer)))
+				record["fresh"] = 0
+		return entries
+
+	def used(self):
+		return int(np.count_nonzero(self.table["check"]))
+
+	def close(self):
+		del self.table
+		self.memory.close()
+		if self.owner:
+			# A forked attacher shares our resource tracker and took the block off it
+			resource_tracker.register(self.memory._name, "shared_memory")
+			self.memory.unlink()
@@ -0,0 +1,173 @@
+import numpy as np
+
+
+RANKS = ["Ace", "Two", "Three", "Four", "Five", "Six", "Seven", "Eight", "Nine", "Ten"]
+RANK_VALUES = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+TEN_CARDS = ["Ten", "Jack", "Queen", "King"]
+
+# State space of a hand total: hard totals 0..21 (0 is the empty hand), soft totals 11..21 (an ace counted as 11)
+# and busted.
+HARD = 0
+SOFT = 22 - 11
+BUSTED = SOFT + 22
+STATES = BUSTED + 1
+FINAL_TOTALS = [17, 18, 19, 20, 21]
+
+# Enough draws to reach a final state from any state (the longest path is nine Twos from the empty hand).
+MAX_DRAWS = 16
+
+
+def state(value, soft=False):
+	"""
+	Returns: The index of a hand total in the state space.
+	"""
+	if value > 21:
+		return BUSTED
+	if soft:
+		return SOFT + value
+	return HARD + value
+
+
+def draw(index, rank_value):
+	"""
+	Returns: The state reached from state index by drawing a card of the given value (1 for an ace).
+	"""
+	if index == BUSTED:
+		return BUSTED
+	if index >= SOFT + 11:
+		value = index - SOFT + rank_value
+		if value > 21:
+			return state(value - 10)
+		return state(value, True)
+	value = index - HARD
+	if rank_value == 1 and value + 11 <= 21:
+		return state(value + 11, True)
+	return state(value + rank_value)
+
+
+def final_vector(tree):
+	"""
+	Returns: The probabilities of the final totals 17..21 and of busting from played out distributions (the last
+	axis of tree indexes the states).
+	"""
+	finals = [tree[..., state(value)] + tree[..., state(value, True)] for value in FINAL_TOTALS]
+	return np.stack(finals + [tree[..., BUSTED]], axis=-1)
+
+
+def composition(ideal_count):
+	"""
+	Returns: The number of cards left per rank (Jack, Queen and King counted as Ten) from a shoe's ideal_count.
+	"""
+	counts = np.zeros(len(RANKS))
+	for i, rank in enumerate(RANKS[:-1]):
+		counts[i] = ideal_count[rank]
+	counts[-1] = sum(ideal_count[rank] for rank in TEN_CARDS if rank in ideal_count)
+	return counts
+
+
+class Tree(object):
+	"""
+	Probability distribution of a hand total that changes as statistical cards are added. In this context, a
+	statistical card is a vector with the probability of drawing each of the RANKS. The distribution is a vector
+	over the hard and soft totals plus busted and a draw is a state transition matrix, so hitting until a final
+	total applies a power of that matrix instead of enumerating every sequence of cards.
+
+	The tree may also be a matrix with one distribution per row, e.g. the identity to play out every state at once.
+
+	Drawing with fixed rank probabilities treats the shoe as infinite, which makes this a fast approximation of the
+	exact composition-dependent recursion.
+	"""
+	_draws = None
+
+	def __init__(self, start=None, stand_on=17, hit_soft_17=False):
+		if start is None:
+			self.tree = np.zeros(STATES)
+			self.tree[state(0)] = 1.0
+		else:
+			self.tree = np.array(start, dtype=float)
+		self.stand_on = stand_on
+		self.hit_soft_17 = hit_soft_17
+
+	@classmethod
+	def draws(cls):
+		"""
+		Returns: A (ranks x states x states) array, draws[r][s][t] is 1 if drawing rank r moves state s to t.
+		"""
+		if cls._draws is None:
+			draws = np.zeros((len(RANKS), STATES, STATES))
+			for r, rank_value in enumerate(RANK_VALUES):
+				for index in range(STATES):
+					draws[r, index, draw(index, rank_value)] = 1.0
+			cls._draws = draws
+		return cls._draws
+
+	def standing(self):
+		"""
+		Returns: A mask of the states in which the hand stands (final totals and busted).
+		"""
+		mask = np.zeros(STATES, dtype=bool)
+		mask[BUSTED] = True
+		for value in range(self.stand_on, 22):
+			mask[state(value)] = True
+			mask[state(value, True)] = True
+		if self.hit_soft_17 and self.stand_on == 17:
+			mask[state(17, True)] = False
+		return mask
+
+	def transition(self, stat_card):
+		"""
+		Returns: The state transition matrix of drawing one statistical card.
+		"""
+		return np.tensordot(stat_card, self.draws(), axes=1)
+
+	def add_a_statistical_card(self, stat_card):
+		"""
+		Draw one statistical card into every hand that has not reached a final state yet.
+		"""
+		standing = self.standing()
+		hitting = np.where(standing, 0.0, self.tree)
+		self.tree = np.where(standing, self.tree, 0.0) + hitting @ self.transition(stat_card)
+
+	def play_out(self, stat_card):
+		"""
+		Keep drawing statistical cards until every hand stands or busted.
+		"""
+		transition = self.transition(stat_card)
+		standing = self.standing()
+		transition[standing] = 0.0
+		transition[standing, np.flatnonzero(standing)] = 1.0
+		self.tree = self.tree @ np.linalg.matrix_power(transition, MAX_DRAWS)
+
+	def final_distribution(self):
+		"""
+		Returns: The probabilities of the final totals 17..21 and of busting, keyed like the dealer possibilities.
+		Totals below 17 (a player standing on a stiff) are not included.
+		"""
+		possibilities = {}
+		for value in FINAL_TOTALS:
+			possibilities[str(value)] = float(self.tree[state(value)] + self.tree[state(value, True)])
+		possibilities["Busted"] = float(self.tree[BUSTED])
+		return possibilities
+
+
+def dealer_distributions(counts, hit_soft_17=False):
+	"""
+	Returns: A (ranks x 6) array with the distribution of the dealer's final total (17..21, busted) for every
+	up-card, drawing from a shoe with the given number of cards per rank.
+	"""
+	tree = Tree(np.eye(STATES)[[draw(state(0), rank_value) for rank_value in RANK_VALUES]], hit_soft_17=hit_soft_17)
+	tree.play_out(counts / counts.sum())
+	return final_vector(tree.tree)
+
+
+def dealer_probabilities(up_card, ideal_count, hit_soft_17=False):
+	"""
+	Returns: The distribution of the dealer's final total for an up-card name and the cards left in the shoe.
+	"""
+	counts = composition(ideal_count)
+	tree = Tree(hit_soft_17=hit_soft_17)
+	stat_card = np.zeros(len(RANKS))
+	stat_card[RANKS.index("Ten" if up_card in TEN_CARDS else up_card)] = 1.0
+	tree.add_a_statistical_card(stat_card)
+	tree.play_out(counts / counts.sum())
+	return tree.final_distribution()
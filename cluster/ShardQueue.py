@@ -0,0 +1,183 @@
+import os
+import pickle
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+
+STALE_SECONDS = 120.0  # A claimed shard whose heartbeat is older than this is handed out again
+POLL_SECONDS = 0.5
+
+
+class LocalQueue(object):
+	"""
+	Stand-in for the FileQueue on one machine: the shards are played by a process pool. Both queues take a job and
+	a list of shards and return the results in shard order, so the coordinator cannot tell them apart.
+	"""
+
+	def __init__(self, play, processes=None):
+		self.play = play
+		self.processes = processes
+
+	def run(self, job, shards):
+		with ProcessPoolExecutor(self.processes) as pool:
+			tasks = [pool.submit(self.play, job, *shard) for shard in shards]
+			return [task.result() for task in tasks]
+
+
+class FileQueue(object):
+	"""
+	Shard queue in a directory that the coordinator and every worker can reach (a shared or network filesystem):
+
+		job.pickle                 the job of the current run
+		todo/NNNNNN                shards waiting for a worker
+		claimed/NNNNNN.<worker>    shards being played, touched by their worker as a heartbeat
+		done/NNNNNN.pickle         results
+		finished                   tells the workers to stop
+
+	A worker claims a shard by renaming it out of todo, which only one worker can win. The coordinator puts shards
+	whose heartbeat is older than the timeout back into todo, so the shards of a dead worker are played by another
+	one. Shards are seeded, so a shard played twice gives the same result twice and the first one written is kept.
+	"""
+
+	def __init__(self, directory, timeout=STALE_SECONDS, poll=POLL_SECONDS):
+		self.directory = directory
+		self.timeout = timeout
+		self.poll = poll
+		self.todo = os.path.join(directory, "todo")
+		self.claimed = os.path.join(directory, "claimed")
+		self.done = os.path.join(directory, "done")
+		self.finished = os.path.join(directory, "finished")
+		self.job_path = os.path.join(directory, "job.pickle")
+		for path in (self.todo, self.claimed, self.done):
+			os.makedirs(path, exist_ok=True)
+
+	def run(self, job, shards):
+		"""
+		Coordinator: publish a job and its shards, wait until every shard has a result, requeueing the stale ones.
+		Returns: The results in shard order.
+		"""
+		self.clear()
+		run = uuid.uuid4().hex
+		write_atomic(self.job_path, (run, job))
+		for index, shard in enumerate(shards):
+			write_atomic(os.path.join(self.todo, "%06d" % index), (run, shard))
+		results = {}
+		while len(results) < len(shards):
+			for name in os.listdir(self.done):
+				index = int(name.split(".")[0])
+				if index not in results and name.endswith(".pickle"):
+					shard_run, result = read(os.path.join(self.done, name))
+					if shard_run == run:
+						results[index] = result
+			self.requeue(results)
+			if len(results) < len(shards):
+				time.sleep(self.poll)
+		write_atomic(self.finished, run)
+		return [results[index] for index in range(len(shards))]
+
+	def requeue(self, results):
+		now = time.time()
+		for name in os.listdir(self.claimed):
+			index = int(name.split(".")[0])
+			path = os.path.join(self.claimed, name)
+			try:
+				if index in results:
+					os.remove(path)
+				elif now - os.path.getmtime(path) > self.timeout:
+					os.rename(path, os.path.join(self.todo, "%06d" % index))
+			except FileNotFoundError:
+				pass  # The worker finished the shard meanwhile
+
+	def clear(self):
+		for directory in (self.todo, self.claimed, self.done):
+			for name in os.listdir(directory):
+				os.remove(os.path.join(directory, name))
+		for path in (self.finished, self.job_path):
+			if os.path.exists(path):
+				os.remove(path)
+
+	def claim(self, worker):
+		"""
+		Worker: take the next shard.
+		Returns: (index, path of the claim, run, shard) or None when no shard is waiting.
+		"""
+		for name in sorted(os.listdir(self.todo)):
+			if "." in name:
+				continue  # Still being written
+			path = os.path.join(self.claimed, "%s.%s" % (name, worker))
+			try:
+				os.rename(os.path.join(self.todo, name), path)
+			except FileNotFoundError:
+				continue  # Another worker was faster
+			os.utime(path)
+			run, shard = read(path)
+			return int(name), path, run, shard
+		return None
+
+	def complete(self, index, claim, run, result):
+		write_atomic(os.path.join(self.done, "%06d.pickle" % index), (run, result))
+		try:
+			os.remove(claim)
+		except FileNotFoundError:
+			pass  # Requeued while we were playing it, the other result is the same
+
+	def finished_run(self):
+		try:
+			return read(self.finished)
+		except FileNotFoundError:
+			return None
+
+	def work(self, play, worker=None):
+		"""
+		Worker loop: play shards with play(job, *shard) until the coordinator marks a run finished. A marker left by
+		an earlier run does not count, so workers can be started before the coordinator.
+		"""
+		worker = worker or "%s-%d" % (socket.gethostname(), os.getpid())
+		earlier = self.finished_run()
+		job = None
+		while True:
+			finished = self.finished_run()
+			if finished is not None and finished != earlier:
+				return
+			claimed = self.claim(worker)
+			if claimed is None:
+				time.sleep(self.poll)
+				continue
+			index, claim, run, shard = claimed
+			if job is None or job[0] != run:
+				job = read(self.job_path)
+			stop = threading.Event()
+			beat = threading.Thread(target=heartbeat, args=(claim, self.timeout / 4.0, stop), daemon=True)
+			beat.start()
+			try:
+				result = play(job[1], *shard)
+			finally:
+				stop.set()
+				beat.join()
+			self.complete(index, claim, run, result)
+
+
+def heartbeat(path, interval, stop):
+	while not stop.wait(interval):
+		try:
+			os.utime(path)
+		except FileNotFoundError:
+			return
+
+
+def read(path):
+	with open(path, 'rb') as f:
+		return pickle.load(f)
+
+
+def write_atomic(path, value):
+	"""
+	Write a pickle next to path and rename it into place, so a reader never sees a partial file.
+	"""
+	temporary = "%s.%s.tmp" % (path, uuid.uuid4().hex)
+	with open(temporary, 'wb') as f:
+		pickle.dump(value, f)
+	os.replace(temporary, path)
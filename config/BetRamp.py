@@ -0,0 +1,37 @@
+class BetRamp(object):
+	"""
+	Maps the true count to a stake. steps is a list of (true count, stake) pairs sorted by true count: the stake of
+	the highest step whose true count is strictly exceeded is bet, the base stake if none is.
+	"""
+
+	def __init__(self, steps, base=1.0, name=None):
+		self.steps = sorted(steps)
+		self.base = base
+		self.name = name if name is not None else ",".join("%g=%g" % step for step in self.steps)
+
+	@classmethod
+	def parse(cls, text):
+		"""
+		Returns: A ramp from "name:tc=stake,tc=stake,..." (the name is optional).
+		"""
+		name = None
+		if ":" in text:
+			name, text = text.split(":", 1)
+		steps = []
+		for step in text.split(","):
+			if step:
+				truecount, stake = step.split("=")
+				steps.append((float(truecount), float(stake)))
+		return cls(steps, name=name)
+
+	def stake(self, truecount):
+		stake = self.base
+		for threshold, step_stake in self.steps:
+			if truecount > threshold:
+				stake = step_stake
+			else:
+				break
+		return stake
+
+	def __str__(self):
+		return self.name
@@ -0,0 +1,56 @@
+TABLES = {"HARD": 0, "SOFT": 1, "PAIR": 2}
+UP_CARDS = ["Two", "Three", "Four", "Five", "Six", "Seven", "Eight", "Nine", "Ten", "Jack", "Queen", "King", "Ace"]
+TEN_CARDS = ["Ten", "Jack", "Queen", "King"]
+TOTALS = 22
+NO_INDEX = float("inf")
+
+
+class CountStrategy(object):
+	"""
+	A basic strategy with true count indices, compiled into one flat list of (index, above, below) cells addressed by
+	table, hand value and up-card. Cells without a deviation get an infinite index and the basic strategy action as
+	below, so every decision is one list read and one comparison of the true count against the index.
+	"""
+
+	def __init__(self, strategy, indices=()):
+		hard_strategy, soft_strategy, pair_strategy = strategy
+		self.up_index = dict((up_card, i) for i, up_card in enumerate(UP_CARDS))
+		self.cells = [(NO_INDEX, None, None)] * (len(TABLES) * TOTALS * len(UP_CARDS))
+		self.insurance_index = NO_INDEX
+		for table, table_strategy in [("HARD", hard_strategy), ("SOFT", soft_strategy), ("PAIR", pair_strategy)]:
+			for value, row in table_strategy.items():
+				for up_card in UP_CARDS:
+					action = row[up_card]
+					self.cells[self.cell(TABLES[table], value, up_card)] = (NO_INDEX, action, action)
+
+		for table, total, up_card, index, above, below in indices:
+			if table == "INSURANCE":
+				self.insurance_index = index if above == "Y" else NO_INDEX
+				continue
+			value = 2 * total if table == "PAIR" else total
+			for name in (TEN_CARDS if up_card in TEN_CARDS else [up_card]):
+				self.cells[self.cell(TABLES[table], value, name)] = (index, above, below)
+
+	def cell(self, table, value, up_card):
+		return (table * TOTALS + value) * len(UP_CARDS) + self.up_index[up_card]
+
+	def action(self, hand, up_card, truecount):
+		"""
+		Returns: The action for the hand against the up-card name at the given true count.
+		"""
+		if hand.soft():
+			table = 1
+		elif hand.splitable():
+			table = 2
+		else:
+			table = 0
+		index, above, below = self.cells[(table * TOTALS + hand.value) * len(UP_CARDS) + self.up_index[up_card]]
+		if truecount >= index:
+			return above
+		return below
+
+	def insure(self, truecount):
+		"""
+		Returns: Whether to take insurance at the given true count.
+		"""
+		return truecount >= self.insurance_index
@@ -0,0 +1,81 @@
+SURRENDER_TYPES = ["none", "late", "early"]
+MAX_HAND_VALUE = 32  # Above the highest value a hand can reach (a stiff 16 drawing a ten)
+
+
+class Rules(object):
+	"""
+	The table rules: dealer hits soft 17 (H17) or stands (S17), double after split (DAS), re-split aces (RSA), the
+	number of splits per round (None for no limit), surrender (none, late: after the dealer's peek, early: before
+	it), the blackjack payout, whether the dealer peeks for a blackjack under an Ace or Ten up-card and whether three
+	sevens count as a blackjack.
+
+	Rules are validated once and compiled into the flags and the dealer's hit table the engine reads in its loops.
+	Like SimulationConfig they are plain picklable objects shared by every engine and worker process.
+	"""
+
+	def __init__(self, hit_soft_17=False, double_after_split=True, resplit_aces=True, max_splits=None,
+			surrender="late", blackjack_payout=1.5, dealer_peek=False, triple7=False):
+		if max_splits is not None and max_splits < 0:
+			raise ValueError("The number of splits can not be negative")
+		if surrender not in SURRENDER_TYPES:
+			raise ValueError("Unknown surrender type '%s', expected one of %s" % (surrender, ", ".join(SURRENDER_TYPES)))
+		if blackjack_payout <= 0:
+			raise ValueError("The blackjack payout must be positive")
+		self.hit_soft_17 = hit_soft_17
+		self.double_after_split = double_after_split
+		self.resplit_aces = resplit_aces
+		self.max_splits = max_splits
+		self.surrender = surrender
+		self.blackjack_payout = blackjack_payout
+		self.dealer_peek = dealer_peek
+		self.triple7 = triple7
+		self.compile()
+
+	def compile(self):
+		"""
+		Derive the flags and tables the engine branches on.
+		"""
+		self.max_hands = self.max_splits + 1 if self.max_splits is not None else float("inf")
+		self.surrender_allowed = self.surrender != "none"
+		self.early_surrender = self.surrender == "early"
+		# dealer_hits[soft][value]: whether the dealer draws to a hand
+		self.dealer_hits = [[value < 17 for value in range(MAX_HAND_VALUE)],
+			[value < 17 or (value == 17 and self.hit_soft_17) for value in range(MAX_HAND_VALUE)]]
+
+	@classmethod
+	def parse(cls, text):
+		"""
+		Returns: Rules from a comma separated list like "h17,nodas,nrsa,splits=3,surrender=none,payout=1.2,peek".
+		Flags not mentioned keep their defaults.
+		"""
+		options = {}
+		flags = {"h17": ("hit_soft_17", True), "s17": ("hit_soft_17", False), "das": ("double_after_split", True),
+			"nodas": ("double_after_split", False), "rsa": ("resplit_aces", True), "nrsa": ("resplit_aces", False),
+			"peek": ("dealer_peek", True), "nopeek": ("dealer_peek", False), "triple7": ("triple7", True)}
+		for option in text.split(","):
+			option = option.strip().lower()
+			if not option:
+				continue
+			if option in flags:
+				name, value = flags[option]
+				options[name] = value
+			elif option.startswith("splits="):
+				options["max_splits"] = int(option.split("=", 1)[1])
+			elif option.startswith("surrender="):
+				options["surrender"] = option.split("=", 1)[1]
+			elif option.startswith("payout="):
+				options["blackjack_payout"] = float(option.split("=", 1)[1])
+			else:
+				raise ValueError("Unknown rule '%s'" % option)
+		return cls(**options)
+
+	def __str__(self):
+		options = ["h17" if self.hit_soft_17 else "s17", "das" if self.double_after_split else "nodas",
+			"rsa" if self.resplit_aces else "nrsa"]
+		if self.max_splits is not None:
+			options.append("splits=%d" % self.max_splits)
+		options += ["surrender=%s" % self.surrender, "payout=%g" % self.blackjack_payout,
+			"peek" if self.dealer_peek else "nopeek"]
+		if self.triple7:
+			options.append("triple7")
+		return ",".join(options)
@@ -0,0 +1,29 @@
+from config.Rules import Rules
+
+
+class SimulationConfig(object):
+	"""
+	The table a game is played at: number of decks, penetration (ratio of cards left in the shoe when it gets
+	reshuffled), the bet ramp and the rules. Configs are plain picklable objects, so they can be handed to worker
+	processes.
+	"""
+
+	def __init__(self, decks, penetration, bet_ramp, rules=None):
+		if decks < 1:
+			raise ValueError("A shoe needs at least one deck")
+		if not 0.0 < penetration < 1.0:
+			raise ValueError("The penetration must be between 0 and 1")
+		self.decks = decks
+		self.penetration = penetration
+		self.bet_ramp = bet_ramp
+		self.rules = rules if rules is not None else Rules()
+
+	def shoe_key(self):
+		"""
+		Returns: The part of the config that determines which cards get dealt and how they are played. Configs with
+		the same key can be played on the same shoes.
+		"""
+		return self.decks, self.penetration, str(self.rules)
+
+	def __str__(self):
+		return "%d decks, penetration %g, ramp %s, rules %s" % (self.decks, self.penetration, self.bet_ramp, self.rules)
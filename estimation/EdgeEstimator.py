@@ -0,0 +1,80 @@
+import math
+from statistics import NormalDist
+
+
+class EdgeEstimator(object):
+	"""
+	Streaming estimate of the edge (total winnings / total bet, in percent) with a batch-means confidence interval.
+	Games are grouped into batches of batch_size; the variance of the ratio is estimated from the batch residuals
+	money - edge * bet (delta method), which stays honest when single games are skewed or correlated.
+	"""
+	MIN_BATCHES = 10
+
+	def __init__(self, batch_size=100, confidence=0.95):
+		self.batch_size = batch_size
+		self.z = NormalDist().inv_cdf(0.5 + confidence / 2.0)
+		self.confidence = confidence
+		self.games = 0
+		self.money = 0.0
+		self.bet = 0.0
+		self.batch_money = []
+		self.batch_bet = []
+		self.current_money = 0.0
+		self.current_bet = 0.0
+		self.current_games = 0
+
+	def add(self, money, bet):
+		"""
+		Add the result of one game.
+		"""
+		self.games += 1
+		self.money += money
+		self.bet += bet
+		self.current_money += money
+		self.current_bet += bet
+		self.current_games += 1
+		if self.current_games == self.batch_size:
+			self.batch_money.append(self.current_money)
+			self.batch_bet.append(self.current_bet)
+			self.current_money = 0.0
+			self.current_bet = 0.0
+			self.current_games = 0
+
+	def batches(self):
+		return len(self.batch_money)
+
+	def edge(self):
+		"""
+		Returns: The edge in percent over all games added so far.
+		"""
+		if self.bet == 0:
+			return 0.0
+		return 100.0 * self.money / self.bet
+
+	def half_width(self):
+		"""
+		Returns: The half-width of the confidence interval of the edge in percent, infinite below MIN_BATCHES.
+		Only completed batches are taken into account.
+		"""
+		k = len(self.batch_money)
+		if k < self.MIN_BATCHES:
+			return float("inf")
+		money = sum(self.batch_money)
+		bet = sum(self.batch_bet)
+		ratio = money / bet
+		residuals = 0.0
+		for batch_money, batch_bet in zip(self.batch_money, self.batch_bet):
+			residuals += (batch_money - ratio * batch_bet) ** 2
+		mean_bet = bet / k
+		standard_error = math.sqrt(residuals / (k - 1) / k) / mean_bet
+		return 100.0 * self.z * standard_error
+
+	def done(self, target, max_games):
+		"""
+		Returns: True once the half-width reached the target (in percent) or max_games were played.
+		"""
+		if self.games >= max_games:
+			return True
+		if self.current_games:
+			return False
+		return self.half_width() <= target
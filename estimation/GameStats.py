@@ -0,0 +1,99 @@
+import math
+from statistics import NormalDist
+
+import numpy as np
+
+
+HISTOGRAM_EDGES = np.arange(-100.0, 101.0, 5.0)  # Bins of the winnings per game, plus one bin below and one above
+
+
+class GameStats(object):
+	"""
+	Mergeable statistics of a sequence of games: sums and sums of squares of winnings and bets (enough for the edge
+	and its delta method confidence interval), a histogram of the winnings per game and the running total's lowest
+	and highest point and largest peak to trough drawdown.
+
+	merge appends the games of another GameStats to this one. The sums and the histogram are independent of the
+	order; the running total is not, so shards must be merged in game order to get the result of one sequential run.
+	"""
+
+	def __init__(self, confidence=0.95):
+		self.z = NormalDist().inv_cdf(0.5 + confidence / 2.0)
+		self.confidence = confidence
+		self.games = 0
+		self.hands = 0
+		self.count_higher_bet = 0
+		self.money = 0.0
+		self.bet = 0.0
+		self.money_squares = 0.0
+		self.bet_squares = 0.0
+		self.money_bet = 0.0
+		self.histogram = np.zeros(len(HISTOGRAM_EDGES) + 1, dtype=np.int64)
+		self.lowest = 0.0  # Lowest running total (Simulation's max drawdown)
+		self.highest = 0.0  # Highest running total (Simulation's max win)
+		self.drawdown = 0.0  # Largest fall of the running total from an earlier peak
+
+	def add(self, money, bet, hands=0, count_higher_bet=0):
+		"""
+		Add the result of one game.
+		"""
+		self.games += 1
+		self.hands += hands
+		self.count_higher_bet += count_higher_bet
+		self.money += money
+		self.bet += bet
+		self.money_squares += money * money
+		self.bet_squares += bet * bet
+		self.money_bet += money * bet
+		self.histogram[np.searchsorted(HISTOGRAM_EDGES, money, side="right")] += 1
+		self.lowest = min(self.lowest, self.money)
+		self.highest = max(self.highest, self.money)
+		self.drawdown = max(self.drawdown, self.highest - self.money)
+
+	def merge(self, other):
+		"""
+		Append the games of other, played after the games of this one.
+		"""
+		self.drawdown = max(self.drawdown, other.drawdown, self.highest - (self.money + other.lowest))
+		self.lowest = min(self.lowest, self.money + other.lowest)
+		self.highest = max(self.highest, self.money + other.highest)
+		self.games += other.games
+		self.hands += other.hands
+		self.count_higher_bet += other.count_higher_bet
+		self.money += other.money
+		self.bet += other.bet
+		self.money_squares += other.money_squares
+		self.bet_squares += other.bet_squares
+		self.money_bet += other.money_bet
+		self.histogram += other.histogram
+		return self
+
+	def edge(self):
+		"""
+		Returns: The edge in percent.
+		"""
+		if self.bet == 0:
+			return 0.0
+		return 100.0 * self.money / self.bet
+
+	def half_width(self):
+		"""
+		Returns: The half-width of the confidence interval of the edge in percent, from the per game residuals
+		money - edge * bet (delta method), infinite below two games.
+		"""
+		if self.games < 2 or self.bet == 0:
+			return float("inf")
+		ratio = self.money / self.bet
+		residuals = self.money_squares - 2 * ratio * self.money_bet + ratio * ratio * self.bet_squares
+		mean_bet = self.bet / self.games
+		standard_error = math.sqrt(max(residuals, 0.0) / (self.games - 1) / self.games) / mean_bet
+		return 100.0 * self.z * standard_error
+
+	def standard_deviation(self):
+		"""
+		Returns: The standard deviation of the winnings per game.
+		"""
+		if self.games < 2:
+			return 0.0
+		mean = self.money / self.games
+		return math.sqrt(max(self.money_squares - self.games * mean * mean, 0.0) / (self.games - 1))
@@ -0,0 +1,190 @@
+import os
+import struct
+
+import numpy as np
+
+
+MAGIC = b"BJHH"
+VERSION = 1
+HEADER = struct.Struct("<4sHHHH20x")  # magic, version, record size, decks, max cards, padding to 32 bytes
+MAX_CARDS = 16  # Cards stored per hand, longer hands are truncated (cards_count keeps the real length)
+
+CARD_CODES = {"Ace": 1, "Two": 2, "Three": 3, "Four": 4, "Five": 5, "Six": 6, "Seven": 7, "Eight": 8, "Nine": 9,
+	"Ten": 10, "Jack": 11, "Queen": 12, "King": 13}
+CARD_NAMES = dict((code, name) for name, code in CARD_CODES.items())
+
+# How a hand ended. Every card beyond the first two (but the doubled card) is a hit.
+ACTIONS = ["S", "D", "Sr", "Bust", "BJ"]
+STAND, DOUBLE, SURRENDER, BUST, BLACKJACK = range(len(ACTIONS))
+SPLIT_HAND = 1  # flags bit: the hand comes from a split
+
+RECORD = np.dtype([
+	("shoe", "<u4"), ("round", "<u4"), ("seat", "u1"), ("hand", "u1"), ("action", "i1"), ("flags", "u1"),
+	("truecount", "<f4"), ("stake", "<f4"), ("bet", "<f4"), ("win", "<f4"),
+	("cards_count", "u1"), ("dealer_count", "u1"),
+	("cards", "i1", (MAX_CARDS,)), ("dealer", "i1", (MAX_CARDS,)),
+])
+
+
+class HandHistoryWriter(object):
+	"""
+	Appends one fixed-width record per finished hand to a binary file: shoe and round number, seat, the player's
+	and the dealer's cards as int8 codes, how the hand ended, the true count at the bet, the stake and the outcome.
+	A new file starts with a 32 byte header; appending to an existing file checks that its layout and number of
+	decks match and continues its shoe and round numbers. Records are buffered and written in blocks.
+	"""
+	BUFFER_RECORDS = 4096
+
+	def __init__(self, path, decks):
+		self.path = path
+		self.decks = decks
+		self.buffer = np.zeros(self.BUFFER_RECORDS, dtype=RECORD)
+		self.buffered = 0
+		self.shoes = 0
+		self.rounds = 0
+		exists = os.path.exists(path) and os.path.getsize(path) > 0
+		if exists and check_header(path) != decks:
+			raise ValueError("%s records a shoe of a different number of decks" % path)
+		if exists:
+			records = read_history(path)
+			if len(records):
+				self.shoes = int(records["shoe"][-1]) + 1
+				self.rounds = int(records["round"][-1]) + 1
+			del records
+		self.file = open(path, 'ab')
+		if not exists:
+			self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.itemsize, decks, MAX_CARDS))
+
+	def new_shoe(self):
+		"""
+		Returns: The number of the next shoe.
+		"""
+		self.shoes += 1
+		return self.shoes - 1
+
+	def new_round(self):
+		"""
+		Returns: The number of the next round.
+		"""
+		self.rounds += 1
+		return self.rounds - 1
+
+	def record(self, shoe, round, seat, hand_index, truecount, stake, hand, dealer_hand, win, bet, triple7=False):
+		"""
+		Add the record of one settled hand.
+		"""
+		record = self.buffer[self.buffered]
+		record["shoe"] = shoe
+		record["round"] = round
+		record["seat"] = seat
+		record["hand"] = hand_index
+		if hand.surrender:
+			record["action"] = SURRENDER
+		elif hand.busted():
+			record["action"] = BUST
+		elif hand.doubled:
+			record["action"] = DOUBLE
+		elif hand.blackjack(triple7):
+			record["action"] = BLACKJACK
+		else:
+			record["action"] = STAND
+		record["flags"] = SPLIT_HAND if hand.splithand else 0
+		record["truecount"] = truecount
+		record["stake"] = stake
+		record["bet"] = bet
+		record["win"] = win
+		record["cards_count"] = len(hand.cards)
+		record["dealer_count"] = len(dealer_hand.cards)
+		record["cards"] = encode(hand.cards)
+		record["dealer"] = encode(dealer_hand.cards)
+		self.buffered += 1
+		if self.buffered == self.BUFFER_RECORDS:
+			self.flush()
+
+	def flush(self):
+		self.file.write(self.buffer[:self.buffered].tobytes())
+		self.file.flush()
+		self.buffer[:self.buffered] = 0
+		self.buffered = 0
+
+	def close(self):
+		self.flush()
+		self.file.close()
+
+
+def encode(cards):
+	codes = np.zeros(MAX_CARDS, dtype=np.int8)
+	for i, card in enumerate(cards[:MAX_CARDS]):
+		codes[i] = CARD_CODES[card.name]
+	return codes
+
+
+def check_header(path):
+	"""
+	Returns: The number of decks stored in the header of a hand history file.
+	"""
+	with open(path, 'rb') as history:
+		magic, version, record_size, decks, max_cards = HEADER.unpack(history.read(HEADER.size))
+	if magic != MAGIC or version != VERSION or record_size != RECORD.itemsize or max_cards != MAX_CARDS:
+		raise ValueError("%s is not a version %d hand history" % (path, VERSION))
+	return decks
+
+
+def read_history(path):
+	"""
+	Returns: The records of a hand history file as a read-only numpy.memmap with the RECORD dtype.
+	"""
+	check_header(path)
+	if os.path.getsize(path) == HEADER.size:
+		return np.zeros(0, dtype=RECORD)
+	return np.memmap(path, dtype=RECORD, mode='r', offset=HEADER.size)
+
+
+def card_values(codes):
+	"""
+	Returns: The blackjack values of card codes, aces counted as 1 and the empty code as 0.
+	"""
+	return np.minimum(codes, 10)
+
+
+def starting_totals(records):
+	"""
+	Returns: The total of the first two cards of every record and whether it is soft.
+	"""
+	values = card_values(records["cards"][:, :2]).astype(np.int64)
+	hard = values.sum(axis=1)
+	soft = (values == 1).any(axis=1) & (hard + 10 <= 21)
+	return np.where(soft, hard + 10, hard), soft
+
+
+def outcome_by_truecount(records, edges=range(-6, 7)):
+	"""
+	Returns: Rows of (true count bucket, hands, total bet, total winnings) with the true count rounded to the
+	nearest integer and clipped to the edges.
+	"""
+	buckets = np.clip(np.rint(records["truecount"]), edges[0], edges[-1]).astype(np.int64)
+	rows = []
+	for bucket in edges:
+		selected = buckets == bucket
+		if selected.any():
+			rows.append((bucket, int(selected.sum()), float(records["bet"][selected].sum()),
+				float(records["win"][selected].sum())))
+	return rows
+
+
+def outcome_by_start(records):
+	"""
+	Returns: Rows of (starting total, soft, dealer up-card code, hands, total bet, total winnings) for the hands that
+	were not split, grouped by the first two cards and the dealer's up-card.
+	"""
+	records = records[(records["flags"] & SPLIT_HAND) == 0]
+	totals, soft = starting_totals(records)
+	up_cards = card_values(records["dealer"][:, 0])
+	keys = np.stack([totals, soft.astype(np.int64), up_cards], axis=1)
+	unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+	inverse = inverse.ravel()
+	hands = np.bincount(inverse, minlength=len(unique))
+	bets = np.bincount(inverse, weights=records["bet"], minlength=len(unique))
+	wins = np.bincount(inverse, weights=records["win"], minlength=len(unique))
+	return [(int(k[0]), bool(k[1]), int(k[2]), int(n), float(b), float(w))
+		for k, n, b, w in zip(unique, hands, bets, wins)]
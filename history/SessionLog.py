@@ -0,0 +1,82 @@
+import os
+import re
+import struct
+
+import numpy as np
+
+from history.HandHistory import CARD_CODES, CARD_NAMES
+
+
+MAGIC = b"BJSL"
+VERSION = 1
+HEADER = struct.Struct("<4sHH")  # magic, version, decks
+
+# One byte per event: the source in the high nibble (1 + index in SOURCES) and the card code in the low nibble. The
+# shuffle marker is the zero byte.
+SOURCES = ["dealer", "player", "other"]
+SHUFFLE = 0
+
+
+class SessionLogWriter(object):
+	"""
+	Appends the cards of a live session to a compact event log: one byte per card with its source and a marker
+	whenever the shoe is shuffled. Every event is flushed, so a session that ends abruptly keeps its cards.
+	"""
+
+	def __init__(self, path, decks):
+		self.path = path
+		exists = os.path.exists(path) and os.path.getsize(path) > 0
+		if exists and check_header(path) != decks:
+			raise ValueError("%s logs a shoe of a different number of decks" % path)
+		self.file = open(path, 'ab')
+		if not exists:
+			self.file.write(HEADER.pack(MAGIC, VERSION, decks))
+
+	def write(self, codes):
+		self.file.write(bytes(codes))
+		self.file.flush()
+
+	def cards(self, names, source):
+		self.write([(SOURCES.index(source) + 1) << 4 | CARD_CODES[name] for name in names])
+
+	def card(self, name, source):
+		self.cards([name], source)
+
+	def shuffle(self):
+		self.write([SHUFFLE])
+
+	def close(self):
+		self.file.close()
+
+
+def log_path(directory, name):
+	"""
+	Returns: The path of the session log of a table name in a directory.
+	"""
+	return os.path.join(directory, re.sub(r"[^\w.-]", "_", name) + ".bjsl")
+
+
+def check_header(path):
+	"""
+	Returns: The number of decks stored in the header of a session log.
+	"""
+	with open(path, 'rb') as log:
+		magic, version, decks = HEADER.unpack(log.read(HEADER.size))
+	if magic != MAGIC or version != VERSION:
+		raise ValueError("%s is not a version %d session log" % (path, VERSION))
+	return decks
+
+
+def read_shoes(path):
+	"""
+	Returns: The number of decks and the shoes of a session log, each a list of (card name, source) in the order the
+	cards were seen. Shoes without a card are left out.
+	"""
+	decks = check_header(path)
+	codes = np.fromfile(path, dtype=np.uint8, offset=HEADER.size)
+	shoes = []
+	for segment in np.split(codes, np.flatnonzero(codes == SHUFFLE)):
+		segment = segment[segment != SHUFFLE]
+		if len(segment):
+			shoes.append([(CARD_NAMES[code & 0x0F], SOURCES[(code >> 4) - 1]) for code in segment.tolist()])
+	return decks, shoes
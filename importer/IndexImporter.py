@@ -0,0 +1,31 @@
+import csv
+
+
+INDEX_COLUMNS = ["Table", "Player", "Dealer", "Index", "Above", "Below"]
+TABLES = ["HARD", "SOFT", "PAIR", "INSURANCE"]
+
+
+class IndexImporter(object):
+	"""
+	Reads a count-dependent strategy file (as written by BlackJackIndexGenerator.py). Every row attaches a true count
+	threshold to one cell of the basic strategy: Above is played at a true count >= Index, Below under it. Pairs are
+	given by the rank of their cards, the INSURANCE row by the Ace up-card with Y and N as actions.
+	"""
+
+	def __init__(self, index_file):
+		self.index_file = index_file
+		self.indices = []
+
+	def import_indices(self):
+		"""
+		Returns: A list of (table, player total, dealer up-card, index, above, below) tuples.
+		"""
+		with open(self.index_file, 'r', newline='') as index_csv:
+			reader = csv.DictReader(index_csv, delimiter = ';')
+			for row in reader:
+				table = row["Table"].upper()
+				if table not in TABLES:
+					raise ValueError("Unknown strategy table '%s' in %s" % (row["Table"], self.index_file))
+				total = int(row["Player"]) if row["Player"] else None
+				self.indices.append((table, total, row["Dealer"], float(row["Index"]), row["Above"], row["Below"]))
+		return self.indices
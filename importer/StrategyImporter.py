@@ -4,20 +4,20 @@ import csv
 class StrategyImporter(object):
 	"""
 	"""
-	hard_strategy = {}
-	soft_strategy = {}
-	pair_strategy = {}
-	dealer_strategy = {}
 
 	def __init__(self, player_file):
 		self.player_file = player_file
+		self.hard_strategy = {}
+		self.soft_strategy = {}
+		self.pair_strategy = {}
+		self.dealer_strategy = {}
 
 	def import_player_strategy(self):
 		hard = 21
 		soft = 21
 		pair = 20
 
-		with open(self.player_file, 'rU') as player_csv:
+		with open(self.player_file, 'r', newline='') as player_csv:
 			reader = csv.DictReader(player_csv, delimiter = ';')
 			for row in reader:
 				if hard >= 5:
@@ -0,0 +1,83 @@
+import json
+from functools import wraps
+from time import perf_counter_ns
+
+
+class Timers(object):
+	"""
+	Call counters and perf_counter_ns timers aggregated per phase over a run. Methods are wrapped only when
+	instrument() is called, so a run without timers executes the original, unwrapped code.
+	"""
+
+	def __init__(self):
+		self.calls = {}
+		self.outer_calls = {}
+		self.elapsed = {}
+		self.depth = {}
+		self.wrapped = []
+		self.started = perf_counter_ns()
+
+	def instrument(self, owner, method_name, phase):
+		"""
+		Replace owner.method_name with a timed wrapper accounting to the given phase. Calls made while the phase
+		is already running, recursively or through another method of the same phase, are counted but not timed, so
+		a phase is never counted twice.
+		"""
+		original = owner.__dict__[method_name]
+		self.calls.setdefault(phase, 0)
+		self.outer_calls.setdefault(phase, 0)
+		self.elapsed.setdefault(phase, 0)
+		self.depth.setdefault(phase, 0)
+		calls = self.calls
+		outer_calls = self.outer_calls
+		elapsed = self.elapsed
+		depth = self.depth
+
+		@wraps(original)
+		def timed(*args, **kwargs):
+			calls[phase] += 1
+			if depth[phase]:
+				return original(*args, **kwargs)
+			outer_calls[phase] += 1
+			depth[phase] = 1
+			start = perf_counter_ns()
+			try:
+				return original(*args, **kwargs)
+			finally:
+				elapsed[phase] += perf_counter_ns() - start
+				depth[phase] = 0
+
+		setattr(owner, method_name, timed)
+		self.wrapped.append((owner, method_name, original))
+
+	def restore(self):
+		"""
+		Put back all original methods.
+		"""
+		for owner, method_name, original in reversed(self.wrapped):
+			setattr(owner, method_name, original)
+		self.wrapped = []
+
+	def report(self):
+		"""
+		Returns: A dictionary with calls, outermost calls, total and mean nanoseconds per phase plus the wall time of
+		the run. Only outermost calls are timed, so the mean is per outermost call. Phases nest (e.g. dealing inside
+		probability computation), so they do not add up to the run time.
+		"""
+		phases = {}
+		for phase in self.calls:
+			outer_calls = self.outer_calls[phase]
+			phases[phase] = {
+				"calls": self.calls[phase],
+				"outer_calls": outer_calls,
+				"total_ns": self.elapsed[phase],
+				"mean_ns": self.elapsed[phase] / outer_calls if outer_calls else 0.0,
+			}
+		return {"run_ns": perf_counter_ns() - self.started, "phases": phases}
+
+	def dump(self, path):
+		"""
+		Write the report as JSON.
+		"""
+		with open(path, 'w') as report_file:
+			json.dump(self.report(), report_file, indent=2, sort_keys=True)
@@ -0,0 +1,189 @@
+import cProfile
+import inspect
+import os
+import pstats
+import signal
+import tracemalloc
+from collections import Counter
+
+
+class Profiler(object):
+	"""
+	Runs a function under cProfile (or a statistical sampler) and tracemalloc and writes the reports to a directory:
+	profile.pstats (cprofile mode only), profile.txt, profile.collapsed for flamegraph tooling and allocations.txt,
+	the top allocation sites plus their totals grouped by the classes whose methods allocated them.
+	"""
+	SAMPLING_INTERVAL = 0.001  # Seconds of CPU time between two samples
+
+	def __init__(self, output_dir, mode="cprofile", top=25):
+		if mode not in ("cprofile", "sampling"):
+			raise ValueError("Unknown profile mode '%s'" % mode)
+		self.output_dir = output_dir
+		self.mode = mode
+		self.top = top
+		os.makedirs(output_dir, exist_ok=True)
+
+	def path(self, name):
+		return os.path.join(self.output_dir, name)
+
+	def run(self, func, *args, repeat=1, classes=()):
+		"""
+		Profile repeat calls of func(*args) and write all reports. The allocation snapshot is taken while the result
+		of the last call is still referenced, so it shows what e.g. a whole game keeps alive.
+		Returns: The return value of the last call.
+		"""
+		def repeated():
+			result = None
+			for i in range(repeat):
+				result = func(*args)
+			return result
+
+		tracemalloc.start()
+		before = tracemalloc.take_snapshot()
+		if self.mode == "cprofile":
+			profile = cProfile.Profile()
+			result = profile.runcall(repeated)
+		else:
+			sampler = Sampler(self.SAMPLING_INTERVAL)
+			result = sampler.runcall(repeated)
+		after = tracemalloc.take_snapshot()
+		current, peak = tracemalloc.get_traced_memory()
+		tracemalloc.stop()
+
+		if self.mode == "cprofile":
+			profile.dump_stats(self.path("profile.pstats"))
+			with open(self.path("profile.txt"), 'w') as report:
+				stats = pstats.Stats(profile, stream=report)
+				stats.sort_stats("cumulative").print_stats(self.top)
+				stats.sort_stats("tottime").print_stats(self.top)
+			write_collapsed(self.path("profile.collapsed"), collapse_pstats(stats.stats))
+		else:
+			write_collapsed(self.path("profile.collapsed"), sampler.stacks)
+			with open(self.path("profile.txt"), 'w') as report:
+				report.write("%d samples every %.3f s\n\n" % (sampler.samples, self.SAMPLING_INTERVAL))
+				for frame, samples in sampler.leaves.most_common(self.top):
+					report.write("%8d %6.2f %%  %s\n" % (samples, 100.0 * samples / max(sampler.samples, 1), frame))
+
+		self.write_allocations(before, after, current, peak, classes)
+		return result
+
+	def write_allocations(self, before, after, current, peak, classes):
+		ranges = class_ranges(classes)
+		statistics = after.compare_to(before, "lineno")
+		by_class = Counter()
+		count_by_class = Counter()
+		for statistic in statistics:
+			frame = statistic.traceback[0]
+			owner = owner_of(ranges, frame.filename, frame.lineno)
+			by_class[owner] += statistic.size_diff
+			count_by_class[owner] += statistic.count_diff
+
+		with open(self.path("allocations.txt"), 'w') as report:
+			report.write("current %d bytes, peak %d bytes\n\n" % (current, peak))
+			report.write("Live allocations by allocating class\n")
+			for owner, size in by_class.most_common():
+				report.write("%12d bytes %10d blocks  %s\n" % (size, count_by_class[owner], owner))
+			report.write("\nTop %d allocation sites\n" % self.top)
+			for statistic in statistics[:self.top]:
+				frame = statistic.traceback[0]
+				report.write("%12d bytes %10d blocks  %s:%d (%s)\n" % (statistic.size_diff, statistic.count_diff, frame.filename,
+					frame.lineno, owner_of(ranges, frame.filename, frame.lineno)))
+
+
+class Sampler(object):
+	"""
+	Statistical profiler sampling the main thread's stack on a CPU time interval timer (Unix only).
+	"""
+
+	def __init__(self, interval):
+		self.interval = interval
+		self.stacks = Counter()
+		self.leaves = Counter()
+		self.samples = 0
+
+	def sample(self, signum, frame):
+		stack = []
+		while frame is not None:
+			stack.append(frame_name(frame.f_code))
+			frame = frame.f_back
+		if stack:
+			self.leaves[stack[0]] += 1
+			stack.reverse()
+			self.stacks[";".join(stack)] += 1
+			self.samples += 1
+
+	def runcall(self, func, *args):
+		handler = signal.signal(signal.SIGPROF, self.sample)
+		signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+		try:
+			return func(*args)
+		finally:
+			signal.setitimer(signal.ITIMER_PROF, 0, 0)
+			signal.signal(signal.SIGPROF, handler)
+
+
+def frame_name(code):
+	return "%s (%s:%d)" % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+def pstats_name(function):
+	filename, lineno, name = function
+	return "%s (%s:%d)" % (name, os.path.basename(filename), lineno)
+
+
+def collapse_pstats(stats, max_depth=64):
+	"""
+	Approximate call stacks from the caller/callee edges cProfile records. The time of a function is split over its
+	callers proportionally to the cumulative time spent on each edge; recursion is cut at the first repetition.
+	Returns: A Counter of collapsed stacks to microseconds of own time.
+	"""
+	callees = {}
+	for function, (cc, nc, tt, ct, callers) in stats.items():
+		for caller, edge in callers.items():
+			callees.setdefault(caller, []).append((function, edge[3]))
+
+	stacks = Counter()
+
+	def visit(function, stack, share, depth):
+		cc, nc, tt, ct, callers = stats[function]
+		stack = stack + [pstats_name(function)]
+		own = int(tt * share * 1e6)
+		if own > 0:
+			stacks[";".join(stack)] += own
+		if depth >= max_depth:
+			return
+		for callee, edge_time in callees.get(function, []):
+			callee_time = stats[callee][3]
+			if callee_time <= 0 or pstats_name(callee) in stack:
+				continue
+			visit(callee, stack, share * min(edge_time / callee_time, 1.0), depth + 1)
+
+	for function, (cc, nc, tt, ct, callers) in stats.items():
+		if not callers:
+			visit(function, [], 1.0, 0)
+	return stacks
+
+
+def write_collapsed(path, stacks):
+	with open(path, 'w') as collapsed:
+		for stack, weight in sorted(stacks.items()):
+			collapsed.write("%s %d\n" % (stack, weight))
+
+
+def class_ranges(classes):
+	"""
+	Returns: (filename, first line, last line, class name) for the source of every given class.
+	"""
+	ranges = []
+	for cls in classes:
+		lines, first = inspect.getsourcelines(cls)
+		ranges.append((os.path.abspath(inspect.getsourcefile(cls)), first, first + len(lines) - 1, cls.__name__))
+	return ranges
+
+
+def owner_of(ranges, filename, lineno):
+	filename = os.path.abspath(filename)
+	for source, first, last, name in ranges:
+		if source == filename and first <= lineno <= last:
+			return name
+	return "<other>"